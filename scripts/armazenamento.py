@@ -0,0 +1,95 @@
+"""
+armazenamento.py
+
+Este módulo implementa a camada de ingestão local das fontes usadas por dados_fetch.
+Cada fonte bruta (CSV local ou CSV remoto já baixado) é convertida uma única vez para
+Parquet tipado em ./cache/parquet; as leituras seguintes carregam apenas as colunas
+necessárias (projection pushdown) e aplicam os dtypes declarados, sem reinterpretar
+o texto do CSV. A conversão é refeita automaticamente quando a assinatura da fonte
+(tamanho/data de modificação do arquivo, ou ETag/hash do conteúdo remoto) muda.
+
+Sem o pyarrow instalado, ou com USAR_PARQUET = False, a leitura cai para
+pd.read_csv com usecols/dtype, mantendo a projeção das colunas.
+"""
+
+import hashlib
+import json
+import os
+from io import BytesIO
+
+import pandas as pd
+
+from scripts import metricas
+
+PARQUET_DIR = "./cache/parquet"
+USAR_PARQUET = True
+
+try:
+    import pyarrow  # noqa: F401
+    PYARROW_DISPONIVEL = True
+except ImportError:
+    PYARROW_DISPONIVEL = False
+
+def _caminhos(nome):
+    return (os.path.join(PARQUET_DIR, nome + ".parquet"),
+            os.path.join(PARQUET_DIR, nome + ".json"))
+
+def _assinatura_armazenada(nome):
+    _, caminho_meta = _caminhos(nome)
+    try:
+        with open(caminho_meta, "r", encoding="utf-8") as f:
+            return json.load(f).get("assinatura")
+    except (OSError, ValueError):
+        return None
+
+def _converte(nome, ler_csv, assinatura):
+    """
+    Lê a fonte completa uma única vez e grava o Parquet correspondente.
+    """
+    os.makedirs(PARQUET_DIR, exist_ok=True)
+    caminho_parquet, caminho_meta = _caminhos(nome)
+    df = ler_csv(None)
+    temporario = caminho_parquet + ".tmp"
+    df.to_parquet(temporario, index=False)
+    os.replace(temporario, caminho_parquet)
+    with open(caminho_meta, "w", encoding="utf-8") as f:
+        json.dump({"assinatura": assinatura, "linhas": len(df), "colunas": list(df.columns)}, f)
+
+def ler_fonte(nome, assinatura, ler_csv, colunas=None, dtypes=None):
+    """
+    Lê a fonte `nome` carregando apenas `colunas` (None = todas) com os `dtypes` declarados.
+    `ler_csv(usecols)` deve ler a fonte bruta; ele só é chamado quando o Parquet não existe
+    ou quando `assinatura` difere da registrada na última conversão.
+    """
+    if USAR_PARQUET and PYARROW_DISPONIVEL:
+        caminho_parquet, _ = _caminhos(nome)
+        if not os.path.exists(caminho_parquet) or _assinatura_armazenada(nome) != assinatura:
+            _converte(nome, ler_csv, assinatura)
+        df = pd.read_parquet(caminho_parquet, columns=colunas)
+    else:
+        df = ler_csv(colunas)
+    if dtypes:
+        df = df.astype({coluna: tipo for coluna, tipo in dtypes.items() if coluna in df.columns})
+    metricas.adiciona_entrada(len(df))
+    return df
+
+def ler_csv_local(caminho, colunas=None, dtypes=None, nome=None):
+    """
+    Lê um CSV local via Parquet. A assinatura é o tamanho e a data de modificação do arquivo.
+    """
+    nome = nome or os.path.splitext(os.path.basename(caminho))[0]
+    stat = os.stat(caminho)
+    assinatura = f"{stat.st_size}-{stat.st_mtime_ns}"
+    return ler_fonte(nome, assinatura, lambda usecols: pd.read_csv(caminho, usecols=usecols),
+                     colunas, dtypes)
+
+def ler_csv_bytes(nome, response, colunas=None, dtypes=None):
+    """
+    Lê um CSV remoto (RespostaCache do http_cache) via Parquet. A assinatura é o ETag ou
+    Last-Modified da resposta e, na falta deles, o hash do conteúdo.
+    """
+    assinatura = (response.headers.get("ETag") or response.headers.get("Last-Modified")
+                  or hashlib.sha256(response.content).hexdigest())
+    return ler_fonte(nome, assinatura,
+                     lambda usecols: pd.read_csv(BytesIO(response.content), usecols=usecols),
+                     colunas, dtypes)
@@ -0,0 +1,261 @@
+"""
+cache_consultas.py
+
+Este módulo guarda em disco o resultado das consultas analíticas feitas ao data warehouse.
+A chave de cada entrada combina o texto SQL normalizado (sem comentários, espaços redundantes
+e ponto e vírgula final; fora dos literais, em minúsculas), os parâmetros, o banco consultado
+e a versão dos dados que carga.carrega incrementa em "Versao_Dados" a cada carga. Assim,
+reexecuções e consultas idênticas (como as Consultas 1 e 5 do notebook) voltam do disco sem
+ir ao PostgreSQL, e uma nova carga invalida automaticamente os resultados anteriores (as
+entradas das versões antigas são removidas). O tamanho total do cache é limitado, removendo
+as entradas usadas há mais tempo (LRU, pela data de acesso do arquivo do resultado), como em
+http_cache.
+"""
+
+import hashlib
+import json
+import logging
+import os
+import pickle
+import re
+import threading
+import time
+
+import pandas as pd
+
+from scripts import carga
+
+try:
+    from sqlalchemy.exc import DBAPIError
+except ImportError:
+    DBAPIError = None
+
+logger = logging.getLogger(__name__)
+
+# Configuração padrão do cache (pode ser alterada via configurar)
+CACHE_DIR = "./cache/consultas"
+TAMANHO_MAXIMO = 256 * 1024 * 1024    # bytes ocupados pelos resultados armazenados
+HABILITADO = True
+
+# Erros do banco ao ler a versão (ex.: "Versao_Dados" ainda não existe)
+_ERROS_BANCO = tuple(erro for erro in (DBAPIError, carga.psycopg2.Error if carga.PSYCOPG2_DISPONIVEL else None)
+                     if erro is not None)
+
+_LITERAIS = re.compile(r"('(?:[^']|'')*'|\"(?:[^\"]|\"\")*\")")
+_COMENTARIOS = re.compile(r"--[^\n]*|/\*.*?\*/", re.S)
+_PONTUACAO = re.compile(r" ?([(),;=<>*/+-]) ?")
+
+_lock = threading.Lock()
+_versoes = {}           # banco -> última versão vista (para remover as entradas antigas uma vez)
+_estatisticas = {
+    "hits": 0,           # servidos do disco
+    "misses": 0,         # executados no banco
+    "sem_versao": 0,     # executados sem cache (banco sem "Versao_Dados")
+    "invalidados": 0,    # entradas de versões antigas removidas
+    "evictions": 0,      # entradas removidas por tamanho
+}
+
+def configurar(diretorio=None, tamanho_maximo=None, habilitado=None):
+    """
+    Altera a configuração global do cache. Parâmetros omitidos mantêm o valor atual.
+    """
+    global CACHE_DIR, TAMANHO_MAXIMO, HABILITADO
+    if diretorio is not None:
+        CACHE_DIR = diretorio
+    if tamanho_maximo is not None:
+        TAMANHO_MAXIMO = tamanho_maximo
+    if habilitado is not None:
+        HABILITADO = habilitado
+
+def _incrementa(chave, valor=1):
+    with _lock:
+        _estatisticas[chave] += valor
+
+def normaliza_sql(sql):
+    """
+    Normaliza o texto SQL para a chave do cache: remove comentários, converte para minúsculas
+    e colapsa os espaços fora dos literais ('...' e "..."), e retira o ponto e vírgula final.
+    """
+    partes = _LITERAIS.split(sql)
+    for i in range(0, len(partes), 2):
+        texto = re.sub(r"\s+", " ", _COMENTARIOS.sub(" ", partes[i]).lower())
+        partes[i] = _PONTUACAO.sub(r"\1", texto)
+    return "".join(partes).strip().rstrip(";").strip()
+
+def _banco(conexao):
+    # Engine do SQLAlchemy (URL sem a senha) ou conexão psycopg2 (dsn já mascara a senha)
+    url = getattr(conexao, "url", None)
+    if url is not None:
+        return url.render_as_string(hide_password=True)
+    return getattr(conexao, "dsn", type(conexao).__name__)
+
+def versao_dados(conexao):
+    """
+    Lê a versão dos dados em uma engine SQLAlchemy ou conexão psycopg2.
+    Retorna None se o banco não tiver a tabela "Versao_Dados".
+    """
+    try:
+        if hasattr(conexao, "cursor"):
+            return carga.versao_dados(conexao)
+        with conexao.connect() as conn:
+            linha = conn.exec_driver_sql(carga.SQL_VERSAO).fetchone()
+        return linha[0] if linha else 0
+    except _ERROS_BANCO:
+        return None
+
+def _caminhos(chave):
+    return (os.path.join(CACHE_DIR, chave + ".json"),
+            os.path.join(CACHE_DIR, chave + ".pkl"))
+
+def _grava_atomico(caminho, escreve):
+    temporario = f"{caminho}.{os.getpid()}.{threading.get_ident()}.tmp"
+    escreve(temporario)
+    os.replace(temporario, caminho)
+
+def _grava_meta(caminho, meta):
+    def escreve(temporario):
+        with open(temporario, "w", encoding="utf-8") as f:
+            json.dump(meta, f)
+    _grava_atomico(caminho, escreve)
+
+def _carrega(chave):
+    caminho_meta, caminho_resultado = _caminhos(chave)
+    try:
+        with open(caminho_meta, "r", encoding="utf-8") as f:
+            meta = json.load(f)
+        resultado = pd.read_pickle(caminho_resultado)
+    except (OSError, ValueError, EOFError, pickle.UnpicklingError):
+        return None
+    # O LRU usa a data de acesso do resultado; os metadados não são regravados a cada hit
+    try:
+        os.utime(caminho_resultado)
+    except OSError:
+        pass
+    return resultado
+
+def _grava(chave, meta, resultado):
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    caminho_meta, caminho_resultado = _caminhos(chave)
+    _grava_atomico(caminho_resultado, resultado.to_pickle)
+    meta["tamanho"] = os.path.getsize(caminho_resultado)
+    _grava_meta(caminho_meta, meta)
+
+def _entradas():
+    if not os.path.isdir(CACHE_DIR):
+        return []
+    entradas = []
+    for nome in os.listdir(CACHE_DIR):
+        if not nome.endswith(".json"):
+            continue
+        try:
+            with open(os.path.join(CACHE_DIR, nome), "r", encoding="utf-8") as f:
+                entradas.append((nome[:-len(".json")], json.load(f)))
+        except (OSError, ValueError):
+            continue
+    return entradas
+
+def _remove(chave):
+    for caminho in _caminhos(chave):
+        try:
+            os.remove(caminho)
+        except OSError:
+            pass
+
+def invalidar(banco=None, versao_atual=None):
+    """
+    Remove as entradas do cache: todas, as de um `banco` ou, com `versao_atual`, apenas as
+    entradas desse banco guardadas em versões anteriores. Retorna o número de entradas removidas.
+    """
+    removidas = 0
+    for chave, meta in _entradas():
+        if banco is not None and meta.get("banco") != banco:
+            continue
+        if versao_atual is not None and meta.get("versao", 0) >= versao_atual:
+            continue
+        _remove(chave)
+        removidas += 1
+    return removidas
+
+def consulta(sql, conexao, params=None):
+    """
+    Equivalente a pd.read_sql(sql, conexao, params=params), servido do cache enquanto a versão
+    dos dados do banco não mudar. `conexao` é uma engine SQLAlchemy ou uma conexão psycopg2.
+    """
+    if not HABILITADO:
+        return pd.read_sql(sql, conexao, params=params)
+    versao = versao_dados(conexao)
+    if versao is None:
+        _incrementa("sem_versao")
+        return pd.read_sql(sql, conexao, params=params)
+
+    banco = _banco(conexao)
+    with _lock:
+        versao_nova = _versoes.get(banco) != versao
+        _versoes[banco] = versao
+    if versao_nova:
+        _incrementa("invalidados", invalidar(banco, versao))
+
+    normalizado = normaliza_sql(sql)
+    chave = hashlib.sha256(json.dumps([normalizado, params, banco, versao], default=str)
+                           .encode("utf-8")).hexdigest()
+    resultado = _carrega(chave)
+    if resultado is not None:
+        _incrementa("hits")
+        return resultado
+
+    _incrementa("misses")
+    resultado = pd.read_sql(sql, conexao, params=params)
+    agora = time.time()
+    _grava(chave, {"sql": normalizado, "banco": banco, "versao": versao,
+                   "armazenado_em": agora}, resultado)
+    limpar_excedente()
+    return resultado
+
+def limpar_excedente(tamanho_maximo=None):
+    """
+    Remove as entradas acessadas há mais tempo (pela data de acesso/modificação do resultado)
+    até que a soma dos resultados armazenados fique abaixo de `tamanho_maximo` (padrão: TAMANHO_MAXIMO).
+    """
+    tamanho_maximo = TAMANHO_MAXIMO if tamanho_maximo is None else tamanho_maximo
+    if not os.path.isdir(CACHE_DIR):
+        return
+    entradas = []
+    for entrada in os.scandir(CACHE_DIR):
+        if not entrada.name.endswith(".pkl"):
+            continue
+        try:
+            stat = entrada.stat()
+        except OSError:
+            continue
+        entradas.append((max(stat.st_atime, stat.st_mtime), stat.st_size, entrada.name[:-len(".pkl")]))
+    total = sum(tamanho for _, tamanho, _ in entradas)
+    if total <= tamanho_maximo:
+        return
+    for _, tamanho, chave in sorted(entradas):
+        if total <= tamanho_maximo:
+            break
+        _remove(chave)
+        total -= tamanho
+        _incrementa("evictions")
+
+def estatisticas():
+    """
+    Retorna um dicionário com os contadores acumulados na execução.
+    """
+    with _lock:
+        return dict(_estatisticas)
+
+def zerar_estatisticas():
+    with _lock:
+        for chave in _estatisticas:
+            _estatisticas[chave] = 0
+
+def log_estatisticas():
+    """
+    Registra no log um resumo dos contadores do cache.
+    """
+    est = estatisticas()
+    logger.info(f"Cache de consultas: {est['hits']} hits, {est['misses']} misses, "
+                f"{est['sem_versao']} sem versão, {est['invalidados']} invalidados, "
+                f"{est['evictions']} evictions.")
+    return est
@@ -0,0 +1,265 @@
+"""
+consultas.py
+
+Este módulo executa as consultas analíticas do notebook (Consultas 1 a 5) sem o PostgreSQL,
+diretamente sobre as tabelas geradas por integration.run_pipeline (em memória ou lidas de
+./arquivos_analise com saida.le_tabelas).
+
+Há dois motores:
+  - "pandas": o fato é agregado primeiro pelas chaves inteiras (Chave_Tempo, Chave_Local,
+    Chave_Religiao) em somas e contagens; só os grupos resultantes (poucos) recebem os atributos
+    das dimensões por busca de posição no ID, e as médias são recombinadas por atributo. O
+    resultado é o mesmo do AVG com JOIN/GROUP BY do SQL (nulos ignorados, grupos nulos mantidos).
+  - "duckdb": executa o próprio texto SQL das consultas (CONSULTAS_DUCKDB) em um DuckDB embutido,
+    sobre os DataFrames ou, quando houver saída Parquet, diretamente sobre os arquivos.
+    Requer o duckdb (pip install duckdb).
+
+Uso:
+    from scripts import consultas
+    df_q1 = consultas.executa(1, "./arquivos_analise")
+    resultados = consultas.executa_todas(result, motor="duckdb")   # result de run_pipeline
+"""
+
+import os
+
+import numpy as np
+import pandas as pd
+
+from scripts import saida
+
+try:
+    import duckdb
+    DUCKDB_DISPONIVEL = True
+except ImportError:
+    duckdb = None
+    DUCKDB_DISPONIVEL = False
+
+MOTORES = ("pandas", "duckdb")
+
+# Textos SQL das consultas, como no notebook (executados no PostgreSQL ou no DuckDB)
+CONSULTAS = {
+    1: """
+SELECT R."Classificacao",
+       AVG(F."PIB_Per_Capita") AS media_pib,
+       AVG(F."Expectativa_Vida") AS media_vida,
+       AVG(F."Taxa_Mortalidade") AS media_mortalidade
+FROM "Fato_Populacao" F
+JOIN "Dim_Religiao" R ON F."Chave_Religiao" = R."ID_Religiao"
+GROUP BY R."Classificacao";
+""",
+    2: """
+SELECT T."Ano",
+       R."Classificacao",
+       AVG(CAST(F."Populacao_Urbana" AS FLOAT)/NULLIF(F."Populacao_Total", 0))*100 AS urban_rate
+FROM "Fato_Populacao" F
+JOIN "Dim_Tempo" T ON F."Chave_Tempo" = T."ID_Tempo"
+JOIN "Dim_Religiao" R ON F."Chave_Religiao" = R."ID_Religiao"
+GROUP BY T."Ano", R."Classificacao"
+ORDER BY T."Ano";
+""",
+    3: """
+SELECT F."Em_Conflito",
+       AVG(F."Populacao_Total") AS media_pop_total,
+       AVG(F."Populacao_Urbana") AS media_pop_urbana,
+       AVG(F."PIB_Per_Capita") AS media_pib
+FROM "Fato_Populacao" F
+GROUP BY F."Em_Conflito";
+""",
+    4: """
+SELECT
+    R."Classificacao",
+    L."Continente",
+    AVG(F."Taxa_Mortalidade") AS media_mortalidade
+FROM "Fato_Populacao" F
+JOIN "Dim_Religiao" R ON F."Chave_Religiao" = R."ID_Religiao"
+JOIN "Dim_Local" L ON F."Chave_Local" = L."ID_Local"
+GROUP BY R."Classificacao", L."Continente";
+""",
+    5: """
+SELECT R."Classificacao",
+       AVG(F."PIB_Per_Capita") AS media_pib,
+       AVG(F."Expectativa_Vida") AS media_vida,
+       AVG(F."Taxa_Mortalidade") AS media_mortalidade
+FROM "Fato_Populacao" F
+JOIN "Dim_Religiao" R ON F."Chave_Religiao" = R."ID_Religiao"
+GROUP BY R."Classificacao";
+""",
+}
+
+# No PostgreSQL FLOAT é precisão dupla; no DuckDB é REAL (32 bits), daí a troca por DOUBLE
+CONSULTAS_DUCKDB = {numero: sql.replace("AS FLOAT)", "AS DOUBLE)") for numero, sql in CONSULTAS.items()}
+
+# Nome de cada tabela no SQL -> chave no dicionário de tabelas do pipeline
+TABELAS_SQL = {
+    "Fato_Populacao": "df_fact_final",
+    "Dim_Tempo": "dim_tempo",
+    "Dim_Local": "dim_local",
+    "Dim_Religiao": "dim_religiao",
+}
+
+# Atributo de dimensão -> (tabela da dimensão, chave no fato, ID da dimensão)
+ATRIBUTOS = {
+    "Ano": ("dim_tempo", "Chave_Tempo", "ID_Tempo"),
+    "Decada": ("dim_tempo", "Chave_Tempo", "ID_Tempo"),
+    "Pais": ("dim_local", "Chave_Local", "ID_Local"),
+    "Continente": ("dim_local", "Chave_Local", "ID_Local"),
+    "Nome_Religiao": ("dim_religiao", "Chave_Religiao", "ID_Religiao"),
+    "Classificacao": ("dim_religiao", "Chave_Religiao", "ID_Religiao"),
+}
+
+def carrega_tabelas(origem="./arquivos_analise"):
+    """
+    Retorna o dicionário {df_fact_final, dim_tempo, dim_local, dim_religiao} a partir da saída de
+    run_pipeline (ou de outro dicionário com essas chaves) ou de um diretório (saida.le_tabelas).
+    """
+    if isinstance(origem, dict):
+        return {nome: origem[nome] for nome in TABELAS_SQL.values()}
+    return saida.le_tabelas(origem)
+
+def media_por(tabelas, atributos, medidas):
+    """
+    Equivalente a SELECT atributos, AVG(medida)... FROM fato JOIN dimensões GROUP BY atributos.
+
+    Parâmetros:
+        tabelas: dicionário de carrega_tabelas
+        atributos: colunas das dimensões (ver ATRIBUTOS) ou do próprio fato (ex.: 'Em_Conflito')
+        medidas: {coluna de saída: coluna do fato ou Series alinhada ao fato}
+
+    O fato é reduzido a somas e contagens (valores não nulos) por chave inteira; os atributos
+    são buscados apenas para esses grupos e as médias são recombinadas por atributo. Grupos
+    cujas chaves não existem na dimensão são descartados, como no JOIN.
+    """
+    fato = tabelas["df_fact_final"]
+    chaves = list(dict.fromkeys(ATRIBUTOS[a][1] if a in ATRIBUTOS else a for a in atributos))
+
+    # Código de grupo de cada linha: combinação dos códigos de cada chave (nulos formam um grupo)
+    grupo = np.zeros(len(fato), dtype=np.int64)
+    valores_chaves = []
+    for chave in chaves:
+        codigos, unicos = pd.factorize(fato[chave], use_na_sentinel=False)
+        grupo = grupo * len(unicos) + codigos
+        valores_chaves.append(np.asarray(unicos, dtype=object))
+    grupo, representantes = pd.factorize(grupo)
+    n_grupos = len(representantes)
+
+    parcial = pd.DataFrame(index=np.arange(n_grupos))
+    validos = np.ones(n_grupos, dtype=bool)
+    for posicao_chave in reversed(range(len(chaves))):
+        unicos = valores_chaves[posicao_chave]
+        parcial[chaves[posicao_chave]] = unicos[representantes % len(unicos)]
+        representantes = representantes // len(unicos)
+    for atributo in atributos:
+        if atributo in ATRIBUTOS:
+            tabela, chave, coluna_id = ATRIBUTOS[atributo]
+            posicoes = pd.Index(tabelas[tabela][coluna_id]).get_indexer(parcial[chave].to_numpy())
+            validos &= posicoes >= 0
+            parcial[atributo] = tabelas[tabela][atributo].to_numpy(dtype=object)[posicoes]
+    parcial = parcial[list(dict.fromkeys(atributos))]
+
+    # Somas e contagens (valores não nulos) de cada medida por grupo
+    for nome, medida in medidas.items():
+        valores = (fato[medida] if isinstance(medida, str) else medida).to_numpy(dtype="float64", na_value=np.nan)
+        presentes = ~np.isnan(valores)
+        parcial["soma_" + nome] = np.bincount(grupo, weights=np.where(presentes, valores, 0), minlength=n_grupos)
+        parcial["n_" + nome] = np.bincount(grupo, weights=presentes, minlength=n_grupos)
+
+    totais = parcial[validos].groupby(atributos, dropna=False).sum()
+    resultado = pd.DataFrame(index=totais.index)
+    for nome in medidas:
+        # AVG de um grupo sem valores não nulos é NULL
+        resultado[nome] = totais["soma_" + nome] / totais["n_" + nome].replace(0, np.nan)
+    return resultado.reset_index()
+
+def consulta_1(tabelas):
+    """
+    Consulta 1: médias de PIB per capita, expectativa de vida e mortalidade por classificação religiosa.
+    """
+    return media_por(tabelas, ["Classificacao"], {
+        "media_pib": "PIB_Per_Capita",
+        "media_vida": "Expectativa_Vida",
+        "media_mortalidade": "Taxa_Mortalidade",
+    })
+
+def consulta_2(tabelas):
+    """
+    Consulta 2: taxa de urbanização média (%) por ano e classificação religiosa, ordenada por ano.
+    """
+    fato = tabelas["df_fact_final"]
+    # NULLIF do divisor, como no SQL: população total zero não entra na média
+    razao = (fato["Populacao_Urbana"].astype("float64")
+             / fato["Populacao_Total"].astype("float64").replace(0, np.nan))
+    resultado = media_por(tabelas, ["Ano", "Classificacao"], {"urban_rate": razao})
+    resultado["urban_rate"] *= 100
+    return resultado
+
+def consulta_3(tabelas):
+    """
+    Consulta 3: médias de população total, população urbana e PIB per capita por nível de conflito.
+    """
+    return media_por(tabelas, ["Em_Conflito"], {
+        "media_pop_total": "Populacao_Total",
+        "media_pop_urbana": "Populacao_Urbana",
+        "media_pib": "PIB_Per_Capita",
+    })
+
+def consulta_4(tabelas):
+    """
+    Consulta 4: taxa de mortalidade média por classificação religiosa e continente.
+    """
+    return media_por(tabelas, ["Classificacao", "Continente"], {"media_mortalidade": "Taxa_Mortalidade"})
+
+def consulta_5(tabelas):
+    """
+    Consulta 5: PIB per capita e indicadores de saúde por religião (mesma agregação da Consulta 1).
+    """
+    return consulta_1(tabelas)
+
+CONSULTAS_PANDAS = {1: consulta_1, 2: consulta_2, 3: consulta_3, 4: consulta_4, 5: consulta_5}
+
+def conecta_duckdb(origem="./arquivos_analise"):
+    """
+    Abre um DuckDB em memória com as tabelas Fato_Populacao, Dim_Tempo, Dim_Local e Dim_Religiao.
+    Se `origem` for um diretório cuja saída mais recente é Parquet (saida.formato_disponivel),
+    as tabelas são views sobre os arquivos (o fato particionado por Decada é lido com
+    hive_partitioning); senão os DataFrames são registrados.
+    """
+    if not DUCKDB_DISPONIVEL:
+        raise ImportError("O motor 'duckdb' requer o duckdb (pip install duckdb).")
+    conexao = duckdb.connect()
+    if not isinstance(origem, dict) and saida.formato_disponivel(origem) == "parquet":
+        diretorio = os.path.join(origem, saida.SUBDIR_PARQUET)
+        for tabela_sql, nome in TABELAS_SQL.items():
+            caminho = os.path.join(diretorio, saida.ARQUIVOS_PARQUET[nome])
+            if os.path.isdir(caminho):
+                caminho = os.path.join(caminho, "**", "*.parquet")
+            caminho = caminho.replace("'", "''")
+            conexao.execute(f"""CREATE VIEW "{tabela_sql}" AS
+                                SELECT * FROM read_parquet('{caminho}', hive_partitioning = true)""")
+        return conexao
+    for tabela_sql, df in zip(TABELAS_SQL, carrega_tabelas(origem).values()):
+        conexao.register(tabela_sql, df)
+    return conexao
+
+def executa(numero, origem="./arquivos_analise", motor="pandas"):
+    """
+    Executa a Consulta `numero` (1 a 5) sobre `origem` (diretório, saída de run_pipeline ou
+    dicionário de carrega_tabelas) e retorna o DataFrame com as mesmas colunas do SQL.
+    """
+    return executa_todas(origem, motor, numeros=[numero])[numero]
+
+def executa_todas(origem="./arquivos_analise", motor="pandas", numeros=None):
+    """
+    Executa as consultas `numeros` (padrão: todas) carregando as tabelas uma única vez.
+    Retorna {numero: DataFrame}.
+    """
+    if motor not in MOTORES:
+        raise ValueError(f"Motor desconhecido: {motor} (use {', '.join(MOTORES)}).")
+    numeros = sorted(CONSULTAS) if numeros is None else numeros
+    if motor == "duckdb":
+        conexao = conecta_duckdb(origem)
+        try:
+            return {n: conexao.execute(CONSULTAS_DUCKDB[n]).df() for n in numeros}
+        finally:
+            conexao.close()
+    tabelas = carrega_tabelas(origem)
+    return {n: CONSULTAS_PANDAS[n](tabelas) for n in numeros}
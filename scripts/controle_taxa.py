@@ -0,0 +1,258 @@
+"""
+controle_taxa.py
+
+Este módulo controla a taxa das requisições do scraping ao Worldometers, para obter a maior
+vazão que o servidor sustenta sem perder países por limitação (429) ou erros transitórios.
+Cada host tem um limite de requisições simultâneas ajustado no estilo AIMD:
+  - partida lenta: até o primeiro sinal de congestionamento o limite cresce 1 a cada sucesso;
+  - aumento aditivo: depois disso, cresce 1 a cada `limite` sucessos (~1 por rodada);
+  - redução multiplicativa: 429, 5xx, timeouts/erros de conexão ou uma latência acima de
+    FATOR_LATENCIA vezes a menor latência observada reduzem o limite pela metade (no máximo
+    uma vez por intervalo de uma latência média, para que uma rajada de erros conte uma vez).
+Requisições que falham por esses motivos são repetidas com backoff exponencial com jitter
+(respeitando Retry-After), até TENTATIVAS vezes e dentro de um orçamento de novas tentativas
+por execução (ORCAMENTO_MINIMO + ORCAMENTO_FRACAO x requisições iniciadas), para que um
+servidor fora do ar não multiplique a carga. As respostas servidas pelo cache HTTP ou por uma
+gravação (reproducao) não vão ao servidor: não entram no cálculo da latência e contam apenas
+como sucesso para o aumento do limite.
+
+Ao final da execução, log_estatisticas() registra, por host, as requisições, novas tentativas,
+429/5xx, falhas definitivas, latências (p50/p95) e o limite de concorrência alcançado.
+"""
+
+import asyncio
+import logging
+import random
+import time
+from urllib.parse import urlsplit
+
+import numpy as np
+import requests
+
+from scripts import http_cache
+from scripts import reproducao
+
+logger = logging.getLogger(__name__)
+
+# Configuração padrão (pode ser alterada via configurar)
+LIMITE_INICIAL = 2
+LIMITE_MINIMO = 1
+LIMITE_MAXIMO = 10          # scraping usa MAX_CONCORRENCIA (tamanho dos pools da sessão)
+FATOR_REDUCAO = 0.5
+FATOR_LATENCIA = 3.0        # latência acima de FATOR_LATENCIA x a menor observada indica fila no servidor
+LATENCIA_MINIMA_CORTE = 0.25   # segundos; latências abaixo disto nunca são tratadas como congestionamento
+TENTATIVAS = 5              # tentativas por URL (a primeira + novas tentativas)
+BACKOFF_BASE = 0.5          # segundos
+BACKOFF_MAXIMO = 30.0
+ORCAMENTO_MINIMO = 10
+ORCAMENTO_FRACAO = 0.2
+TIMEOUT = 60
+
+STATUS_CONGESTIONAMENTO = {429, 500, 502, 503, 504}
+
+class ControladorHost:
+    """
+    Limite AIMD de requisições simultâneas e estatísticas de um host. Usado via get_async.
+    """
+
+    def __init__(self, host, limite_maximo):
+        self.host = host
+        self.limite_maximo = limite_maximo
+        self.limite = float(min(LIMITE_INICIAL, limite_maximo))
+        self.partida_lenta = True
+        self.em_andamento = 0
+        self.loop = asyncio.get_running_loop()
+        self.condicao = asyncio.Condition()
+        self.latencia_base = None
+        self.latencia_media = None
+        self.ultimo_corte = 0.0
+        self.latencias = []
+        self.estatisticas = {
+            "urls": 0, "requisicoes": 0, "sucessos": 0, "falhas": 0, "novas_tentativas": 0,
+            "tentativas_negadas": 0, "status_429": 0, "status_5xx": 0, "excecoes": 0,
+            "cortes": 0, "limite_maximo_atingido": self.limite,
+        }
+
+    async def adquire(self):
+        async with self.condicao:
+            await self.condicao.wait_for(lambda: self.em_andamento < int(self.limite))
+            self.em_andamento += 1
+
+    async def libera(self):
+        async with self.condicao:
+            self.em_andamento -= 1
+            self.condicao.notify_all()
+
+    def _aumenta(self):
+        self.limite = min(self.limite_maximo, self.limite + (1 if self.partida_lenta else 1 / self.limite))
+        self.estatisticas["limite_maximo_atingido"] = max(self.estatisticas["limite_maximo_atingido"], self.limite)
+
+    def _reduz(self):
+        agora = time.monotonic()
+        if agora - self.ultimo_corte < (self.latencia_media or BACKOFF_BASE):
+            return
+        self.ultimo_corte = agora
+        self.partida_lenta = False
+        self.limite = max(LIMITE_MINIMO, self.limite * FATOR_REDUCAO)
+        self.estatisticas["cortes"] += 1
+
+    def registra(self, latencia, resposta, erro):
+        """
+        Atualiza o limite com o resultado de uma tentativa. Retorna True se ela indicou congestionamento.
+        """
+        self.estatisticas["requisicoes"] += 1
+        if erro is not None:
+            self.estatisticas["excecoes"] += 1
+            self._reduz()
+            return True
+        status = resposta.status_code
+        if status == 429:
+            self.estatisticas["status_429"] += 1
+        elif status >= 500:
+            self.estatisticas["status_5xx"] += 1
+        if status in STATUS_CONGESTIONAMENTO:
+            self._reduz()
+            return True
+        if getattr(resposta, "origem", None) not in ("miss", "revalidado"):
+            # Servida pelo cache ou por uma gravação: não mede o servidor, mas também não o carrega
+            self._aumenta()
+            return False
+        self.latencias.append(latencia)
+        self.latencia_base = latencia if self.latencia_base is None else min(self.latencia_base, latencia)
+        self.latencia_media = latencia if self.latencia_media is None else 0.8 * self.latencia_media + 0.2 * latencia
+        if latencia > max(LATENCIA_MINIMA_CORTE, FATOR_LATENCIA * self.latencia_base):
+            self._reduz()
+        else:
+            self._aumenta()
+        return False
+
+    def resumo(self):
+        resultado = dict(self.estatisticas, host=self.host, limite_final=round(self.limite, 2))
+        if self.latencias:
+            resultado["latencia_p50_s"] = float(np.percentile(self.latencias, 50))
+            resultado["latencia_p95_s"] = float(np.percentile(self.latencias, 95))
+        return resultado
+
+_controladores = {}
+_orcamento = {"iniciadas": 0, "usadas": 0}
+_limite_execucao = {"maximo": None}
+
+def configurar(limite_inicial=None, limite_maximo=None, tentativas=None, backoff_base=None,
+               backoff_maximo=None, orcamento_minimo=None, orcamento_fracao=None, timeout=None):
+    """
+    Altera a configuração global. Parâmetros omitidos mantêm o valor atual.
+    """
+    global LIMITE_INICIAL, LIMITE_MAXIMO, TENTATIVAS, BACKOFF_BASE, BACKOFF_MAXIMO
+    global ORCAMENTO_MINIMO, ORCAMENTO_FRACAO, TIMEOUT
+    if limite_inicial is not None:
+        LIMITE_INICIAL = limite_inicial
+    if limite_maximo is not None:
+        LIMITE_MAXIMO = limite_maximo
+    if tentativas is not None:
+        TENTATIVAS = tentativas
+    if backoff_base is not None:
+        BACKOFF_BASE = backoff_base
+    if backoff_maximo is not None:
+        BACKOFF_MAXIMO = backoff_maximo
+    if orcamento_minimo is not None:
+        ORCAMENTO_MINIMO = orcamento_minimo
+    if orcamento_fracao is not None:
+        ORCAMENTO_FRACAO = orcamento_fracao
+    if timeout is not None:
+        TIMEOUT = timeout
+
+def inicia_execucao(limite_maximo=None):
+    """
+    Começa uma nova execução: zera os limites, as estatísticas e o orçamento de novas tentativas.
+    `limite_maximo` (padrão: LIMITE_MAXIMO) é o teto de concorrência por host nesta execução.
+    """
+    _controladores.clear()
+    _orcamento["iniciadas"] = _orcamento["usadas"] = 0
+    _limite_execucao["maximo"] = limite_maximo
+
+def controlador(host):
+    atual = _controladores.get(host)
+    # As primitivas do asyncio ficam presas ao event loop em que foram criadas
+    if atual is None or atual.loop is not asyncio.get_running_loop():
+        atual = _controladores[host] = ControladorHost(host, _limite_execucao["maximo"] or LIMITE_MAXIMO)
+    return atual
+
+def _consome_orcamento():
+    if _orcamento["usadas"] >= ORCAMENTO_MINIMO + ORCAMENTO_FRACAO * _orcamento["iniciadas"]:
+        return False
+    _orcamento["usadas"] += 1
+    return True
+
+def _espera(tentativa, resposta):
+    espera = random.uniform(0, min(BACKOFF_MAXIMO, BACKOFF_BASE * 2 ** tentativa))
+    retry_after = resposta.headers.get("Retry-After") if resposta is not None else None
+    if retry_after is not None:
+        try:
+            espera = max(espera, min(BACKOFF_MAXIMO, float(retry_after)))
+        except ValueError:
+            pass
+    return espera
+
+async def get_async(session, url, headers=None):
+    """
+    http_cache.get_async com o limite de concorrência do host e novas tentativas.
+    Retorna a resposta (que pode ter status de erro, se as tentativas ou o orçamento se
+    esgotarem) ou levanta a última exceção de requisição.
+    """
+    estado = controlador(urlsplit(url).hostname or "")
+    estado.estatisticas["urls"] += 1
+    _orcamento["iniciadas"] += 1
+    tentativa = 0
+    while True:
+        await estado.adquire()
+        inicio = time.perf_counter()
+        resposta = erro = None
+        try:
+            resposta = await http_cache.get_async(session, url, headers, timeout=TIMEOUT)
+        except reproducao.RespostaAusente:
+            raise
+        except requests.RequestException as e:
+            erro = e
+        finally:
+            await estado.libera()
+        congestionado = estado.registra(time.perf_counter() - inicio, resposta, erro)
+        if not congestionado:
+            estado.estatisticas["sucessos" if resposta.status_code < 400 else "falhas"] += 1
+            return resposta
+
+        tentativa += 1
+        negada = tentativa < TENTATIVAS and not _consome_orcamento()
+        if tentativa >= TENTATIVAS or negada:
+            estado.estatisticas["falhas"] += 1
+            estado.estatisticas["tentativas_negadas"] += int(negada)
+            if erro is not None:
+                raise erro
+            return resposta
+        estado.estatisticas["novas_tentativas"] += 1
+        espera = _espera(tentativa - 1, resposta)
+        logger.warning(f"{url}: {erro if erro is not None else resposta.status_code}; "
+                       f"nova tentativa {tentativa}/{TENTATIVAS - 1} em {espera:.1f}s "
+                       f"(concorrência {int(estado.limite)}).")
+        await asyncio.sleep(espera)
+
+def estatisticas():
+    """
+    Retorna {host: estatísticas} da execução atual, com o orçamento de novas tentativas usado.
+    """
+    return {host: dict(estado.resumo(), orcamento_usado=_orcamento["usadas"])
+            for host, estado in _controladores.items()}
+
+def log_estatisticas():
+    """
+    Registra no log um resumo por host.
+    """
+    resultado = estatisticas()
+    for host, est in resultado.items():
+        latencias = (f"latência p50 {est['latencia_p50_s'] * 1000:.0f} ms, p95 {est['latencia_p95_s'] * 1000:.0f} ms; "
+                     if "latencia_p50_s" in est else "")
+        logger.info(f"Controle de taxa [{host}]: {est['urls']} URLs, {est['requisicoes']} requisições, "
+                    f"{est['novas_tentativas']} novas tentativas ({est['tentativas_negadas']} negadas pelo orçamento), "
+                    f"{est['status_429']} x 429, {est['status_5xx']} x 5xx, {est['excecoes']} exceções, "
+                    f"{est['falhas']} falhas definitivas; {latencias}concorrência final {est['limite_final']:.1f} "
+                    f"(máx. {est['limite_maximo_atingido']:.1f}, {est['cortes']} reduções).")
+    return resultado
@@ -0,0 +1,298 @@
+"""
+cubo.py
+
+Este módulo materializa um cubo de agregados sobre o esquema estrela: para cada combinação
+dos atributos de análise (Classificacao, Continente, Decada, Ano, Em_Conflito) são guardadas
+as somas e as contagens de valores não nulos de cada medida do fato. Como somas e contagens
+podem ser combinadas, qualquer média (AVG do SQL) por esses atributos é obtida do cuboide
+correspondente sem reler o fato.
+
+Cada célula é identificada por um código inteiro: o código de cada atributo ocupa
+BITS_POR_ATRIBUTO bits, de modo que o cuboide de um subconjunto de atributos é obtido
+mascarando o código da célula base (a mais detalhada). Para a atualização incremental o cubo
+mantém um registro com a célula base e as medidas de cada linha do fato (por Chave_Tempo e
+Chave_Local): as linhas alteradas ou removidas têm a contribuição antiga subtraída e a nova
+somada, e apenas as células afetadas de cada cuboide são alteradas.
+
+O cubo é gravado em DIR_CUBO (sob ./cache, fora dos arquivos versionados: registro das linhas,
+cuboide base e valores dos atributos); os demais cuboides são recalculados a partir do base
+na leitura. Um cubo gravado no local anterior (DIR_CUBO_ANTIGO) ainda é lido enquanto
+DIR_CUBO não tiver um.
+"""
+
+import itertools
+import json
+import os
+
+import numpy as np
+import pandas as pd
+
+from scripts import consultas
+from scripts import dimensoes
+
+DIR_CUBO = "./cache/cubo"
+# Local anterior do cubo, ainda lido enquanto DIR_CUBO não tiver um cubo gravado
+DIR_CUBO_ANTIGO = "./arquivos_analise/cubo"
+
+ATRIBUTOS_CUBO = ["Classificacao", "Continente", "Decada", "Ano", "Em_Conflito"]
+BITS_POR_ATRIBUTO = 12                       # até 4096 valores distintos por atributo
+
+# Medidas do fato; Taxa_Urbanizacao (Populacao_Urbana / Populacao_Total * 100) é calculada por linha
+MEDIDAS_FATO = ["Populacao_Total", "Populacao_Urbana", "Populacao_Rural", "Taxa_Crescimento",
+                "Expectativa_Vida", "Taxa_Mortalidade", "PIB_Per_Capita", "Acesso_Educacao",
+                "Medicos_Por_Habitante"]
+MEDIDAS = MEDIDAS_FATO + ["Taxa_Urbanizacao"]
+COLUNAS = ["linhas"] + ["soma_" + m for m in MEDIDAS] + ["n_" + m for m in MEDIDAS]
+
+# Consultas 1 a 5 do notebook expressas sobre o cubo: (atributos, {coluna de saída: medida})
+CONSULTAS_CUBO = {
+    1: (["Classificacao"], {"media_pib": "PIB_Per_Capita", "media_vida": "Expectativa_Vida",
+                            "media_mortalidade": "Taxa_Mortalidade"}),
+    2: (["Ano", "Classificacao"], {"urban_rate": "Taxa_Urbanizacao"}),
+    3: (["Em_Conflito"], {"media_pop_total": "Populacao_Total", "media_pop_urbana": "Populacao_Urbana",
+                          "media_pib": "PIB_Per_Capita"}),
+    4: (["Classificacao", "Continente"], {"media_mortalidade": "Taxa_Mortalidade"}),
+    5: (["Classificacao"], {"media_pib": "PIB_Per_Capita", "media_vida": "Expectativa_Vida",
+                            "media_mortalidade": "Taxa_Mortalidade"}),
+}
+
+def reticulado(atributos=ATRIBUTOS_CUBO):
+    """
+    Lista os cuboides materializados: todos os subconjuntos de `atributos`, exceto os que
+    contêm Ano e Decada juntos (o Ano já determina a Decada).
+    """
+    return [combinacao for k in range(len(atributos) + 1) for combinacao in itertools.combinations(atributos, k)
+            if not {"Ano", "Decada"} <= set(combinacao)]
+
+def _mascara(atributos):
+    mascara = 0
+    for atributo in atributos:
+        posicao = ATRIBUTOS_CUBO.index(atributo)
+        mascara |= ((1 << BITS_POR_ATRIBUTO) - 1) << (posicao * BITS_POR_ATRIBUTO)
+    return np.int64(mascara)
+
+def _canonico(atributos):
+    return tuple(a for a in ATRIBUTOS_CUBO if a in atributos)
+
+def _chave_linha(df):
+    return (df["Chave_Tempo"].to_numpy(dtype=np.int64) << 32) | df["Chave_Local"].to_numpy(dtype=np.int64)
+
+def _agrega(celulas, valores, sinal=1):
+    """
+    Soma, por célula, o número de linhas e as somas/contagens (não nulos) de cada medida.
+    """
+    presentes = ~np.isnan(valores)
+    dados = np.hstack([np.ones((len(celulas), 1)), np.where(presentes, valores, 0.0), presentes]) * sinal
+    return pd.DataFrame(dados, columns=COLUNAS).groupby(celulas).sum()
+
+def _aplica(cuboide, diferenca):
+    """
+    Soma `diferenca` às células correspondentes de `cuboide` (ambos indexados pelo código da
+    célula): as células já existentes são alteradas no lugar, as novas são acrescentadas e as
+    que ficaram sem linhas são removidas.
+    """
+    posicoes = cuboide.index.get_indexer(diferenca.index)
+    existentes = posicoes >= 0
+    valores = cuboide.to_numpy(copy=True)
+    valores[posicoes[existentes]] += diferenca.to_numpy()[existentes]
+    cuboide = pd.DataFrame(valores, index=cuboide.index, columns=COLUNAS)
+    if (~existentes).any():
+        cuboide = pd.concat([cuboide, diferenca[~existentes]])
+    vazias = cuboide["linhas"].to_numpy() <= 0
+    return cuboide[~vazias] if vazias.any() else cuboide
+
+class Cubo:
+    """
+    Cubo de somas e contagens do fato sobre o reticulado de ATRIBUTOS_CUBO.
+
+    Uso:
+        cubo = Cubo.constroi(resultado)            # saída de run_pipeline, dicionário de tabelas ou diretório
+        cubo.consulta(1)                           # mesmo DataFrame de consultas.consulta_1
+        cubo.media(["Decada", "Em_Conflito"], {"media_crescimento": "Taxa_Crescimento"})
+        cubo.atualiza(resultado, resultado["deltas"])   # run_pipeline incremental
+        cubo.grava(); cubo = Cubo.carrega()
+    """
+
+    def __init__(self):
+        self.valores = {atributo: [] for atributo in ATRIBUTOS_CUBO}   # código -> valor do atributo
+        self._codigos = {atributo: {} for atributo in ATRIBUTOS_CUBO}  # valor do atributo -> código
+        self.linhas = None                 # Chave_Tempo, Chave_Local, Chave_Religiao, Celula e medidas
+        self.base = None                   # cuboide com todos os atributos
+        self.cuboides = {}                 # atributos (ordem de ATRIBUTOS_CUBO) -> DataFrame por célula
+        self._medias = {}                  # cache das respostas de media()
+
+    @classmethod
+    def constroi(cls, origem="./arquivos_analise"):
+        """
+        Constrói o cubo a partir das tabelas do pipeline (ver consultas.carrega_tabelas).
+        """
+        tabelas = consultas.carrega_tabelas(origem)
+        cubo = cls()
+        cubo.linhas = cubo._linhas(tabelas, tabelas["df_fact_final"])
+        cubo.base = _agrega(cubo.linhas["Celula"].to_numpy(), cubo.linhas[MEDIDAS].to_numpy())
+        cubo._materializa()
+        return cubo
+
+    def _codifica(self, atributo, valores):
+        codigos, unicos = pd.factorize(valores, use_na_sentinel=False)
+        indice, lista = self._codigos[atributo], self.valores[atributo]
+        mapa = np.empty(len(unicos), dtype=np.int64)
+        for posicao, valor in enumerate(unicos):
+            valor = None if pd.isna(valor) else (valor.item() if isinstance(valor, np.generic) else valor)
+            if valor not in indice:
+                if len(lista) >= 1 << BITS_POR_ATRIBUTO:
+                    raise ValueError(f"{atributo} tem mais de {1 << BITS_POR_ATRIBUTO} valores distintos.")
+                indice[valor] = len(lista)
+                lista.append(valor)
+            mapa[posicao] = indice[valor]
+        return mapa[codigos]
+
+    def _decodifica(self, atributo, celulas):
+        posicao = ATRIBUTOS_CUBO.index(atributo) * BITS_POR_ATRIBUTO
+        codigos = (celulas >> posicao) & ((1 << BITS_POR_ATRIBUTO) - 1)
+        return np.asarray(self.valores[atributo], dtype=object)[codigos]
+
+    def _linhas(self, tabelas, df_fato):
+        """
+        Resolve os atributos de cada linha de `df_fato` nas dimensões de `tabelas` e monta o
+        registro de linhas do cubo. Linhas com chaves ausentes das dimensões são descartadas.
+        """
+        celulas = np.zeros(len(df_fato), dtype=np.int64)
+        validos = np.ones(len(df_fato), dtype=bool)
+        for posicao, atributo in enumerate(ATRIBUTOS_CUBO):
+            if atributo in consultas.ATRIBUTOS:
+                tabela, chave, coluna_id = consultas.ATRIBUTOS[atributo]
+                indices = pd.Index(tabelas[tabela][coluna_id]).get_indexer(df_fato[chave])
+                validos &= indices >= 0
+                valores = tabelas[tabela][atributo].to_numpy(dtype=object)[indices]
+            else:
+                valores = df_fato[atributo].to_numpy(dtype=object)
+            celulas |= self._codifica(atributo, valores) << (posicao * BITS_POR_ATRIBUTO)
+
+        linhas = pd.DataFrame({
+            "Chave_Tempo": df_fato["Chave_Tempo"].to_numpy(dtype=np.int64),
+            "Chave_Local": df_fato["Chave_Local"].to_numpy(dtype=np.int64),
+            "Chave_Religiao": df_fato["Chave_Religiao"].to_numpy(dtype=np.int64),
+            "Celula": celulas,
+        })
+        medidas = df_fato[MEDIDAS_FATO].to_numpy(dtype="float64", na_value=np.nan)
+        linhas[MEDIDAS_FATO] = medidas
+        total = medidas[:, MEDIDAS_FATO.index("Populacao_Total")]
+        urbana = medidas[:, MEDIDAS_FATO.index("Populacao_Urbana")]
+        linhas["Taxa_Urbanizacao"] = urbana / np.where(total != 0, total, np.nan) * 100
+        return linhas[validos].reset_index(drop=True)
+
+    def _materializa(self):
+        celulas = self.base.index.to_numpy()
+        for atributos in reticulado():
+            self.cuboides[atributos] = self.base.groupby(celulas & _mascara(atributos)).sum()
+        self._medias.clear()
+
+    def atualiza(self, origem, deltas):
+        """
+        Aplica ao cubo as mudanças de uma execução incremental de run_pipeline.
+
+        Parâmetros:
+            origem: tabelas atuais (saída de run_pipeline ou ver consultas.carrega_tabelas)
+            deltas: dicionário com 'df_fact_final' (linhas novas/alteradas), 'fatos_removidos'
+                e, opcionalmente, os deltas das dimensões; linhas do fato que referenciam
+                membros com atributos alterados também são reagregadas
+
+        Retorna {'linhas_removidas', 'linhas_inseridas', 'celulas_afetadas'}.
+        """
+        tabelas = consultas.carrega_tabelas(origem)
+        novas = [deltas.get("df_fact_final")]
+        fato = tabelas["df_fact_final"]
+        for tabela, chave, coluna_id in set(consultas.ATRIBUTOS.values()):
+            delta_dimensao = deltas.get(tabela)
+            if delta_dimensao is not None and not delta_dimensao.empty:
+                novas.append(fato[fato[chave].isin(delta_dimensao[coluna_id])])
+        novas = [df for df in novas if df is not None and not df.empty]
+        novas = (pd.concat(novas).drop_duplicates(subset=dimensoes.CHAVES_FATO)
+                 if novas else fato.iloc[:0])
+        removidos = deltas.get("fatos_removidos")
+
+        afetadas = _chave_linha(novas)
+        if removidos is not None and not removidos.empty:
+            afetadas = np.concatenate([afetadas, _chave_linha(removidos)])
+        antigas = pd.Index(_chave_linha(self.linhas)).isin(afetadas)
+        linhas_novas = self._linhas(tabelas, novas)
+
+        diferenca = _agrega(
+            np.concatenate([self.linhas["Celula"].to_numpy()[antigas], linhas_novas["Celula"].to_numpy()]),
+            np.vstack([self.linhas.loc[antigas, MEDIDAS].to_numpy(), linhas_novas[MEDIDAS].to_numpy()]),
+            np.concatenate([-np.ones((antigas.sum(), 1)), np.ones((len(linhas_novas), 1))]))
+        self.base = _aplica(self.base, diferenca)
+        celulas = diferenca.index.to_numpy()
+        for atributos, cuboide in self.cuboides.items():
+            self.cuboides[atributos] = _aplica(cuboide, diferenca.groupby(celulas & _mascara(atributos)).sum())
+        self.linhas = pd.concat([self.linhas[~antigas], linhas_novas], ignore_index=True)
+        self._medias.clear()
+        return {"linhas_removidas": int(antigas.sum()), "linhas_inseridas": len(linhas_novas),
+                "celulas_afetadas": len(diferenca)}
+
+    def media(self, atributos, medidas):
+        """
+        Equivalente a SELECT atributos, AVG(medida)... GROUP BY atributos, respondido pelo
+        cuboide dos `atributos`. `medidas` é {coluna de saída: medida de MEDIDAS}.
+        """
+        chave = (tuple(atributos), tuple(medidas.items()))
+        if chave not in self._medias:
+            canonico = _canonico(atributos)
+            if canonico not in self.cuboides:
+                raise ValueError(f"Combinação fora do cubo: {list(atributos)} (Ano e Decada não são combinados).")
+            cuboide = self.cuboides[canonico]
+            celulas = cuboide.index.to_numpy()
+            resultado = pd.DataFrame(index=np.arange(len(cuboide)))
+            for atributo in atributos:
+                resultado[atributo] = self._decodifica(atributo, celulas)
+            for nome, medida in medidas.items():
+                contagem = cuboide["n_" + medida].to_numpy()
+                resultado[nome] = np.divide(cuboide["soma_" + medida].to_numpy(), contagem,
+                                            out=np.full(len(contagem), np.nan), where=contagem > 0)
+            if atributos:
+                resultado = resultado.sort_values(list(atributos), ignore_index=True)
+            self._medias[chave] = resultado
+        return self._medias[chave].copy()
+
+    def consulta(self, numero):
+        """
+        Responde a Consulta `numero` (1 a 5) do notebook a partir do cubo.
+        """
+        atributos, medidas = CONSULTAS_CUBO[numero]
+        return self.media(atributos, medidas)
+
+    def grava(self, diretorio=DIR_CUBO):
+        """
+        Grava o registro de linhas, o cuboide base e os valores dos atributos em `diretorio`.
+        """
+        base = self.base.rename_axis("Celula").reset_index()
+        dimensoes.salva_registros({"linhas": self.linhas, "base": base}, diretorio)
+        caminho = os.path.join(diretorio, "valores.json")
+        with open(caminho + ".tmp", "w", encoding="utf-8") as f:
+            json.dump(self.valores, f, ensure_ascii=False)
+        os.replace(caminho + ".tmp", caminho)
+
+    @classmethod
+    def carrega(cls, diretorio=None):
+        """
+        Lê um cubo gravado com grava (ou None se não houver) e rematerializa os cuboides.
+        `diretorio` None usa DIR_CUBO ou, se ele ainda não tiver um cubo, DIR_CUBO_ANTIGO.
+        """
+        if diretorio is None:
+            diretorio = DIR_CUBO
+            if not os.path.exists(os.path.join(diretorio, "valores.json")):
+                # Mantém o cubo gravado antes da mudança de diretório (a próxima gravação já usa o novo)
+                diretorio = DIR_CUBO_ANTIGO
+        caminho = os.path.join(diretorio, "valores.json")
+        if not os.path.exists(caminho):
+            return None
+        cubo = cls()
+        with open(caminho, "r", encoding="utf-8") as f:
+            cubo.valores = {atributo: valores for atributo, valores in json.load(f).items()}
+        cubo._codigos = {atributo: {valor: codigo for codigo, valor in enumerate(valores)}
+                         for atributo, valores in cubo.valores.items()}
+        cubo.linhas = dimensoes.carrega_registro("linhas", diretorio)
+        cubo.base = dimensoes.carrega_registro("base", diretorio).set_index("Celula")[COLUNAS]
+        cubo._materializa()
+        return cubo
@@ -8,32 +8,69 @@ As funções aqui definidas realizam o download dos dados, o tratamento necessá
 """
 
 import pandas as pd
-import requests
+import numpy as np
+from concurrent.futures import ThreadPoolExecutor
+from scripts import http_cache
+from scripts import armazenamento
+from scripts import faixas
+from scripts import metricas
+
+OWID_HEADERS = {'User-Agent': 'Our World In Data data fetch/1.0'}
+
+# Gráfico do Our World in Data lido por cada fetch_* (nomes dos parâmetros de integration.run_pipeline)
+GRAFICOS_OWID = {
+    'df_pib_per_capita': 'gdp-per-capita-worldbank',
+    'df_acesso_educacao': 'learning-outcomes-vs-gdp-per-capita',
+    'df_expectativa_vida': 'life-expectancy',
+    'df_em_conflito': 'civilian-and-combatant-deaths-in-armed-conflicts-based-on-where-they-occurred',
+}
+
+# URL do CSV (ou, com extensao='metadata.json', dos metadados) de um gráfico de GRAFICOS_OWID
+def url_owid(fonte, extensao='csv'):
+    return f"https://ourworldindata.org/grapher/{GRAFICOS_OWID[fonte]}.{extensao}?v=1&csvType=full&useColumnShortNames=true"
+
+# Lê um CSV remoto passando pelo cache HTTP em disco (revalidação via ETag/Last-Modified).
+# O conteúdo é convertido uma vez para Parquet e apenas `colunas` são carregadas.
+def ler_csv_remoto(url, colunas=None, dtypes=None):
+    response = http_cache.get(url, headers=OWID_HEADERS)
+    response.raise_for_status()
+    nome = url.split("/grapher/")[-1].split(".csv")[0]
+    return armazenamento.ler_csv_bytes(nome, response, colunas, dtypes)
+
+# Lê um JSON remoto passando pelo cache HTTP em disco
+def ler_json_remoto(url):
+    response = http_cache.get(url, headers=OWID_HEADERS)
+    response.raise_for_status()
+    return response.json()
 
 # Função para buscar e tratar dados do PIB per capita
-def fetch_pib_per_capita():
-    df_pib_per_capita = pd.read_csv(
-        "https://ourworldindata.org/grapher/gdp-per-capita-worldbank.csv?v=1&csvType=full&useColumnShortNames=true",
-        storage_options={'User-Agent': 'Our World In Data data fetch/1.0'}
+@metricas.mede('dados_fetch.pib_per_capita')
+def fetch_pib_per_capita(incluir_metadados=False):
+    df_pib_per_capita = ler_csv_remoto(
+        url_owid('df_pib_per_capita'),
+        colunas=['Entity', 'Code', 'Year', 'ny_gdp_pcap_pp_kd']
     )
-    metadata = requests.get(
-        "https://ourworldindata.org/grapher/gdp-per-capita-worldbank.metadata.json?v=1&csvType=full&useColumnShortNames=true"
-    ).json()
+    metadata = ler_json_remoto(
+        url_owid('df_pib_per_capita', 'metadata.json')
+    ) if incluir_metadados else None
     df_pib_per_capita.rename(columns={'ny_gdp_pcap_pp_kd': 'PIB_Per_Capita'}, inplace=True)
     df_pib_per_capita['Year'] = df_pib_per_capita['Year'].astype(int)
     df_pib_per_capita['PIB_Per_Capita'] = pd.to_numeric(df_pib_per_capita['PIB_Per_Capita'], errors='coerce')
     df_pib_per_capita.dropna(subset=['PIB_Per_Capita'], inplace=True)
+    if metadata is not None:
+        df_pib_per_capita.attrs['metadata'] = metadata
     return df_pib_per_capita
 
 # Função para buscar e tratar dados de acesso à educação
-def fetch_acesso_educacao():
-    df_acesso_educacao = pd.read_csv(
-        "https://ourworldindata.org/grapher/learning-outcomes-vs-gdp-per-capita.csv?v=1&csvType=full&useColumnShortNames=true",
-        storage_options={'User-Agent': 'Our World In Data data fetch/1.0'}
+@metricas.mede('dados_fetch.acesso_educacao')
+def fetch_acesso_educacao(incluir_metadados=False):
+    df_acesso_educacao = ler_csv_remoto(
+        url_owid('df_acesso_educacao'),
+        colunas=['Entity', 'Code', 'Year', 'harmonized_test_scores']
     )
-    metadata = requests.get(
-        "https://ourworldindata.org/grapher/learning-outcomes-vs-gdp-per-capita.metadata.json?v=1&csvType=full&useColumnShortNames=true"
-    ).json()
+    metadata = ler_json_remoto(
+        url_owid('df_acesso_educacao', 'metadata.json')
+    ) if incluir_metadados else None
     df_acesso_educacao['Year'] = df_acesso_educacao['Year'].astype(int)
     df_acesso_educacao['harmonized_test_scores'] = pd.to_numeric(df_acesso_educacao['harmonized_test_scores'], errors='coerce')
     df_acesso_educacao.dropna(subset=['harmonized_test_scores'], inplace=True)
@@ -41,27 +78,37 @@ def fetch_acesso_educacao():
     max_score = df_acesso_educacao['harmonized_test_scores'].max()
     df_acesso_educacao['Acesso_Educacao'] = ((df_acesso_educacao['harmonized_test_scores'] - min_score) / (max_score - min_score)) * 100
     df_acesso_educacao = df_acesso_educacao[['Entity', 'Code', 'Year', 'Acesso_Educacao']]
+    if metadata is not None:
+        df_acesso_educacao.attrs['metadata'] = metadata
     return df_acesso_educacao
 
 # Função para buscar e tratar dados de expectativa de vida
-def fetch_expectativa_vida():
-    df_expectativa_vida = pd.read_csv(
-        "https://ourworldindata.org/grapher/life-expectancy.csv?v=1&csvType=full&useColumnShortNames=true",
-        storage_options={'User-Agent': 'Our World In Data data fetch/1.0'}
+@metricas.mede('dados_fetch.expectativa_vida')
+def fetch_expectativa_vida(incluir_metadados=False):
+    df_expectativa_vida = ler_csv_remoto(
+        url_owid('df_expectativa_vida'),
+        colunas=['Entity', 'Code', 'Year', 'life_expectancy_0__sex_total__age_0']
     )
-    metadata = requests.get(
-        "https://ourworldindata.org/grapher/life-expectancy.metadata.json?v=1&csvType=full&useColumnShortNames=true"
-    ).json()
+    metadata = ler_json_remoto(
+        url_owid('df_expectativa_vida', 'metadata.json')
+    ) if incluir_metadados else None
     df_expectativa_vida.rename(columns={'life_expectancy_0__sex_total__age_0': 'Expectativa_Vida'}, inplace=True)
     df_expectativa_vida['Year'] = df_expectativa_vida['Year'].astype(int)
     df_expectativa_vida['Expectativa_Vida'] = pd.to_numeric(df_expectativa_vida['Expectativa_Vida'], errors='coerce')
     df_expectativa_vida.dropna(subset=['Expectativa_Vida'], inplace=True)
 
+    if metadata is not None:
+        df_expectativa_vida.attrs['metadata'] = metadata
     return df_expectativa_vida
 
 # Função para buscar e tratar dados de taxa de mortalidade
+@metricas.mede('dados_fetch.taxa_mortalidade')
 def fetch_taxa_mortalidade():
-    df_taxa_mortalidade = pd.read_csv('./data/taxa_mortalidade.csv')
+    df_taxa_mortalidade = armazenamento.ler_csv_local(
+        './data/taxa_mortalidade.csv',
+        colunas=['Country Name', 'Year', 'Sex', 'Age group code', 'Death rate per 100 000 population'],
+        dtypes={'Year': 'int64', 'Death rate per 100 000 population': 'float64'}
+    )
     df_taxa_mortalidade = df_taxa_mortalidade[
         (df_taxa_mortalidade['Sex'] == 'All') &
         (df_taxa_mortalidade['Age group code'] == 'Age_all')
@@ -72,8 +119,13 @@ def fetch_taxa_mortalidade():
     return df_taxa_mortalidade
 
 # Função para buscar e tratar dados de médicos por habitante
+@metricas.mede('dados_fetch.medicos_por_habitante')
 def fetch_medicos_por_habitante():
-    df_medicos_por_habitante = pd.read_csv('./data/medicos_por_habitante.csv')
+    df_medicos_por_habitante = armazenamento.ler_csv_local(
+        './data/medicos_por_habitante.csv',
+        colunas=['Location', 'Period', 'Value'],
+        dtypes={'Period': 'int64', 'Value': 'float64'}
+    )
     df_medicos_por_habitante['Period'] = df_medicos_por_habitante['Period'].astype(int)
     df_medicos_por_habitante['Medicos_Por_Habitante'] = pd.to_numeric(df_medicos_por_habitante['Value'], errors='coerce')
     df_medicos_por_habitante.dropna(subset=['Medicos_Por_Habitante'], inplace=True)
@@ -81,74 +133,78 @@ def fetch_medicos_por_habitante():
     return df_medicos_por_habitante
 
 # Função para buscar e tratar dados de conflitos armados
-def fetch_em_conflito():
-    df_em_conflito = pd.read_csv(
-        "https://ourworldindata.org/grapher/civilian-and-combatant-deaths-in-armed-conflicts-based-on-where-they-occurred.csv?v=1&csvType=full&useColumnShortNames=true",
-        storage_options={'User-Agent': 'Our World In Data data fetch/1.0'}
+# (`limites` substitui os limites de mortes de faixas.FAIXAS['Em_Conflito'], e.g. [50, 500])
+@metricas.mede('dados_fetch.em_conflito')
+def fetch_em_conflito(incluir_metadados=False, limites=None):
+    df_em_conflito = ler_csv_remoto(
+        url_owid('df_em_conflito'),
+        colunas=['Entity', 'Code', 'Year', 'number_deaths_civilians__conflict_type_all',
+                 'number_deaths_unknown__conflict_type_all', 'number_deaths_combatants__conflict_type_all']
     )
-    metadata = requests.get(
-        "https://ourworldindata.org/grapher/civilian-and-combatant-deaths-in-armed-conflicts-based-on-where-they-occurred.metadata.json?v=1&csvType=full&useColumnShortNames=true"
-    ).json()
+    metadata = ler_json_remoto(
+        url_owid('df_em_conflito', 'metadata.json')
+    ) if incluir_metadados else None
     df_em_conflito['total_deaths'] = (
         df_em_conflito['number_deaths_civilians__conflict_type_all'] +
         df_em_conflito['number_deaths_unknown__conflict_type_all'] +
         df_em_conflito['number_deaths_combatants__conflict_type_all']
     )
-    def conflict_level(deaths):
-        if deaths < 100:
-            return 'Baixo'
-        elif deaths < 1000:
-            return 'Médio'
-        else:
-            return 'Alto'
-    df_em_conflito['Em_Conflito'] = df_em_conflito['total_deaths'].apply(conflict_level)
+    # Classificação vetorizada pelos limites declarados em faixas.FAIXAS['Em_Conflito'] (Baixo < Médio < Alto)
+    faixas.aplica_faixas(df_em_conflito, 'Em_Conflito', limites=limites)
+    if metadata is not None:
+        df_em_conflito.attrs['metadata'] = metadata
     return df_em_conflito
 
+# Dicionário de mapeamento: coluna de religião -> classificação
+RELIGIAO_MAPPING = {
+    "christianity_protestant": "Cristão",
+    "christianity_romancatholic": "Cristão",
+    "christianity_easternorthodox": "Cristão",
+    "christianity_anglican": "Cristão",
+    "christianity_other": "Cristão",
+    "christianity_all": "Cristão",
+    "judaism_orthodox": "Judaico",
+    "judaism_conservative": "Judaico",
+    "judaism_reform": "Judaico",
+    "judaism_other": "Judaico",
+    "judaism_all": "Judaico",
+    "islam_sunni": "Muçulmano",
+    "islam_shi’a": "Muçulmano",
+    "islam_ibadhi": "Muçulmano",
+    "islam_nationofislam": "Muçulmano",
+    "islam_alawite": "Muçulmano",
+    "islam_ahmadiyya": "Muçulmano",
+    "islam_other": "Muçulmano",
+    "islam_all": "Muçulmano",
+    "buddhism_mahayana": "Budista",
+    "buddhism_theravada": "Budista",
+    "buddhism_other": "Budista",
+    "buddhism_all": "Budista",
+    "zoroastrianism_all": "Outros",
+    "hinduism_all": "Hindu",
+    "sikhism_all": "Outros",
+    "shinto_all": "Tradicionais",
+    "baha’i_all": "Outros",
+    "taoism_all": "Tradicionais",
+    "jainism_all": "Tradicionais",
+    "confucianism_all": "Tradicionais",
+    "syncretism_all": "Outros",
+    "animism_all": "Tradicionais",
+    "noreligion_all": "Secular/Não Religioso",
+    "otherreligion_all": "Outros"
+}
+
 # Função para buscar, tratar e unificar dados de religião
+@metricas.mede('dados_fetch.religiao')
 def fetch_religiao():
-    df_fetch_religiao = pd.read_csv("./data/national.csv")
-
-    # Dicionário de mapeamento: coluna de religião -> classificação
-    religiao_mapping = {
-        "christianity_protestant": "Cristão",
-        "christianity_romancatholic": "Cristão",
-        "christianity_easternorthodox": "Cristão",
-        "christianity_anglican": "Cristão",
-        "christianity_other": "Cristão",
-        "christianity_all": "Cristão",
-        "judaism_orthodox": "Judaico",
-        "judaism_conservative": "Judaico",
-        "judaism_reform": "Judaico",
-        "judaism_other": "Judaico",
-        "judaism_all": "Judaico",
-        "islam_sunni": "Muçulmano",
-        "islam_shi’a": "Muçulmano",
-        "islam_ibadhi": "Muçulmano",
-        "islam_nationofislam": "Muçulmano",
-        "islam_alawite": "Muçulmano",
-        "islam_ahmadiyya": "Muçulmano",
-        "islam_other": "Muçulmano",
-        "islam_all": "Muçulmano",
-        "buddhism_mahayana": "Budista",
-        "buddhism_theravada": "Budista",
-        "buddhism_other": "Budista",
-        "buddhism_all": "Budista",
-        "zoroastrianism_all": "Outros",
-        "hinduism_all": "Hindu",
-        "sikhism_all": "Outros",
-        "shinto_all": "Tradicionais",
-        "baha’i_all": "Outros",
-        "taoism_all": "Tradicionais",
-        "jainism_all": "Tradicionais",
-        "confucianism_all": "Tradicionais",
-        "syncretism_all": "Outros",
-        "animism_all": "Tradicionais",
-        "noreligion_all": "Secular/Não Religioso",
-        "otherreligion_all": "Outros"
-    }
+    df_fetch_religiao = armazenamento.ler_csv_local(
+        "./data/national.csv",
+        colunas=["year", "state"] + list(RELIGIAO_MAPPING),
+        dtypes={"year": "int64"}
+    )
 
     # Lista de colunas de religiões a serem "derretidas"
-    colunas_religiao = list(religiao_mapping.keys())
+    colunas_religiao = list(RELIGIAO_MAPPING.keys())
 
     df_religiao = df_fetch_religiao.melt(
         id_vars=["year", "state"],
@@ -158,7 +214,7 @@ def fetch_religiao():
     )
 
     df_religiao["quantidade"] = pd.to_numeric(df_religiao["quantidade"], errors="coerce").fillna(0)
-    df_religiao["classificacao"] = df_religiao["religiao"].map(religiao_mapping)
+    df_religiao["classificacao"] = df_religiao["religiao"].map(RELIGIAO_MAPPING)
     df_religiao.rename(columns={"state": "nome do pais", "year": "ano"}, inplace=True)
 
     # Agregação: para cada país e ano, identificar a linha (religião) com maior quantidade
@@ -171,3 +227,67 @@ def fetch_religiao():
 
     return df_religiao
 
+# Versão vetorizada de fetch_religiao: a religião predominante de cada país/ano é obtida com um
+# único argmax por linha sobre o bloco numérico em formato largo, sem melt/idxmax/merge.
+# Retorna dois DataFrames compactos, aceitos por integration.run_pipeline:
+#   - df_religiao_predominante: ano, nome do pais, Religiao_Predominante (uma linha por país/ano)
+#   - df_religiao_classificacao: religiao, classificacao (uma linha por religião)
+@metricas.mede('dados_fetch.religiao_predominante')
+def fetch_religiao_predominante():
+    df_fetch_religiao = armazenamento.ler_csv_local(
+        "./data/national.csv",
+        colunas=["year", "state"] + list(RELIGIAO_MAPPING),
+        dtypes={"year": "int64"}
+    )
+    df_fetch_religiao = df_fetch_religiao.dropna(subset=["year", "state"])
+    colunas_religiao = list(RELIGIAO_MAPPING.keys())
+
+    valores = df_fetch_religiao[colunas_religiao]
+    nao_numericas = [c for c in colunas_religiao if not pd.api.types.is_numeric_dtype(valores[c])]
+    if nao_numericas:
+        valores = valores.assign(**{c: pd.to_numeric(valores[c], errors="coerce") for c in nao_numericas})
+    valores = valores.fillna(0)
+    chaves = df_fetch_religiao[["year", "state"]]
+    if chaves.duplicated().any():
+        # Mesmo resultado do idxmax sobre o formato longo: vence a primeira coluna com o maior valor do grupo
+        valores = valores.groupby([chaves["year"], chaves["state"]], sort=False).max()
+        chaves = valores.index.to_frame(index=False)
+
+    posicoes = valores.to_numpy(dtype="float64").argmax(axis=1)
+    df_religiao_predominante = pd.DataFrame({
+        "ano": chaves["year"].to_numpy(),
+        "nome do pais": chaves["state"].to_numpy(),
+        "Religiao_Predominante": np.asarray(colunas_religiao, dtype=object)[posicoes],
+    })
+    df_religiao_classificacao = pd.DataFrame({
+        "religiao": colunas_religiao,
+        "classificacao": [RELIGIAO_MAPPING[r] for r in colunas_religiao],
+    })
+    return df_religiao_predominante, df_religiao_classificacao
+
+# Fontes buscadas por fetch_all, com os nomes dos parâmetros de integration.run_pipeline.
+# As fontes do Our World in Data aceitam o parâmetro incluir_metadados.
+FONTES_OWID = {
+    'df_pib_per_capita': fetch_pib_per_capita,
+    'df_acesso_educacao': fetch_acesso_educacao,
+    'df_expectativa_vida': fetch_expectativa_vida,
+    'df_em_conflito': fetch_em_conflito,
+}
+FONTES_LOCAIS = {
+    'df_taxa_mortalidade': fetch_taxa_mortalidade,
+    'df_medicos_por_habitante': fetch_medicos_por_habitante,
+}
+
+# Busca todas as fontes em paralelo (pool de threads); o tempo total fica limitado pela fonte mais lenta.
+# Retorna um dicionário com os nomes dos parâmetros de integration.run_pipeline, permitindo
+# integration.run_pipeline(df_historico_pais, **dados_fetch.fetch_all()).
+# A religião usa o caminho compacto (fetch_religiao_predominante).
+@metricas.mede('dados_fetch.all')
+def fetch_all(incluir_metadados=False, max_workers=None):
+    with ThreadPoolExecutor(max_workers=max_workers or len(FONTES_OWID) + len(FONTES_LOCAIS) + 1) as executor:
+        futuros = {nome: executor.submit(funcao, incluir_metadados) for nome, funcao in FONTES_OWID.items()}
+        futuros.update({nome: executor.submit(funcao) for nome, funcao in FONTES_LOCAIS.items()})
+        futuro_religiao = executor.submit(fetch_religiao_predominante)
+        dados = {nome: futuro.result() for nome, futuro in futuros.items()}
+        dados['df_religiao_final'], dados['df_religiao_classificacao'] = futuro_religiao.result()
+        return dados
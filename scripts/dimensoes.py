@@ -0,0 +1,137 @@
+"""
+dimensoes.py
+
+Este módulo mantém registros persistentes das dimensões (Dim_Tempo, Dim_Local, Dim_Religiao)
+e do fato entre execuções do pipeline. Cada registro guarda a chave natural de cada membro
+(Ano, Pais, Nome_Religiao) e a chave substituta atribuída a ele: membros já conhecidos mantêm
+o mesmo ID e membros novos recebem IDs a partir do maior já usado, de modo que a chegada de um
+país ou ano novo não renumera a dimensão nem obriga a recarregar Fato_Populacao inteiro.
+
+Para o fato é guardado um hash de cada linha por (Chave_Tempo, Chave_Local); a cada execução
+apenas as linhas novas ou alteradas (e as chaves que deixaram de existir) são emitidas.
+
+Os registros ficam em DIR_REGISTROS (sob ./cache, fora dos arquivos versionados); apagar o
+diretório faz a próxima execução numerar tudo novamente a partir de 1.
+"""
+
+import os
+
+import numpy as np
+import pandas as pd
+
+DIR_REGISTROS = "./cache/registros"
+# Local anterior dos registros, ainda lido enquanto DIR_REGISTROS não tiver o registro
+DIR_REGISTROS_ANTIGO = "./arquivos_analise/registros"
+
+# Chaves do fato usadas para detectar linhas novas, alteradas e removidas
+CHAVES_FATO = ["Chave_Tempo", "Chave_Local"]
+
+def _caminho(diretorio, nome):
+    return os.path.join(diretorio or DIR_REGISTROS, nome + ".csv")
+
+def _grava_atomico(df, caminho):
+    os.makedirs(os.path.dirname(caminho), exist_ok=True)
+    temporario = caminho + ".tmp"
+    df.to_csv(temporario, index=False, encoding="utf-8-sig")
+    os.replace(temporario, caminho)
+
+def carrega_registro(nome, diretorio=None):
+    """
+    Lê o registro `nome` (ou None se ainda não existir).
+    """
+    caminho = _caminho(diretorio, nome)
+    if not os.path.exists(caminho) and diretorio is None:
+        # Mantém os IDs atribuídos antes da mudança de diretório (a próxima gravação já usa o novo)
+        caminho = _caminho(DIR_REGISTROS_ANTIGO, nome)
+    if not os.path.exists(caminho):
+        return None
+    return pd.read_csv(caminho, encoding="utf-8-sig", keep_default_na=False, na_values=[""])
+
+def atualiza_dimensao(nome, membros, chave, coluna_id, diretorio=None):
+    """
+    Concilia os membros da execução atual com o registro persistido da dimensão.
+
+    Parâmetros:
+        nome: nome do registro (ex.: 'dim_local')
+        membros: DataFrame com a chave natural e os atributos da dimensão, na ordem desejada
+            para a atribuição de IDs novos
+        chave: coluna da chave natural (ex.: 'Pais')
+        coluna_id: coluna da chave substituta (ex.: 'ID_Local')
+
+    Retorna (dimensao, delta):
+        dimensao: registro completo (membros antigos e novos) com coluna_id, ainda não gravado
+        delta: apenas os membros novos ou cujos atributos mudaram
+    """
+    membros = membros.drop_duplicates(subset=[chave])
+    atributos = [c for c in membros.columns if c != chave]
+    registro = carrega_registro(nome, diretorio)
+
+    if registro is None or registro.empty:
+        dimensao = membros.copy()
+        dimensao[coluna_id] = np.arange(1, len(dimensao) + 1)
+        return dimensao, dimensao.copy()
+
+    registro = registro.astype({chave: membros[chave].dtype})
+    ids = pd.Index(registro[chave]).get_indexer(membros[chave])
+    novos = membros[ids < 0].copy()
+    novos[coluna_id] = np.arange(1, len(novos) + 1) + int(registro[coluna_id].max())
+
+    # Membros conhecidos: atributos atualizados pela execução atual, ID preservado
+    existentes = membros[ids >= 0].copy()
+    anteriores = registro.iloc[ids[ids >= 0]].reset_index(drop=True)
+    existentes[coluna_id] = anteriores[coluna_id].to_numpy()
+    alterados = np.zeros(len(existentes), dtype=bool)
+    for atributo in atributos:
+        if atributo in anteriores.columns:
+            alterados |= (existentes[atributo].astype(str).to_numpy()
+                          != anteriores[atributo].astype(str).to_numpy())
+        else:
+            alterados[:] = True
+
+    atualizados = pd.Index(registro[chave]).isin(existentes[chave])
+    dimensao = pd.concat([registro[~atualizados], existentes, novos], ignore_index=True)
+    dimensao = dimensao.sort_values(coluna_id).reset_index(drop=True)[[chave] + atributos + [coluna_id]]
+    delta = pd.concat([existentes[alterados], novos], ignore_index=True)[[chave] + atributos + [coluna_id]]
+    return dimensao, delta
+
+def _hash_linhas(df):
+    return pd.util.hash_pandas_object(df.reset_index(drop=True), index=False).to_numpy()
+
+def hashes_fato(df_fato):
+    """
+    Retorna as chaves (Chave_Tempo, Chave_Local) de df_fato com o hash de cada linha.
+    """
+    return df_fato[CHAVES_FATO].reset_index(drop=True).assign(Hash=_hash_linhas(df_fato).astype(str))
+
+def delta_fato(df_fato, nome="fato_hashes", diretorio=None):
+    """
+    Compara o fato da execução atual com os hashes persistidos da execução anterior.
+
+    Retorna (delta, removidos, hashes):
+        delta: linhas de df_fato novas ou alteradas
+        removidos: chaves (Chave_Tempo, Chave_Local) presentes antes e ausentes agora
+        hashes: DataFrame de hashes a ser gravado com salva_registros
+    """
+    hashes = hashes_fato(df_fato)
+    chaves = hashes[CHAVES_FATO]
+    anterior = carrega_registro(nome, diretorio)
+    if anterior is None:
+        return df_fato.copy(), pd.DataFrame(columns=CHAVES_FATO), hashes
+
+    def codifica(df):
+        return (df["Chave_Tempo"].astype("float64").to_numpy() * 1e9
+                + df["Chave_Local"].astype("float64").to_numpy())
+
+    anterior_idx = pd.Index(codifica(anterior))
+    posicoes = anterior_idx.get_indexer(codifica(chaves))
+    hash_anterior = np.where(posicoes >= 0, anterior["Hash"].astype(str).to_numpy()[posicoes], "")
+    mudou = (posicoes < 0) | (hash_anterior != hashes["Hash"].to_numpy())
+    removidos = anterior.loc[~anterior_idx.isin(codifica(chaves)), CHAVES_FATO].reset_index(drop=True)
+    return df_fato[mudou].copy(), removidos, hashes
+
+def salva_registros(registros, diretorio=None):
+    """
+    Grava os registros ({nome: DataFrame}) depois que a execução terminou com sucesso.
+    """
+    for nome, df in registros.items():
+        _grava_atomico(df, _caminho(diretorio, nome))
@@ -0,0 +1,196 @@
+"""
+entidades.py
+
+Este módulo resolve os nomes de países das diversas fontes para uma tabela canônica
+(data/paises.csv: código ISO3, nome no Worldometers e aliases usados por OWID, COW e OMS).
+Os nomes são normalizados (acentos, caixa, pontuação, "&"/"and", "St."/"Saint", ordem das
+palavras) e procurados em um índice exato; os que não forem encontrados passam por uma busca
+aproximada em um índice de trigramas pré-calculado. A resolução é feita em lote: cada nome
+distinto de uma coluna é resolvido uma única vez. Para cada fonte é mantido um relatório com
+as taxas de correspondência e a lista de nomes não resolvidos.
+"""
+
+import logging
+import re
+import unicodedata
+from collections import defaultdict
+
+import numpy as np
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+TABELA_PAISES = "./data/paises.csv"
+LIMIAR_SIMILARIDADE = 0.85
+
+# Palavras removidas e substituições aplicadas na normalização dos nomes
+PALAVRAS_IGNORADAS = {"the", "of", "and"}
+SUBSTITUICOES = {"st": "saint"}
+
+def normaliza(nome):
+    """
+    Normaliza um nome de país: remove acentos, converte para minúsculas, troca pontuação
+    por espaços e remove palavras irrelevantes. Ex.: "St. Vincent & Grenadines" -> "saint vincent grenadines".
+    """
+    if pd.isna(nome):
+        return ""
+    texto = unicodedata.normalize("NFKD", str(nome))
+    texto = "".join(c for c in texto if not unicodedata.combining(c)).lower().replace("&", " and ")
+    tokens = [SUBSTITUICOES.get(t, t) for t in re.split(r"[^a-z0-9]+", texto) if t]
+    return " ".join(t for t in tokens if t not in PALAVRAS_IGNORADAS)
+
+def _ordenado(normalizado):
+    return " ".join(sorted(normalizado.split()))
+
+def _trigramas(normalizado):
+    texto = f" {normalizado} "
+    return {texto[i:i + 3] for i in range(len(texto) - 2)}
+
+class ResolvedorEntidades:
+    """
+    Índice de resolução de nomes de países para códigos ISO3.
+
+    Uso:
+        resolvedor = ResolvedorEntidades()
+        iso3 = resolvedor.resolve(df['Entity'], fonte='owid_pib')   # Series com ISO3 (None se não resolvido)
+        nomes = resolvedor.padroniza(df['Entity'], fonte='owid_pib')  # nome canônico em minúsculas
+        resolvedor.relatorio()                                        # taxas por fonte
+    """
+
+    def __init__(self, caminho=TABELA_PAISES, limiar=LIMIAR_SIMILARIDADE):
+        self.limiar = limiar
+        self.tabela = pd.read_csv(caminho, keep_default_na=False)
+        self.nomes = dict(zip(self.tabela["iso3"], self.tabela["nome"]))
+        self._exato = {}
+        self._ordenado = {}
+        self._iso3_aliases = []            # iso3 de cada alias
+        self._tamanhos = []                # número de trigramas de cada alias
+        self._indice_trigramas = defaultdict(list)
+        self._memo = {}                    # nome normalizado -> (iso3, metodo)
+        self._resultados = {}              # fonte -> DataFrame com nome, iso3, metodo, linhas
+
+        for iso3, nome, aliases in self.tabela[["iso3", "nome", "aliases"]].itertuples(index=False):
+            for alias in [nome, iso3] + [a for a in aliases.split("|") if a]:
+                self._adiciona_alias(alias, iso3)
+        # Listas de ocorrência como arrays, para a contagem vetorizada na busca aproximada
+        self._indice_trigramas = {t: np.asarray(p, dtype=np.int64) for t, p in self._indice_trigramas.items()}
+        self._iso3_aliases = np.asarray(self._iso3_aliases, dtype=object)
+        self._tamanhos = np.asarray(self._tamanhos, dtype=np.float64)
+
+    def _adiciona_alias(self, alias, iso3):
+        normalizado = normaliza(alias)
+        if not normalizado:
+            return
+        self._exato.setdefault(normalizado, iso3)
+        self._ordenado.setdefault(_ordenado(normalizado), iso3)
+        trigramas = _trigramas(normalizado)
+        posicao = len(self._iso3_aliases)
+        self._iso3_aliases.append(iso3)
+        self._tamanhos.append(len(trigramas))
+        for trigrama in trigramas:
+            self._indice_trigramas[trigrama].append(posicao)
+
+    def resolve_nome(self, nome):
+        """
+        Resolve um único nome. Retorna (iso3, metodo), com metodo em
+        {'exato', 'aproximado', None}; iso3 é None quando não há correspondência.
+        """
+        normalizado = normaliza(nome)
+        if not normalizado:
+            return None, None
+        if normalizado not in self._memo:
+            self._memo[normalizado] = self._resolve_normalizado(normalizado)
+        return self._memo[normalizado]
+
+    def _resolve_normalizado(self, normalizado):
+        if normalizado in self._exato:
+            return self._exato[normalizado], "exato"
+        chave_ordenada = _ordenado(normalizado)
+        if chave_ordenada in self._ordenado:
+            return self._ordenado[chave_ordenada], "exato"
+
+        # Busca aproximada: trigramas em comum com cada alias (contagem vetorizada sobre as
+        # listas de ocorrência), pontuados pelo coeficiente de Dice
+        trigramas = _trigramas(normalizado)
+        ocorrencias = [self._indice_trigramas[t] for t in trigramas if t in self._indice_trigramas]
+        if not ocorrencias:
+            return None, None
+        comuns = np.bincount(np.concatenate(ocorrencias), minlength=len(self._tamanhos))
+        scores = 2 * comuns / (len(trigramas) + self._tamanhos)
+        melhor = int(scores.argmax())
+        if scores[melhor] >= self.limiar:
+            return self._iso3_aliases[melhor], "aproximado"
+        return None, None
+
+    def resolve(self, serie, fonte=None):
+        """
+        Resolve uma coluna inteira de nomes para ISO3. Cada nome distinto é resolvido uma vez
+        e o resultado é espalhado pelos códigos do pd.factorize. Se `fonte` for informada,
+        o resultado entra no relatório de correspondência (chamadas repetidas com a mesma
+        fonte, como os blocos de run_pipeline_streaming, acumulam as linhas de cada nome).
+        """
+        codigos, unicos = pd.factorize(serie)
+        resolvidos = [self.resolve_nome(nome) for nome in unicos]
+        iso3 = np.array([r[0] for r in resolvidos] + [None], dtype=object)
+        if fonte is not None:
+            linhas = np.bincount(codigos[codigos >= 0], minlength=len(unicos))
+            resultado = pd.DataFrame({
+                "nome": np.asarray(unicos, dtype=object),
+                "iso3": iso3[:-1],
+                "metodo": [r[1] for r in resolvidos],
+                "linhas": linhas,
+            })
+            anterior = self._resultados.get(fonte)
+            if anterior is not None:
+                resultado = (pd.concat([anterior, resultado], ignore_index=True)
+                             .groupby("nome", sort=False, as_index=False)
+                             .agg(iso3=("iso3", "first"), metodo=("metodo", "first"), linhas=("linhas", "sum")))
+            self._resultados[fonte] = resultado
+        return pd.Series(iso3[codigos], index=serie.index, dtype=object)
+
+    def padroniza(self, serie, fonte=None):
+        """
+        Retorna o nome canônico (nome do Worldometers em minúsculas) de cada elemento de `serie`.
+        Nomes não resolvidos são apenas normalizados com strip/lower, como antes.
+        """
+        iso3 = self.resolve(serie, fonte)
+        canonicos = iso3.map(self.nomes).str.lower()
+        return canonicos.fillna(serie.fillna("").astype(str).str.strip().str.lower())
+
+    def relatorio(self):
+        """
+        Retorna um DataFrame com uma linha por fonte: nomes distintos, resolvidos por
+        correspondência exata e aproximada, não resolvidos e as taxas (por nome e por linha).
+        """
+        linhas = []
+        for fonte, df in self._resultados.items():
+            resolvido = df["iso3"].notna()
+            linhas.append({
+                "fonte": fonte,
+                "nomes_unicos": len(df),
+                "resolvidos_exato": int((df["metodo"] == "exato").sum()),
+                "resolvidos_aproximado": int((df["metodo"] == "aproximado").sum()),
+                "nao_resolvidos": int((~resolvido).sum()),
+                "taxa_nomes": resolvido.mean() if len(df) else np.nan,
+                "taxa_linhas": df.loc[resolvido, "linhas"].sum() / df["linhas"].sum() if df["linhas"].sum() else np.nan,
+            })
+        return pd.DataFrame(linhas)
+
+    def nao_resolvidos(self, fonte=None):
+        """
+        Lista os nomes não resolvidos (com o número de linhas afetadas) de uma fonte ou de todas.
+        """
+        partes = []
+        for nome_fonte, df in self._resultados.items():
+            if fonte is None or nome_fonte == fonte:
+                faltantes = df.loc[df["iso3"].isna(), ["nome", "linhas"]]
+                partes.append(faltantes.assign(fonte=nome_fonte)[["fonte", "nome", "linhas"]])
+        if not partes:
+            return pd.DataFrame(columns=["fonte", "nome", "linhas"])
+        return pd.concat(partes, ignore_index=True).sort_values(["fonte", "linhas"], ascending=[True, False])
+
+    def log_relatorio(self):
+        for linha in self.relatorio().itertuples(index=False):
+            logger.info(f"Entidades [{linha.fonte}]: {linha.nomes_unicos} nomes, "
+                        f"{linha.resolvidos_exato} exatos, {linha.resolvidos_aproximado} aproximados, "
+                        f"{linha.nao_resolvidos} não resolvidos ({linha.taxa_linhas:.1%} das linhas).")
@@ -0,0 +1,400 @@
+"""
+esquema.py
+
+Este módulo gera e aplica o desenho físico da tabela fato no PostgreSQL. O esquema de
+carga.py cria Fato_Populacao apenas com a chave primária composta (iniciada por Chave_Tempo);
+Chave_Local e Chave_Religiao, usadas nos JOINs de todas as consultas do notebook, ficam sem
+índice. O desenho gerado aqui pode incluir:
+  - particionamento declarativo por década (PARTITION BY RANGE ("Decada"), uma partição
+    Fato_Populacao_<década> por década e uma partição padrão para as demais), com a coluna
+    "Decada" copiada de Dim_Tempo; filtros por década leem apenas as partições envolvidas;
+  - índices B-tree nas chaves estrangeiras Chave_Local e Chave_Religiao;
+  - índices de cobertura (INCLUDE) para os formatos das Consultas 1 a 5, que permitem
+    index-only scans;
+  - um índice BRIN em Chave_Tempo, pequeno e útil quando o fato é carregado em ordem de tempo.
+
+aplica é idempotente: cria o que falta, remove os índices gerenciados fora do desenho pedido
+e, se o fato existir com o particionamento oposto, migra as linhas para o novo layout em uma
+única transação. Ao final, o fato passa por ANALYZE (carga.analisa).
+
+verifica confere, em um esquema descartável, as duas migrações de layout (com linhas na
+partição padrão movidas para novas partições) e as recargas sobre o fato particionado,
+comparando contagens e conteúdo com os DataFrames carregados.
+
+Uso:
+    conn = carga.conecta(CONN_STRING)
+    esquema.aplica(conn, particionado=True, indices_fk=True, cobertura=False)
+    carga.carrega(conn, dim_tempo, dim_local, dim_religiao, df_fato)
+
+Uso pela linha de comando (a partir da raiz do projeto):
+    python -m scripts.esquema verifica --conn postgresql://... [--dados ./arquivos_analise]
+"""
+
+import argparse
+import logging
+import time
+
+import pandas as pd
+
+from scripts import carga
+
+logger = logging.getLogger(__name__)
+
+FATO = "Fato_Populacao"
+PARTICAO_PADRAO = f"{FATO}_padrao"
+DECADAS_PADRAO = range(1950, 2030, 10)
+
+# Índices gerenciados: nome -> definição (colunas e, nos de cobertura, colunas incluídas)
+INDICES_FK = {
+    f"{FATO}_Local_idx": '("Chave_Local")',
+    f"{FATO}_Religiao_idx": '("Chave_Religiao")',
+}
+
+INDICES_COBERTURA = {
+    # Consultas 1 e 5: médias de PIB, vida e mortalidade por religião
+    f"{FATO}_cob_religiao_idx": '("Chave_Religiao") INCLUDE ("PIB_Per_Capita", "Expectativa_Vida", "Taxa_Mortalidade")',
+    # Consulta 2: taxa de urbanização por ano e religião
+    f"{FATO}_cob_tempo_religiao_idx": '("Chave_Tempo", "Chave_Religiao") INCLUDE ("Populacao_Urbana", "Populacao_Total")',
+    # Consulta 3: médias por nível de conflito
+    f"{FATO}_cob_conflito_idx": '("Em_Conflito") INCLUDE ("Populacao_Total", "Populacao_Urbana", "PIB_Per_Capita")',
+    # Consulta 4: mortalidade por religião e continente
+    f"{FATO}_cob_religiao_local_idx": '("Chave_Religiao", "Chave_Local") INCLUDE ("Taxa_Mortalidade")',
+}
+
+INDICES_BRIN = {
+    f"{FATO}_Tempo_brin": 'USING brin ("Chave_Tempo")',
+}
+
+PK_FATO = ["Chave_Tempo", "Chave_Local", "Chave_Religiao", "Em_Conflito"]
+
+def _particao(decada):
+    return f"{FATO}_{decada}"
+
+def _decadas(decadas):
+    # Décadas pedidas (Series, lista ou range), normalizadas para inteiros múltiplos de 10
+    decadas = DECADAS_PADRAO if decadas is None else decadas
+    return sorted({int(d) // 10 * 10 for d in decadas if pd.notna(d)})
+
+def ddl_fato(particionado=True):
+    """
+    Retorna o CREATE TABLE do fato: o de carga.py ou, particionado, com a coluna "Decada"
+    incluída na chave primária (exigência do particionamento) e PARTITION BY RANGE ("Decada").
+    """
+    if not particionado:
+        return carga.FATO_SQL
+    return f"""
+CREATE TABLE IF NOT EXISTS "{FATO}" ({carga.COLUNAS_FATO_SQL},
+    "Decada" INT NOT NULL,
+    PRIMARY KEY ({carga._aspas(PK_FATO + ["Decada"])}),{carga.CHAVES_ESTRANGEIRAS_FATO_SQL}
+) PARTITION BY RANGE ("Decada");
+"""
+
+def ddl_particoes(decadas=None):
+    """
+    Retorna os CREATE TABLE ... PARTITION OF de cada década e da partição padrão.
+    """
+    comandos = [f'CREATE TABLE IF NOT EXISTS "{_particao(d)}" PARTITION OF "{FATO}" '
+                f"FOR VALUES FROM ({d}) TO ({d + 10})" for d in _decadas(decadas)]
+    comandos.append(f'CREATE TABLE IF NOT EXISTS "{PARTICAO_PADRAO}" PARTITION OF "{FATO}" DEFAULT')
+    return comandos
+
+def indices(indices_fk=True, cobertura=False, brin=False):
+    """
+    Retorna {nome: definição} dos índices do desenho pedido.
+    """
+    escolhidos = {}
+    if indices_fk:
+        escolhidos.update(INDICES_FK)
+    if cobertura:
+        escolhidos.update(INDICES_COBERTURA)
+    if brin:
+        escolhidos.update(INDICES_BRIN)
+    return escolhidos
+
+def gera_ddl(particionado=True, indices_fk=True, cobertura=False, brin=False, decadas=None):
+    """
+    Gera a lista de comandos SQL do desenho físico completo (dimensões, fato, partições e
+    índices), para um banco vazio ou para revisão. Em um banco existente, use aplica.
+    """
+    comandos = [carga.ESQUEMA_DIMENSOES_SQL.strip(), ddl_fato(particionado).strip(), carga.VERSAO_DADOS_SQL.strip()]
+    if particionado:
+        comandos += ddl_particoes(decadas)
+    comandos += [f'CREATE INDEX IF NOT EXISTS "{nome}" ON "{FATO}" {definicao}'
+                 for nome, definicao in indices(indices_fk, cobertura, brin).items()]
+    return comandos
+
+def _layout(cur):
+    # None (fato inexistente), True (particionado) ou False (tabela comum)
+    cur.execute(f"SELECT relkind FROM pg_class WHERE oid = to_regclass('\"{FATO}\"')")
+    linha = cur.fetchone()
+    return None if linha is None else linha[0] == "p"
+
+def _particoes(cur):
+    cur.execute(f"""SELECT c.relname FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid
+                    WHERE i.inhparent = to_regclass('"{FATO}"')""")
+    return {nome for nome, in cur.fetchall()}
+
+def _garante_particoes(cur, decadas):
+    """
+    Cria as partições de década que faltam. Linhas dessas décadas que estiverem na partição
+    padrão são movidas para a nova partição (o PostgreSQL recusa a criação em caso contrário).
+    """
+    existentes = _particoes(cur)
+    if PARTICAO_PADRAO not in existentes:
+        cur.execute(ddl_particoes([])[-1])
+    criadas = []
+    for decada in _decadas(decadas):
+        particao = _particao(decada)
+        if particao in existentes:
+            continue
+        cur.execute(f'CREATE TEMP TABLE "stg_particao" (LIKE "{PARTICAO_PADRAO}") ON COMMIT DROP')
+        cur.execute(f"""
+            WITH movidas AS (
+                DELETE FROM "{PARTICAO_PADRAO}" WHERE "Decada" >= {decada} AND "Decada" < {decada + 10}
+                RETURNING *
+            )
+            INSERT INTO "stg_particao" SELECT * FROM movidas
+        """)
+        cur.execute(f'CREATE TABLE "{particao}" PARTITION OF "{FATO}" FOR VALUES FROM ({decada}) TO ({decada + 10})')
+        cur.execute(f'INSERT INTO "{FATO}" SELECT * FROM "stg_particao"')
+        cur.execute('DROP TABLE "stg_particao"')
+        criadas.append(decada)
+    return criadas
+
+def _renomeia_antigo(cur):
+    """
+    Renomeia o fato atual, suas partições e índices com o prefixo "antigo_", liberando os
+    nomes para o novo layout. Retorna o novo nome da tabela.
+    """
+    cur.execute(f"""
+        WITH RECURSIVE arvore AS (
+            SELECT to_regclass('"{FATO}"')::oid AS oid
+            UNION ALL
+            SELECT i.inhrelid FROM pg_inherits i JOIN arvore a ON i.inhparent = a.oid
+        )
+        SELECT c.relname, 'TABLE' FROM arvore a JOIN pg_class c ON c.oid = a.oid
+        UNION ALL
+        SELECT c.relname, 'INDEX' FROM arvore a JOIN pg_index x ON x.indrelid = a.oid
+                                                JOIN pg_class c ON c.oid = x.indexrelid
+    """)
+    for nome, tipo in cur.fetchall():
+        cur.execute(f'ALTER {tipo} "{nome}" RENAME TO "antigo_{nome[:56]}"')
+    return f"antigo_{FATO}"
+
+def _migra(cur, particionado, decadas):
+    """
+    Recria o fato no layout pedido e copia as linhas do layout anterior, na transação corrente.
+    """
+    antigo = _renomeia_antigo(cur)
+    cur.execute(ddl_fato(particionado))
+    if particionado:
+        for comando in ddl_particoes(decadas):
+            cur.execute(comando)
+    colunas = carga.TABELAS[FATO]["colunas"]
+    if particionado:
+        cur.execute(f"""
+            INSERT INTO "{FATO}" ({carga._aspas(colunas + ["Decada"])})
+            SELECT {", ".join(f'F."{c}"' for c in colunas)}, T."Decada"
+            FROM "{antigo}" F LEFT JOIN "Dim_Tempo" T ON T."ID_Tempo" = F."Chave_Tempo"
+        """)
+    else:
+        cur.execute(f'INSERT INTO "{FATO}" ({carga._aspas(colunas)}) SELECT {carga._aspas(colunas)} FROM "{antigo}"')
+    linhas = cur.rowcount
+    cur.execute(f'DROP TABLE "{antigo}"')
+    return linhas
+
+def aplica(conn, particionado=True, indices_fk=True, cobertura=False, brin=False, decadas=None, analisar=True):
+    """
+    Aplica o desenho físico ao banco de `conn` (conexão psycopg2), em uma única transação:
+    cria as tabelas que faltam, migra o fato se o particionamento mudou, cria as partições
+    de `decadas` (padrão: DECADAS_PADRAO mais as décadas de Dim_Tempo) e sincroniza os
+    índices gerenciados. Com `analisar`, executa ANALYZE no fato ao final.
+
+    Retorna um dicionário com o que foi feito.
+    """
+    inicio = time.perf_counter()
+    relatorio = {"migradas": None, "particoes_criadas": [], "indices_criados": [], "indices_removidos": []}
+    desejados = indices(indices_fk, cobertura, brin)
+    with conn:
+        with conn.cursor() as cur:
+            cur.execute(carga.ESQUEMA_DIMENSOES_SQL + carga.VERSAO_DADOS_SQL)
+            if particionado and decadas is None:
+                cur.execute('SELECT DISTINCT "Decada" FROM "Dim_Tempo" WHERE "Decada" IS NOT NULL')
+                decadas = list(DECADAS_PADRAO) + [d for d, in cur.fetchall()]
+            layout = _layout(cur)
+            if layout is None:
+                cur.execute(ddl_fato(particionado))
+            elif layout != particionado:
+                relatorio["migradas"] = _migra(cur, particionado, decadas)
+            if particionado:
+                relatorio["particoes_criadas"] = _garante_particoes(cur, decadas)
+
+            todos = {**INDICES_FK, **INDICES_COBERTURA, **INDICES_BRIN}
+            for nome in todos:
+                cur.execute("SELECT to_regclass(%s)", (f'"{nome}"',))
+                existe = cur.fetchone()[0] is not None
+                if nome in desejados and not existe:
+                    cur.execute(f'CREATE INDEX "{nome}" ON "{FATO}" {desejados[nome]}')
+                    relatorio["indices_criados"].append(nome)
+                elif nome not in desejados and existe:
+                    cur.execute(f'DROP INDEX "{nome}"')
+                    relatorio["indices_removidos"].append(nome)
+    if analisar:
+        carga.analisa(conn, [FATO])
+    logger.info(f"Desenho físico aplicado em {time.perf_counter() - inicio:.2f}s: {relatorio}")
+    return relatorio
+
+def descreve(conn):
+    """
+    Retorna um dicionário com o layout atual do fato: particionado, partições (com o número
+    estimado de linhas) e índices existentes.
+    """
+    with conn:
+        with conn.cursor() as cur:
+            layout = _layout(cur)
+            particoes = {}
+            if layout:
+                cur.execute(f"""SELECT c.relname, c.reltuples::BIGINT FROM pg_inherits i
+                                JOIN pg_class c ON c.oid = i.inhrelid
+                                WHERE i.inhparent = to_regclass('"{FATO}"') ORDER BY c.relname""")
+                particoes = dict(cur.fetchall())
+            cur.execute(f"""SELECT c.relname FROM pg_index x JOIN pg_class c ON c.oid = x.indexrelid
+                            WHERE x.indrelid = to_regclass('"{FATO}"') ORDER BY c.relname""")
+            indices_existentes = [nome for nome, in cur.fetchall()]
+    return {"particionado": layout, "particoes": particoes, "indices": indices_existentes}
+
+ESQUEMA_VERIFICACAO = "verifica_esquema"
+
+def _normaliza_fato(df):
+    # Tipos comparáveis entre o DataFrame carregado e o lido do banco, na ordem da chave primária
+    config = carga.TABELAS[FATO]
+    df = df[config["colunas"]].copy()
+    for coluna in config["colunas"]:
+        if coluna in config["inteiros"]:
+            df[coluna] = pd.to_numeric(df[coluna]).round().astype("Int64")
+        elif coluna == "Em_Conflito":
+            df[coluna] = df[coluna].astype(str)
+        else:
+            df[coluna] = pd.to_numeric(df[coluna]).astype("float64").round(9)
+    return df.sort_values(PK_FATO).reset_index(drop=True)
+
+def _confere(conn, passo, esperado):
+    """
+    Compara o fato no banco com o DataFrame `esperado` e, no layout particionado, confere a
+    coluna "Decada" contra Dim_Tempo. Retorna um dicionário com o resultado do passo.
+    """
+    colunas = carga.TABELAS[FATO]["colunas"]
+    with conn:
+        with conn.cursor() as cur:
+            particionado = _layout(cur)
+            cur.execute(f'SELECT {carga._aspas(colunas)} FROM "{FATO}"')
+            banco = pd.DataFrame(cur.fetchall(), columns=colunas)
+            decadas_erradas = linhas_padrao = None
+            if particionado:
+                cur.execute(f"""SELECT COUNT(*) FROM "{FATO}" F JOIN "Dim_Tempo" T ON T."ID_Tempo" = F."Chave_Tempo"
+                                WHERE F."Decada" IS DISTINCT FROM T."Decada" """)
+                decadas_erradas = cur.fetchone()[0]
+                cur.execute(f'SELECT COUNT(*) FROM "{PARTICAO_PADRAO}"')
+                linhas_padrao = cur.fetchone()[0]
+    esperado = _normaliza_fato(esperado)
+    return {
+        "passo": passo,
+        "particionado": particionado,
+        "linhas_esperadas": len(esperado),
+        "linhas": len(banco),
+        "conteudo_igual": _normaliza_fato(banco).equals(esperado),
+        "decadas_erradas": decadas_erradas,
+        "linhas_particao_padrao": linhas_padrao,
+    }
+
+def verifica(conn_string, tabelas=None, esquema_verificacao=ESQUEMA_VERIFICACAO):
+    """
+    Exercita as migrações de layout e as recargas do fato em um esquema descartável
+    (`esquema_verificacao`, removido ao final), a partir de `tabelas` (padrão: lidas de
+    ./arquivos_analise com saida.le_tabelas). Passos:
+      1. carga completa no layout comum;
+      2. migração para o particionado sem a última década (as linhas dela vão para a partição padrão);
+      3. criação da partição que faltava (as linhas saem da partição padrão);
+      4. recarga completa sem um país e com valores alterados (substituição);
+      5. carga incremental que muda o nível de conflito de algumas linhas (parte da chave primária);
+      6. migração de volta para o layout comum.
+    Após cada passo, contagem e conteúdo do fato são comparados com o esperado.
+    Retorna um DataFrame com um passo por linha; levanta AssertionError se algum divergir.
+    """
+    if tabelas is None:
+        from scripts import saida
+        tabelas = saida.le_tabelas("./arquivos_analise")
+    dim_tempo, dim_local, dim_religiao = tabelas["dim_tempo"], tabelas["dim_local"], tabelas["dim_religiao"]
+    df_fato = tabelas["df_fact_final"]
+    decadas = _decadas(dim_tempo["Decada"])
+    if len(decadas) < 2:
+        raise ValueError("A verificação requer dados de pelo menos duas décadas.")
+
+    # Dados da recarga: sem o primeiro país e com o PIB alterado; depois, conflito trocado em 10 linhas
+    fato_recarga = df_fato[df_fato["Chave_Local"] != df_fato["Chave_Local"].iloc[0]].copy()
+    fato_recarga["PIB_Per_Capita"] = pd.to_numeric(fato_recarga["PIB_Per_Capita"]) * 1.5
+    delta = fato_recarga.head(10).copy()
+    niveis = sorted(df_fato["Em_Conflito"].astype(str).unique())
+    delta["Em_Conflito"] = [niveis[(niveis.index(str(v)) + 1) % len(niveis)] for v in delta["Em_Conflito"]]
+    chaves_delta = delta.set_index(["Chave_Tempo", "Chave_Local"]).index
+    fato_incremental = pd.concat([
+        fato_recarga[~fato_recarga.set_index(["Chave_Tempo", "Chave_Local"]).index.isin(chaves_delta)], delta])
+
+    conn = carga.conecta(conn_string, options=f"-c search_path={esquema_verificacao}")
+    passos = []
+    try:
+        with conn:
+            with conn.cursor() as cur:
+                cur.execute(f'DROP SCHEMA IF EXISTS "{esquema_verificacao}" CASCADE')
+                cur.execute(f'CREATE SCHEMA "{esquema_verificacao}"')
+        aplica(conn, particionado=False, analisar=False)
+        carga.carrega(conn, dim_tempo, dim_local, dim_religiao, df_fato, analisar=False)
+        passos.append(_confere(conn, "carga_comum", df_fato))
+        aplica(conn, particionado=True, decadas=decadas[:-1], analisar=False)
+        passos.append(_confere(conn, "migra_particionado", df_fato))
+        aplica(conn, particionado=True, decadas=decadas, analisar=False)
+        passos.append(_confere(conn, "cria_particao", df_fato))
+        carga.carrega(conn, dim_tempo, dim_local, dim_religiao, fato_recarga, analisar=False)
+        passos.append(_confere(conn, "recarga_completa", fato_recarga))
+        carga.carrega(conn, df_fato=delta, fatos_removidos=delta.iloc[:0][["Chave_Tempo", "Chave_Local"]],
+                      analisar=False)
+        passos.append(_confere(conn, "carga_incremental", fato_incremental))
+        aplica(conn, particionado=False, analisar=False)
+        passos.append(_confere(conn, "migra_comum", fato_incremental))
+    finally:
+        with conn:
+            with conn.cursor() as cur:
+                cur.execute(f'DROP SCHEMA IF EXISTS "{esquema_verificacao}" CASCADE')
+        conn.close()
+
+    resultado = pd.DataFrame(passos)
+    # Na migração parcial a última década precisa ter ido para a partição padrão, e saído dela depois
+    esperado_padrao = {"migra_particionado": True, "cria_particao": False}
+    divergentes = [p["passo"] for p in passos
+                   if p["linhas"] != p["linhas_esperadas"] or not p["conteudo_igual"] or p["decadas_erradas"]
+                   or (p["passo"] in esperado_padrao and bool(p["linhas_particao_padrao"]) != esperado_padrao[p["passo"]])]
+    if divergentes:
+        raise AssertionError(f"Verificação do desenho físico divergiu em: {divergentes}\n{resultado.to_string(index=False)}")
+    logger.info(f"Verificação do desenho físico concluída: {len(passos)} passos conferidos.")
+    return resultado
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Desenho físico do fato no PostgreSQL.")
+    sub = parser.add_subparsers(dest="comando", required=True)
+    p_verifica = sub.add_parser("verifica", help="Confere migrações de layout e recargas em um esquema descartável.")
+    p_verifica.add_argument("--conn", required=True)
+    p_verifica.add_argument("--dados", default="./arquivos_analise", help="Diretório das tabelas finais.")
+    args = parser.parse_args(argv)
+
+    from scripts import saida
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+    try:
+        resultado = verifica(args.conn, saida.le_tabelas(args.dados))
+    except AssertionError as e:
+        print(e)
+        return 1
+    print(resultado.to_string(index=False))
+    return 0
+
+if __name__ == "__main__":
+    raise SystemExit(main())
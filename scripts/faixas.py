@@ -0,0 +1,53 @@
+"""
+faixas.py
+
+Este módulo classifica indicadores numéricos em níveis categóricos ordenados a partir
+de uma tabela de faixas declarada (limites + rótulos). A classificação é vetorizada
+com np.searchsorted, com a mesma semântica de pd.cut com intervalos fechados à esquerda,
+e devolve um pd.Categorical ordenado (por exemplo, Baixo < Médio < Alto).
+Alterar os limites de um indicador é apenas uma mudança em FAIXAS (ou nos parâmetros
+de aplica_faixas), sem reescrever funções de classificação.
+"""
+
+import numpy as np
+import pandas as pd
+
+# Tabela de faixas: para cada indicador, a coluna numérica de origem, os limites em
+# ordem crescente e os rótulos dos níveis (sempre um a mais que os limites).
+# Um valor v recebe o rótulo i tal que limites[i-1] <= v < limites[i].
+FAIXAS = {
+    "Em_Conflito": {
+        "coluna": "total_deaths",
+        "limites": [100, 1000],
+        "rotulos": ["Baixo", "Médio", "Alto"],
+    },
+}
+
+def classifica(valores, limites, rotulos):
+    """
+    Classifica `valores` nas faixas definidas por `limites` e retorna um pd.Categorical
+    ordenado com as categorias `rotulos`. Valores ausentes são posicionados após todos os
+    limites pelo searchsorted, caindo no último nível (mesmo resultado das comparações
+    `<` encadeadas que eram aplicadas linha a linha).
+    """
+    limites = np.asarray(limites, dtype="float64")
+    if len(rotulos) != len(limites) + 1:
+        raise ValueError(f"São necessários {len(limites) + 1} rótulos para {len(limites)} limites.")
+    if np.any(np.diff(limites) <= 0):
+        raise ValueError("Os limites das faixas devem ser estritamente crescentes.")
+    numeros = pd.Series(valores).to_numpy(dtype="float64", na_value=np.nan)
+    codigos = np.searchsorted(limites, numeros, side="right")
+    return pd.Categorical.from_codes(codigos, categories=list(rotulos), ordered=True)
+
+def aplica_faixas(df, nome, limites=None, rotulos=None, coluna=None):
+    """
+    Cria (ou substitui) em `df` a coluna categórica `nome`, classificando a coluna de origem
+    declarada em FAIXAS[nome]. `limites`, `rotulos` e `coluna` sobrescrevem a configuração,
+    permitindo reclassificar com novos limites sem alterar o código.
+    """
+    config = FAIXAS.get(nome, {})
+    coluna = coluna or config["coluna"]
+    limites = config["limites"] if limites is None else limites
+    rotulos = config["rotulos"] if rotulos is None else rotulos
+    df[nome] = classifica(df[coluna], limites, rotulos)
+    return df
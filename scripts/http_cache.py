@@ -0,0 +1,327 @@
+"""
+http_cache.py
+
+Este módulo implementa um cache HTTP persistente em disco, compartilhado pelos
+módulos scraping e dados_fetch. Cada resposta é gravada junto com seus cabeçalhos
+ETag/Last-Modified; enquanto a entrada estiver dentro do TTL ela é servida sem
+acesso à rede e, depois disso, é revalidada com If-None-Match / If-Modified-Since.
+Uma resposta 304 reaproveita o corpo já armazenado, evitando baixar novamente
+páginas e CSVs que não mudaram. O tamanho total do cache é limitado, removendo
+as entradas usadas há mais tempo (LRU): cada uso atualiza a data de acesso do arquivo
+do corpo (os.utime), sem regravar os metadados. As respostas também podem ser gravadas em
+um arquivo e reproduzidas offline (ver reproducao).
+"""
+
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+
+import requests
+
+from scripts import metricas
+from scripts import reproducao
+
+logger = logging.getLogger(__name__)
+
+# Configuração padrão do cache (pode ser alterada via configurar)
+CACHE_DIR = "./cache/http"
+TTL_PADRAO = 6 * 60 * 60              # segundos sem revalidação
+TAMANHO_MAXIMO = 512 * 1024 * 1024    # bytes ocupados pelos corpos armazenados
+HABILITADO = True
+
+_lock = threading.Lock()
+_estatisticas = {
+    "hits": 0,           # servidos do disco, dentro do TTL
+    "revalidados": 0,    # 304 Not Modified
+    "misses": 0,         # baixados por completo
+    "evictions": 0,      # entradas removidas por tamanho
+    "bytes_baixados": 0,
+    "bytes_economizados": 0,
+}
+
+def configurar(diretorio=None, ttl=None, tamanho_maximo=None, habilitado=None):
+    """
+    Altera a configuração global do cache. Parâmetros omitidos mantêm o valor atual.
+    """
+    global CACHE_DIR, TTL_PADRAO, TAMANHO_MAXIMO, HABILITADO
+    if diretorio is not None:
+        CACHE_DIR = diretorio
+    if ttl is not None:
+        TTL_PADRAO = ttl
+    if tamanho_maximo is not None:
+        TAMANHO_MAXIMO = tamanho_maximo
+    if habilitado is not None:
+        HABILITADO = habilitado
+
+class RespostaCache:
+    """
+    Resposta mínima (compatível com o uso que os módulos fazem de requests.Response):
+    expõe content, text, status_code, headers, json() e raise_for_status().
+    O atributo `origem` indica se veio do disco ('hit'), de um 304 ('revalidado')
+    de um download completo ('miss') ou de um arquivo gravado ('reproduzido').
+    """
+
+    def __init__(self, url, status_code, content, headers, encoding, origem):
+        self.url = url
+        self.status_code = status_code
+        self.content = content
+        self.headers = headers
+        self.encoding = encoding or "utf-8"
+        self.origem = origem
+
+    @property
+    def text(self):
+        return self.content.decode(self.encoding, errors="replace")
+
+    def json(self):
+        return json.loads(self.content)
+
+    def raise_for_status(self):
+        if self.status_code >= 400:
+            raise requests.HTTPError(f"{self.status_code} para a URL: {self.url}")
+
+def _incrementa(chave, valor=1):
+    with _lock:
+        _estatisticas[chave] += valor
+
+def _caminhos(url):
+    chave = hashlib.sha256(url.encode("utf-8")).hexdigest()
+    return (os.path.join(CACHE_DIR, chave + ".json"),
+            os.path.join(CACHE_DIR, chave + ".body"))
+
+def _carrega(url):
+    caminho_meta, caminho_corpo = _caminhos(url)
+    try:
+        with open(caminho_meta, "r", encoding="utf-8") as f:
+            meta = json.load(f)
+        with open(caminho_corpo, "rb") as f:
+            corpo = f.read()
+    except (OSError, ValueError):
+        return None, None
+    return meta, corpo
+
+def _marca_acesso(url):
+    # O LRU usa a data de acesso do corpo; marcá-la evita transformar cada hit em uma escrita
+    try:
+        os.utime(_caminhos(url)[1])
+    except OSError:
+        pass
+
+def _grava_atomico(caminho, dados):
+    temporario = f"{caminho}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(temporario, "wb") as f:
+        f.write(dados)
+    os.replace(temporario, caminho)
+
+def _grava(url, meta, corpo=None):
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    caminho_meta, caminho_corpo = _caminhos(url)
+    if corpo is not None:
+        _grava_atomico(caminho_corpo, corpo)
+    _grava_atomico(caminho_meta, json.dumps(meta).encode("utf-8"))
+
+def _cabecalhos_condicionais(meta):
+    cabecalhos = {}
+    if meta.get("etag"):
+        cabecalhos["If-None-Match"] = meta["etag"]
+    if meta.get("last_modified"):
+        cabecalhos["If-Modified-Since"] = meta["last_modified"]
+    return cabecalhos
+
+def _antes_da_requisicao(url, headers, ttl):
+    """
+    Consulta o cache antes de ir à rede. Retorna (resposta, meta, corpo, headers):
+    se `resposta` não for None a entrada está fresca e pode ser usada diretamente;
+    caso contrário `headers` já contém os cabeçalhos condicionais (se houver entrada).
+    """
+    headers = dict(headers or {})
+    if not HABILITADO:
+        return None, None, None, headers
+    meta, corpo = _carrega(url)
+    if meta is None:
+        return None, None, None, headers
+    ttl = TTL_PADRAO if ttl is None else ttl
+    if time.time() - meta["armazenado_em"] < ttl:
+        _incrementa("hits")
+        _incrementa("bytes_economizados", len(corpo))
+        _marca_acesso(url)
+        return _resposta_de_meta(url, meta, corpo, "hit"), meta, corpo, headers
+    headers.update(_cabecalhos_condicionais(meta))
+    return None, meta, corpo, headers
+
+def _resposta_de_meta(url, meta, corpo, origem):
+    return RespostaCache(url, meta.get("status_code", 200), corpo,
+                         meta.get("headers", {}), meta.get("encoding"), origem)
+
+def _apos_a_requisicao(url, response, meta, corpo):
+    """
+    Trata a resposta da rede: 304 reaproveita o corpo armazenado; 200 substitui a
+    entrada; qualquer outro status é devolvido sem alterar o cache.
+    """
+    agora = time.time()
+    if response.status_code == 304 and meta is not None:
+        _incrementa("revalidados")
+        _incrementa("bytes_economizados", len(corpo))
+        meta["armazenado_em"] = agora
+        meta.setdefault("headers", {})
+        if response.headers.get("ETag"):
+            meta["etag"] = meta["headers"]["ETag"] = response.headers["ETag"]
+        if response.headers.get("Last-Modified"):
+            meta["last_modified"] = meta["headers"]["Last-Modified"] = response.headers["Last-Modified"]
+        _grava(url, meta)
+        _marca_acesso(url)
+        return _resposta_de_meta(url, meta, corpo, "revalidado")
+
+    conteudo = response.content
+    _incrementa("misses")
+    _incrementa("bytes_baixados", len(conteudo))
+    resposta = RespostaCache(url, response.status_code, conteudo, dict(response.headers),
+                             response.encoding, "miss")
+    if not HABILITADO or response.status_code != 200:
+        return resposta
+    novo_meta = {
+        "url": url,
+        "status_code": response.status_code,
+        "etag": response.headers.get("ETag"),
+        "last_modified": response.headers.get("Last-Modified"),
+        "encoding": response.encoding,
+        "headers": {chave: response.headers[chave] for chave in ("Content-Type", "ETag", "Last-Modified")
+                    if chave in response.headers},
+        "tamanho": len(conteudo),
+        "armazenado_em": agora,
+    }
+    _grava(url, novo_meta, conteudo)
+    limpar_excedente()
+    return resposta
+
+def armazena(url, conteudo, headers=None, encoding="utf-8"):
+    """
+    Grava `conteudo` (bytes) no cache como resposta 200 de `url` baixada agora, para que
+    execuções sem rede (fixtures sintéticas, benchmarks) sirvam a URL como um hit.
+    """
+    agora = time.time()
+    headers = dict(headers or {})
+    _grava(url, {
+        "url": url,
+        "status_code": 200,
+        "etag": headers.get("ETag"),
+        "last_modified": headers.get("Last-Modified"),
+        "encoding": encoding,
+        "headers": headers,
+        "tamanho": len(conteudo),
+        "armazenado_em": agora,
+    }, conteudo)
+
+def _reproduzida(url):
+    status_code, conteudo, headers, encoding = reproducao.resposta(url)
+    return RespostaCache(url, status_code, conteudo, headers, encoding, "reproduzido")
+
+def _apos_a_chamada(url, inicio, resposta):
+    # Na gravação, registra a resposta devolvida (da rede ou do disco)
+    if resposta is not None and reproducao.MODO == reproducao.GRAVANDO:
+        reproducao.registra(url, resposta.status_code, resposta.content, resposta.headers, resposta.encoding)
+    # Latência vista por quem chamou (inclui os hits servidos do disco); exceções contam como erro
+    if not metricas.HABILITADO:
+        return
+    if resposta is None:
+        metricas.registra_http(url, time.perf_counter() - inicio, 0, "erro")
+    else:
+        metricas.registra_http(url, time.perf_counter() - inicio, len(resposta.content),
+                               resposta.origem, resposta.status_code)
+
+def get(url, headers=None, session=None, ttl=None, timeout=60):
+    """
+    Versão síncrona: devolve uma RespostaCache para `url`, usando o cache em disco
+    e revalidação condicional. `session` pode ser uma requests.Session já aberta.
+    Durante a reprodução (reproducao.reproduzir) a resposta vem do arquivo gravado.
+    """
+    inicio = time.perf_counter()
+    resposta = None
+    try:
+        if reproducao.MODO == reproducao.REPRODUZINDO:
+            resposta = _reproduzida(url)
+            return resposta
+        resposta, meta, corpo, headers = _antes_da_requisicao(url, headers, ttl)
+        if resposta is None:
+            cliente = session or requests
+            response = cliente.get(url, headers=headers, timeout=timeout)
+            resposta = _apos_a_requisicao(url, response, meta, corpo)
+        return resposta
+    finally:
+        _apos_a_chamada(url, inicio, resposta)
+
+async def get_async(session, url, headers=None, ttl=None, timeout=None):
+    """
+    Versão assíncrona para uso com AsyncHTMLSession (o download continua ocorrendo
+    no pool de threads da sessão; apenas o acesso ao cache é feito aqui).
+    """
+    inicio = time.perf_counter()
+    resposta = None
+    try:
+        if reproducao.MODO == reproducao.REPRODUZINDO:
+            resposta = _reproduzida(url)
+            return resposta
+        resposta, meta, corpo, headers = _antes_da_requisicao(url, headers, ttl)
+        if resposta is None:
+            response = await session.get(url, headers=headers, timeout=timeout)
+            resposta = _apos_a_requisicao(url, response, meta, corpo)
+        return resposta
+    finally:
+        _apos_a_chamada(url, inicio, resposta)
+
+def limpar_excedente(tamanho_maximo=None):
+    """
+    Remove as entradas acessadas há mais tempo (pela data de acesso/modificação do corpo)
+    até que a soma dos corpos armazenados fique abaixo de `tamanho_maximo` (padrão: TAMANHO_MAXIMO).
+    """
+    tamanho_maximo = TAMANHO_MAXIMO if tamanho_maximo is None else tamanho_maximo
+    if not os.path.isdir(CACHE_DIR):
+        return
+    entradas = []
+    for entrada in os.scandir(CACHE_DIR):
+        if not entrada.name.endswith(".body"):
+            continue
+        try:
+            stat = entrada.stat()
+        except OSError:
+            continue
+        entradas.append((max(stat.st_atime, stat.st_mtime), stat.st_size, entrada.name[:-len(".body")]))
+    total = sum(tamanho for _, tamanho, _ in entradas)
+    if total <= tamanho_maximo:
+        return
+    for _, tamanho, chave in sorted(entradas):
+        if total <= tamanho_maximo:
+            break
+        for extensao in (".json", ".body"):
+            try:
+                os.remove(os.path.join(CACHE_DIR, chave + extensao))
+            except OSError:
+                pass
+        total -= tamanho
+        _incrementa("evictions")
+
+def estatisticas():
+    """
+    Retorna um dicionário com os contadores de hits/misses acumulados na execução.
+    """
+    with _lock:
+        return dict(_estatisticas)
+
+def zerar_estatisticas():
+    with _lock:
+        for chave in _estatisticas:
+            _estatisticas[chave] = 0
+
+def log_estatisticas():
+    """
+    Registra no log um resumo dos contadores do cache.
+    """
+    est = estatisticas()
+    logger.info(f"Cache HTTP: {est['hits']} hits, {est['revalidados']} revalidados (304), "
+                f"{est['misses']} misses, {est['evictions']} evictions; "
+                f"{est['bytes_baixados'] / 1e6:.1f} MB baixados, "
+                f"{est['bytes_economizados'] / 1e6:.1f} MB economizados.")
+    return est
@@ -12,34 +12,360 @@ A função principal, run_pipeline, realiza o seguinte:
   - Salvamento dos DataFrames finais em arquivos CSV para posterior análise.
 """
 
+import logging
+import os
+import shutil
+from concurrent.futures import ProcessPoolExecutor
+
 import pandas as pd
 import numpy as np
 
+from scripts import dimensoes
+from scripts import metricas
+from scripts import saida
+from scripts.entidades import ResolvedorEntidades
+
+logger = logging.getLogger(__name__)
+
+# Fator que separa o código do país e o ano dentro da chave inteira (codigo * FATOR_CHAVE + ano)
+FATOR_CHAVE = 100_000
+
 def padroniza_nome(nome):
     return "" if pd.isna(nome) else nome.strip().lower()
 
-def run_pipeline(df_historico_pais, df_pib_per_capita, df_acesso_educacao,
-                 df_expectativa_vida, df_taxa_mortalidade, df_medicos_por_habitante,
-                 df_em_conflito, df_religiao_final):
+def padroniza_nomes(serie):
     """
-    Executa o pipeline completo de transformação dos dados e monta os DataFrames
-    finais (fato e dimensões).
+    Versão vetorizada de padroniza_nome para uma coluna inteira.
+    """
+    return serie.fillna("").astype(str).str.strip().str.lower()
+
+def alinha_indicadores(df_base, fontes):
+    """
+    Alinha as colunas de várias fontes às linhas de df_base em uma única passada, sem merges
+    sobre chaves de texto. Os nomes de países de todas as fontes são codificados uma única vez
+    (pd.factorize) e combinados com o ano em uma chave int64 (codigo * FATOR_CHAVE + ano);
+    cada fonte é então reindexada pela chave de df_base.
 
     Parâmetros:
-        df_historico_pais: DataFrame com os dados históricos (contém colunas Country, Population, Growth_Rate, Urban_Population, Rural_Population)
-        df_pib_per_capita: DataFrame com dados do PIB per capita
-        df_acesso_educacao: DataFrame com dados de acesso à educação
-        df_expectativa_vida: DataFrame com dados de expectativa de vida
-        df_taxa_mortalidade: DataFrame com dados de taxa de mortalidade (colunas location_name e year serão renomeadas)
-        df_medicos_por_habitante: DataFrame com dados de médicos por habitante (colunas Location e Period serão renomeadas)
-        df_em_conflito: DataFrame com dados da coluna Em_Conflito
-        df_religiao_final: DataFrame unificado com os dados de religião (deve conter colunas Entity, Year e Religiao_Predominante)
-        
+        df_base: DataFrame com as colunas Entity e Year (define as linhas do resultado)
+        fontes: lista de (DataFrame, colunas); cada DataFrame deve conter Entity e Year.
+            Chaves repetidas em uma fonte mantêm a primeira ocorrência (um registro por país/ano).
+
     Retorna:
-        Um dicionário com os DataFrames finais: df_fact_final, dim_tempo, dim_local e dim_religiao.
+        DataFrame com as colunas de df_base seguidas das colunas das fontes, na ordem de df_base.
     """
+    entidades = [df_base['Entity'].to_numpy(dtype=object)] + [df['Entity'].to_numpy(dtype=object) for df, _ in fontes]
+    codigos, _ = pd.factorize(np.concatenate(entidades))
+    codigos_por_fonte = np.split(codigos, np.cumsum([len(e) for e in entidades])[:-1])
 
-    # 1. Leitura e Tratamento dos DataFrames de Origem
+    def chave(codigos_fonte, df):
+        return codigos_fonte.astype(np.int64) * FATOR_CHAVE + df['Year'].to_numpy(dtype=np.int64)
+
+    chave_base = chave(codigos_por_fonte[0], df_base)
+    alinhadas = [df_base.reset_index(drop=True)]
+    for (df, colunas), codigos_fonte in zip(fontes, codigos_por_fonte[1:]):
+        valores = df[colunas].set_axis(chave(codigos_fonte, df), axis=0)
+        valores = valores[~valores.index.duplicated(keep='first')]
+        alinhadas.append(valores.reindex(chave_base).reset_index(drop=True))
+    return pd.concat(alinhadas, axis=1)
+
+def particiona(df, n_particoes, coluna='Entity'):
+    """
+    Divide `df` em `n_particoes` pelo hash da coluna de país: todas as linhas de uma mesma
+    entidade caem na mesma partição, em qualquer fonte. A ordem relativa das linhas é mantida.
+    """
+    particao = pd.util.hash_array(df[coluna].to_numpy(dtype=object)) % n_particoes
+    return [df[particao == i] for i in range(n_particoes)]
+
+def _alinha_particao(df_base, fontes):
+    # Etapas executadas em cada partição: alinhamento das fontes e tratamento das colunas resultantes
+    df = alinha_indicadores(df_base, fontes)
+    df['Em_Conflito'] = df['Em_Conflito'].fillna('Baixo')
+    return df
+
+def alinha_particionado(df_base, fontes, workers):
+    """
+    Versão particionada de alinha_indicadores: df_base e as fontes são particionados por país
+    (particiona) e cada partição é alinhada em um processo do pool. Os resultados são
+    concatenados e reordenados pela posição original em df_base, de modo que a saída é
+    idêntica à do alinhamento serial.
+    """
+    df_base = df_base.reset_index(drop=True).assign(_ordem=np.arange(len(df_base)))
+    bases = particiona(df_base, workers)
+    fontes_particionadas = [(particiona(df, workers), colunas) for df, colunas in fontes]
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futuros = [executor.submit(_alinha_particao, bases[i],
+                                   [(partes[i], colunas) for partes, colunas in fontes_particionadas])
+                   for i in range(workers)]
+        resultados = [futuro.result() for futuro in futuros]
+    df = pd.concat(resultados, ignore_index=True)
+    df = df.iloc[np.argsort(df['_ordem'].to_numpy(), kind='stable')]
+    return df.drop(columns='_ordem').reset_index(drop=True)
+
+def mapeia_chaves(valores, chaves_dim, ids_dim):
+    """
+    Retorna, para cada elemento de `valores`, o ID da dimensão cuja chave natural é igual a ele
+    (equivalente a um merge left com a dimensão, via busca em um índice hash).
+    Valores sem correspondência recebem NaN.
+    """
+    posicoes = pd.Index(chaves_dim).get_indexer(valores)
+    ids = np.asarray(ids_dim)[posicoes]
+    if (posicoes < 0).any():
+        ids = ids.astype("float64")
+        ids[posicoes < 0] = np.nan
+    return ids
+
+# Continente de cada país (nome canônico do Worldometers em minúsculas)
+PAIS_TO_CONTINENTE = {
+    "india": "Asia",
+    "china": "Asia",
+    "united states": "north america",
+    "indonesia": "asia",
+    "pakistan": "asia",
+    "nigeria": "africa",
+    "brazil": "south america",
+    "bangladesh": "asia",
+    "russia": "europe/asia",
+    "ethiopia": "africa",
+    "mexico": "north america",
+    "japan": "asia",
+    "egypt": "africa",
+    "philippines": "asia",
+    "dr congo": "africa",
+    "vietnam": "asia",
+    "iran": "asia",
+    "turkey": "europe/asia",
+    "germany": "europe",
+    "thailand": "asia",
+    "united kingdom": "europe",
+    "tanzania": "africa",
+    "france": "europe",
+    "south africa": "africa",
+    "italy": "europe",
+    "kenya": "africa",
+    "myanmar": "asia",
+    "colombia": "south america",
+    "south korea": "asia",
+    "sudan": "africa",
+    "uganda": "africa",
+    "spain": "europe",
+    "algeria": "africa",
+    "iraq": "asia",
+    "argentina": "south america",
+    "afghanistan": "asia",
+    "yemen": "asia",
+    "canada": "north america",
+    "poland": "europe",
+    "morocco": "africa",
+    "angola": "africa",
+    "ukraine": "europe",
+    "uzbekistan": "asia",
+    "malaysia": "asia",
+    "mozambique": "africa",
+    "ghana": "africa",
+    "peru": "south america",
+    "saudi arabia": "asia",
+    "madagascar": "africa",
+    "côte d'ivoire": "africa",
+    "nepal": "asia",
+    "cameroon": "africa",
+    "venezuela": "south america",
+    "niger": "africa",
+    "australia": "oceania",
+    "north korea": "asia",
+    "syria": "asia",
+    "mali": "africa",
+    "burkina faso": "africa",
+    "taiwan": "asia",
+    "sri lanka": "asia",
+    "malawi": "africa",
+    "zambia": "africa",
+    "kazakhstan": "europe/asia",
+    "chad": "africa",
+    "chile": "south america",
+    "romania": "europe",
+    "somalia": "africa",
+    "senegal": "africa",
+    "guatemala": "central america",
+    "netherlands": "europe",
+    "ecuador": "south america",
+    "cambodia": "asia",
+    "zimbabwe": "africa",
+    "guinea": "africa",
+    "benin": "africa",
+    "rwanda": "africa",
+    "burundi": "africa",
+    "bolivia": "south america",
+    "tunisia": "africa",
+    "south sudan": "africa",
+    "haiti": "central america",
+    "belgium": "europe",
+    "jordan": "asia",
+    "dominican republic": "central america",
+    "united arab emirates": "asia",
+    "cuba": "central america",
+    "honduras": "central america",
+    "czech republic (czechia)": "europe",
+    "sweden": "europe",
+    "tajikistan": "asia",
+    "papua new guinea": "oceania",
+    "portugal": "europe",
+    "azerbaijan": "asia",
+    "greece": "europe",
+    "hungary": "europe",
+    "togo": "africa",
+    "israel": "asia",
+    "austria": "europe",
+    "belarus": "europe",
+    "switzerland": "europe",
+    "sierra leone": "africa",
+    "laos": "asia",
+    "turkmenistan": "asia",
+    "hong kong": "asia",
+    "libya": "africa",
+    "kyrgyzstan": "asia",
+    "paraguay": "south america",
+    "nicaragua": "central america",
+    "bulgaria": "europe",
+    "serbia": "europe",
+    "el salvador": "central america",
+    "congo": "africa",
+    "denmark": "europe",
+    "singapore": "asia",
+    "lebanon": "asia",
+    "finland": "europe",
+    "liberia": "africa",
+    "norway": "europe",
+    "slovakia": "europe",
+    "state of palestine": "asia",
+    "central african republic": "africa",
+    "oman": "asia",
+    "ireland": "europe",
+    "new zealand": "oceania",
+    "mauritania": "africa",
+    "costa rica": "central america",
+    "kuwait": "asia",
+    "panama": "central america",
+    "croatia": "europe",
+    "georgia": "europe/asia",
+    "eritrea": "africa",
+    "mongolia": "asia",
+    "uruguay": "south america",
+    "puerto rico": "central america",
+    "bosnia and herzegovina": "europe",
+    "qatar": "asia",
+    "moldova": "europe",
+    "namibia": "africa",
+    "armenia": "europe/asia",
+    "lithuania": "europe",
+    "jamaica": "central america",
+    "albania": "europe",
+    "gambia": "africa",
+    "gabon": "africa",
+    "botswana": "africa",
+    "lesotho": "africa",
+    "guinea-bissau": "africa",
+    "slovenia": "europe",
+    "equatorial guinea": "africa",
+    "latvia": "europe",
+    "north macedonia": "europe",
+    "bahrain": "asia",
+    "trinidad and tobago": "central america",
+    "timor-leste": "asia",
+    "estonia": "europe",
+    "cyprus": "europe",
+    "mauritius": "africa",
+    "eswatini": "africa",
+    "djibouti": "africa",
+    "fiji": "oceania",
+    "réunion": "africa",
+    "comoros": "africa",
+    "guyana": "south america",
+    "solomon islands": "oceania",
+    "bhutan": "asia",
+    "macao": "asia",
+    "luxembourg": "europe",
+    "montenegro": "europe",
+    "suriname": "south america",
+    "western sahara": "africa",
+    "malta": "europe",
+    "maldives": "asia",
+    "micronesia": "oceania",
+    "cabo verde": "africa",
+    "brunei": "asia",
+    "belize": "central america",
+    "bahamas": "central america",
+    "iceland": "europe",
+    "guadeloupe": "central america",
+    "martinique": "central america",
+    "vanuatu": "oceania",
+    "mayotte": "africa",
+    "french guiana": "south america",
+    "new caledonia": "oceania",
+    "barbados": "central america",
+    "french polynesia": "oceania",
+    "sao tome & principe": "africa",
+    "samoa": "oceania",
+    "curaçao": "central america",
+    "saint lucia": "central america",
+    "guam": "oceania",
+    "kiribati": "oceania",
+    "seychelles": "africa",
+    "grenada": "central america",
+    "aruba": "south america",
+    "tonga": "oceania",
+    "st. vincent & grenadines": "central america",
+    "antigua and barbuda": "central america",
+    "u.s. virgin islands": "central america",
+    "isle of man": "europe",
+    "andorra": "europe",
+    "cayman islands": "central america",
+    "dominica": "central america",
+    "bermuda": "central america",
+    "greenland": "north america",
+    "faeroe islands": "europe",
+    "saint kitts & nevis": "central america",
+    "american samoa": "oceania",
+    "turks and caicos": "central america",
+    "northern mariana islands": "oceania",
+    "sint maarten": "central america",
+    "liechtenstein": "europe",
+    "british virgin islands": "central america",
+    "gibraltar": "europe",
+    "monaco": "europe",
+    "marshall islands": "oceania",
+    "san marino": "europe",
+    "caribbean netherlands": "central america",
+    "saint martin": "central america",
+    "palau": "oceania",
+    "anguilla": "central america",
+    "cook islands": "oceania",
+    "nauru": "oceania",
+    "wallis & futuna": "oceania",
+    "saint barthelemy": "central america",
+    "tuvalu": "oceania",
+    "saint pierre & miquelon": "north america",
+    "saint helena": "africa",
+    "montserrat": "central america",
+    "falkland islands": "south america",
+    "tokelau": "oceania",
+    "niue": "oceania",
+    "holy see": "europe"
+}
+
+def prepara_fontes(df_historico_pais, df_pib_per_capita, df_acesso_educacao,
+                   df_expectativa_vida, df_taxa_mortalidade, df_medicos_por_habitante,
+                   df_em_conflito, df_religiao_final, df_religiao_classificacao=None,
+                   padroniza_entidades=None):
+    """
+    Etapa 1 do pipeline: padroniza nomes, tipos e valores ausentes de cada fonte.
+    `padroniza_entidades(serie, fonte)` converte os nomes de países (padrão: padroniza_nomes).
+
+    Retorna (df_hist, fontes, df_religiao_dim): o histórico tratado, a lista de
+    (DataFrame, colunas) a alinhar a ele e as religiões com sua classificação.
+    """
+    if padroniza_entidades is None:
+        padroniza_entidades = lambda serie, fonte: padroniza_nomes(serie)
 
     # 1.1 - Dados Históricos
     df_hist = df_historico_pais.copy()
@@ -50,342 +376,117 @@ def run_pipeline(df_historico_pais, df_pib_per_capita, df_acesso_educacao,
         'Urban_Population': 'Populacao_Urbana',
         'Rural_Population': 'Populacao_Rural'
     }, inplace=True)
-    df_hist['Entity'] = df_hist['Entity'].str.lower().str.strip()
+    df_hist['Entity'] = padroniza_entidades(df_hist['Entity'], 'historico')
     df_hist['Year'] = df_hist['Year'].astype(int)
     df_hist['Populacao_Total'] = df_hist['Populacao_Total'].fillna(0).astype(int)
     df_hist['Taxa_Crescimento'] = df_hist['Taxa_Crescimento'].fillna(0.0)
     df_hist['Populacao_Urbana'] = df_hist['Populacao_Urbana'].fillna(0).astype(int)
     df_hist['Populacao_Rural'] = df_hist['Populacao_Rural'].fillna(0).astype(int)
 
-    def padroniza_nome(nome):
-        return "" if pd.isna(nome) else nome.strip().lower()
-
     # 1.2 - PIB Per Capita
-    df_pib_per_capita['Entity'] = df_pib_per_capita['Entity'].apply(padroniza_nome)
+    df_pib_per_capita['Entity'] = padroniza_entidades(df_pib_per_capita['Entity'], 'pib_per_capita')
     df_pib_per_capita['Year'] = df_pib_per_capita['Year'].astype(int)
     df_pib_per_capita['PIB_Per_Capita'] = df_pib_per_capita['PIB_Per_Capita'].fillna(0.0)
 
     # 1.3 - Acesso à Educação
-    df_acesso_educacao['Entity'] = df_acesso_educacao['Entity'].apply(padroniza_nome)
+    df_acesso_educacao['Entity'] = padroniza_entidades(df_acesso_educacao['Entity'], 'acesso_educacao')
     df_acesso_educacao['Year'] = df_acesso_educacao['Year'].astype(int)
     df_acesso_educacao['Acesso_Educacao'] = df_acesso_educacao['Acesso_Educacao'].fillna(0.0)
 
     # 1.4 - Expectativa de Vida
-    df_expectativa_vida['Entity'] = df_expectativa_vida['Entity'].apply(padroniza_nome)
+    df_expectativa_vida['Entity'] = padroniza_entidades(df_expectativa_vida['Entity'], 'expectativa_vida')
     df_expectativa_vida['Year'] = df_expectativa_vida['Year'].astype(int)
     df_expectativa_vida['Expectativa_Vida'] = df_expectativa_vida['Expectativa_Vida'].fillna(0.0)
 
     # 1.5 - Taxa de Mortalidade
     df_taxa_mortalidade.rename(columns={'location_name': 'Entity', 'year': 'Year'}, inplace=True)
-    df_taxa_mortalidade['Entity'] = df_taxa_mortalidade['Entity'].apply(padroniza_nome)
+    df_taxa_mortalidade['Entity'] = padroniza_entidades(df_taxa_mortalidade['Entity'], 'taxa_mortalidade')
     df_taxa_mortalidade['Year'] = df_taxa_mortalidade['Year'].astype(int)
     df_taxa_mortalidade['Taxa_Mortalidade'] = df_taxa_mortalidade['Taxa_Mortalidade'].fillna(0.0)
 
     # 1.6 - Médicos por Habitante
     df_medicos_por_habitante.rename(columns={'Location': 'Entity', 'Period': 'Year'}, inplace=True)
-    df_medicos_por_habitante['Entity'] = df_medicos_por_habitante['Entity'].apply(padroniza_nome)
+    df_medicos_por_habitante['Entity'] = padroniza_entidades(df_medicos_por_habitante['Entity'], 'medicos_por_habitante')
     df_medicos_por_habitante['Year'] = df_medicos_por_habitante['Year'].astype(int)
     df_medicos_por_habitante['Medicos_Por_Habitante'] = df_medicos_por_habitante['Medicos_Por_Habitante'].fillna(0.0)
 
     # 1.7 - Em Conflito
-    df_em_conflito['Entity'] = df_em_conflito['Entity'].apply(padroniza_nome)
+    df_em_conflito['Entity'] = padroniza_entidades(df_em_conflito['Entity'], 'em_conflito')
     df_em_conflito['Year'] = df_em_conflito['Year'].astype(int)
     df_em_conflito['Em_Conflito'] = df_em_conflito['Em_Conflito'].fillna('Baixo')
 
     # 1.8 - Religião
     df_religiao = df_religiao_final.copy()
     df_religiao.rename(columns={'nome do pais': 'Entity', 'ano': 'Year', 'religiao': 'Nome_Religiao', 'classificacao': 'Classificacao'}, inplace=True)
-    df_religiao['Entity'] = df_religiao['Entity'].apply(padroniza_nome)
+    df_religiao['Entity'] = padroniza_entidades(df_religiao['Entity'], 'religiao')
     df_religiao['Year'] = df_religiao['Year'].astype(int)
     df_religiao['Religiao_Predominante'] = df_religiao['Religiao_Predominante'].fillna('Não Informado')
     df_religiao_fato = df_religiao[['Year', 'Entity', 'Religiao_Predominante']].drop_duplicates().reset_index(drop=True)
+    if df_religiao_classificacao is None:
+        df_religiao_dim = df_religiao[['Nome_Religiao', 'Classificacao']]
+    else:
+        df_religiao_dim = df_religiao_classificacao.rename(columns={'religiao': 'Nome_Religiao', 'classificacao': 'Classificacao'})
 
-    # 2. Montar o DataFrame temporário de Fato (para posterior inserção das chaves)
+    fontes = [
+        (df_pib_per_capita, ['PIB_Per_Capita']),
+        (df_acesso_educacao, ['Acesso_Educacao']),
+        (df_expectativa_vida, ['Expectativa_Vida']),
+        (df_taxa_mortalidade, ['Taxa_Mortalidade']),
+        (df_medicos_por_habitante, ['Medicos_Por_Habitante']),
+        (df_em_conflito, ['Em_Conflito']),
+        (df_religiao_fato, ['Religiao_Predominante']),
+    ]
+    return df_hist, fontes, df_religiao_dim
 
-    df_fato_temp = df_hist.copy()
-    df_fato_temp = df_fato_temp.merge(df_pib_per_capita[['Entity','Year','PIB_Per_Capita']], on=['Entity','Year'], how='left')
-    df_fato_temp = df_fato_temp.merge(df_acesso_educacao[['Entity','Year','Acesso_Educacao']], on=['Entity','Year'], how='left')
-    df_fato_temp = df_fato_temp.merge(df_expectativa_vida[['Entity','Year','Expectativa_Vida']], on=['Entity','Year'], how='left')
-    df_fato_temp = df_fato_temp.merge(df_taxa_mortalidade[['Entity','Year','Taxa_Mortalidade']], on=['Entity','Year'], how='left')
-    df_fato_temp = df_fato_temp.merge(df_medicos_por_habitante[['Entity','Year','Medicos_Por_Habitante']], on=['Entity','Year'], how='left')
-    df_fato_temp = df_fato_temp.merge(df_em_conflito[['Entity','Year','Em_Conflito']], on=['Entity','Year'], how='left')
-    df_fato_temp['Em_Conflito'] = df_fato_temp['Em_Conflito'].fillna('Baixo')
-    df_fato_temp = df_fato_temp.merge(df_religiao_fato[['Entity', 'Year', 'Religiao_Predominante']], on=['Entity', 'Year'], how='left')
-
-    # 3. Criação das Dimensões
+def cria_dimensoes(anos, entidades, df_religiao_dim, incremental=False, dir_registros=None):
+    """
+    Etapa 3 do pipeline: monta Dim_Tempo a partir dos anos, Dim_Local a partir das entidades
+    (DataFrame com a coluna Entity, na ordem de primeira ocorrência) e Dim_Religiao.
+    No modo incremental os IDs vêm dos registros de dimensoes.
 
+    Retorna (dim_tempo, dim_local, dim_religiao, deltas).
+    """
     # 3.1 - Dim_Tempo
-    dim_tempo = pd.DataFrame({'Ano': sorted(df_fato_temp['Year'].unique())})
-    dim_tempo['Decada'] = dim_tempo['Ano'].apply(lambda x: (x // 10)*10)
-    dim_tempo['ID_Tempo'] = np.arange(1, len(dim_tempo)+1)
+    dim_tempo = pd.DataFrame({'Ano': sorted(pd.unique(np.asarray(anos)))})
+    dim_tempo['Decada'] = (dim_tempo['Ano'] // 10) * 10
+    deltas = {}
+    if incremental:
+        dim_tempo, deltas['dim_tempo'] = dimensoes.atualiza_dimensao('dim_tempo', dim_tempo, 'Ano', 'ID_Tempo', dir_registros)
+    else:
+        dim_tempo['ID_Tempo'] = np.arange(1, len(dim_tempo)+1)
 
     # 3.2 - Dim_Local
-    dim_local = df_fato_temp[['Entity']].drop_duplicates().copy()
+    dim_local = entidades[['Entity']].drop_duplicates().copy()
     dim_local.rename(columns={'Entity': 'Pais'}, inplace=True)
-    pais_to_continente = {
-        "india": "Asia",
-        "china": "Asia",
-        "united states": "north america",
-        "indonesia": "asia",
-        "pakistan": "asia",
-        "nigeria": "africa",
-        "brazil": "south america",
-        "bangladesh": "asia",
-        "russia": "europe/asia",
-        "ethiopia": "africa",
-        "mexico": "north america",
-        "japan": "asia",
-        "egypt": "africa",
-        "philippines": "asia",
-        "dr congo": "africa",
-        "vietnam": "asia",
-        "iran": "asia",
-        "turkey": "europe/asia",
-        "germany": "europe",
-        "thailand": "asia",
-        "united kingdom": "europe",
-        "tanzania": "africa",
-        "france": "europe",
-        "south africa": "africa",
-        "italy": "europe",
-        "kenya": "africa",
-        "myanmar": "asia",
-        "colombia": "south america",
-        "south korea": "asia",
-        "sudan": "africa",
-        "uganda": "africa",
-        "spain": "europe",
-        "algeria": "africa",
-        "iraq": "asia",
-        "argentina": "south america",
-        "afghanistan": "asia",
-        "yemen": "asia",
-        "canada": "north america",
-        "poland": "europe",
-        "morocco": "africa",
-        "angola": "africa",
-        "ukraine": "europe",
-        "uzbekistan": "asia",
-        "malaysia": "asia",
-        "mozambique": "africa",
-        "ghana": "africa",
-        "peru": "south america",
-        "saudi arabia": "asia",
-        "madagascar": "africa",
-        "côte d'ivoire": "africa",
-        "nepal": "asia",
-        "cameroon": "africa",
-        "venezuela": "south america",
-        "niger": "africa",
-        "australia": "oceania",
-        "north korea": "asia",
-        "syria": "asia",
-        "mali": "africa",
-        "burkina faso": "africa",
-        "taiwan": "asia",
-        "sri lanka": "asia",
-        "malawi": "africa",
-        "zambia": "africa",
-        "kazakhstan": "europe/asia",
-        "chad": "africa",
-        "chile": "south america",
-        "romania": "europe",
-        "somalia": "africa",
-        "senegal": "africa",
-        "guatemala": "central america",
-        "netherlands": "europe",
-        "ecuador": "south america",
-        "cambodia": "asia",
-        "zimbabwe": "africa",
-        "guinea": "africa",
-        "benin": "africa",
-        "rwanda": "africa",
-        "burundi": "africa",
-        "bolivia": "south america",
-        "tunisia": "africa",
-        "south sudan": "africa",
-        "haiti": "central america",
-        "belgium": "europe",
-        "jordan": "asia",
-        "dominican republic": "central america",
-        "united arab emirates": "asia",
-        "cuba": "central america",
-        "honduras": "central america",
-        "czech republic (czechia)": "europe",
-        "sweden": "europe",
-        "tajikistan": "asia",
-        "papua new guinea": "oceania",
-        "portugal": "europe",
-        "azerbaijan": "asia",
-        "greece": "europe",
-        "hungary": "europe",
-        "togo": "africa",
-        "israel": "asia",
-        "austria": "europe",
-        "belarus": "europe",
-        "switzerland": "europe",
-        "sierra leone": "africa",
-        "laos": "asia",
-        "turkmenistan": "asia",
-        "hong kong": "asia",
-        "libya": "africa",
-        "kyrgyzstan": "asia",
-        "paraguay": "south america",
-        "nicaragua": "central america",
-        "bulgaria": "europe",
-        "serbia": "europe",
-        "el salvador": "central america",
-        "congo": "africa",
-        "denmark": "europe",
-        "singapore": "asia",
-        "lebanon": "asia",
-        "finland": "europe",
-        "liberia": "africa",
-        "norway": "europe",
-        "slovakia": "europe",
-        "state of palestine": "asia",
-        "central african republic": "africa",
-        "oman": "asia",
-        "ireland": "europe",
-        "new zealand": "oceania",
-        "mauritania": "africa",
-        "costa rica": "central america",
-        "kuwait": "asia",
-        "panama": "central america",
-        "croatia": "europe",
-        "georgia": "europe/asia",
-        "eritrea": "africa",
-        "mongolia": "asia",
-        "uruguay": "south america",
-        "puerto rico": "central america",
-        "bosnia and herzegovina": "europe",
-        "qatar": "asia",
-        "moldova": "europe",
-        "namibia": "africa",
-        "armenia": "europe/asia",
-        "lithuania": "europe",
-        "jamaica": "central america",
-        "albania": "europe",
-        "gambia": "africa",
-        "gabon": "africa",
-        "botswana": "africa",
-        "lesotho": "africa",
-        "guinea-bissau": "africa",
-        "slovenia": "europe",
-        "equatorial guinea": "africa",
-        "latvia": "europe",
-        "north macedonia": "europe",
-        "bahrain": "asia",
-        "trinidad and tobago": "central america",
-        "timor-leste": "asia",
-        "estonia": "europe",
-        "cyprus": "europe",
-        "mauritius": "africa",
-        "eswatini": "africa",
-        "djibouti": "africa",
-        "fiji": "oceania",
-        "réunion": "africa",
-        "comoros": "africa",
-        "guyana": "south america",
-        "solomon islands": "oceania",
-        "bhutan": "asia",
-        "macao": "asia",
-        "luxembourg": "europe",
-        "montenegro": "europe",
-        "suriname": "south america",
-        "western sahara": "africa",
-        "malta": "europe",
-        "maldives": "asia",
-        "micronesia": "oceania",
-        "cabo verde": "africa",
-        "brunei": "asia",
-        "belize": "central america",
-        "bahamas": "central america",
-        "iceland": "europe",
-        "guadeloupe": "central america",
-        "martinique": "central america",
-        "vanuatu": "oceania",
-        "mayotte": "africa",
-        "french guiana": "south america",
-        "new caledonia": "oceania",
-        "barbados": "central america",
-        "french polynesia": "oceania",
-        "sao tome & principe": "africa",
-        "samoa": "oceania",
-        "curaçao": "central america",
-        "saint lucia": "central america",
-        "guam": "oceania",
-        "kiribati": "oceania",
-        "seychelles": "africa",
-        "grenada": "central america",
-        "aruba": "south america",
-        "tonga": "oceania",
-        "st. vincent & grenadines": "central america",
-        "antigua and barbuda": "central america",
-        "u.s. virgin islands": "central america",
-        "isle of man": "europe",
-        "andorra": "europe",
-        "cayman islands": "central america",
-        "dominica": "central america",
-        "bermuda": "central america",
-        "greenland": "north america",
-        "faeroe islands": "europe",
-        "saint kitts & nevis": "central america",
-        "american samoa": "oceania",
-        "turks and caicos": "central america",
-        "northern mariana islands": "oceania",
-        "sint maarten": "central america",
-        "liechtenstein": "europe",
-        "british virgin islands": "central america",
-        "gibraltar": "europe",
-        "monaco": "europe",
-        "marshall islands": "oceania",
-        "san marino": "europe",
-        "caribbean netherlands": "central america",
-        "saint martin": "central america",
-        "palau": "oceania",
-        "anguilla": "central america",
-        "cook islands": "oceania",
-        "nauru": "oceania",
-        "wallis & futuna": "oceania",
-        "saint barthelemy": "central america",
-        "tuvalu": "oceania",
-        "saint pierre & miquelon": "north america",
-        "saint helena": "africa",
-        "montserrat": "central america",
-        "falkland islands": "south america",
-        "tokelau": "oceania",
-        "niue": "oceania",
-        "holy see": "europe"
-    }
-    dim_local['Continente'] = dim_local['Pais'].apply(lambda p: pais_to_continente.get(p, 'desconhecido'))
-    dim_local['ID_Local'] = np.arange(1, len(dim_local)+1)
+    dim_local['Continente'] = dim_local['Pais'].map(PAIS_TO_CONTINENTE).fillna('desconhecido')
+    if incremental:
+        dim_local, deltas['dim_local'] = dimensoes.atualiza_dimensao('dim_local', dim_local, 'Pais', 'ID_Local', dir_registros)
+    else:
+        dim_local['ID_Local'] = np.arange(1, len(dim_local)+1)
 
     # 3.3 - Dim_Religiao
-    dim_religiao = df_religiao[['Nome_Religiao', 'Classificacao']].drop_duplicates().reset_index(drop=True)
+    dim_religiao = df_religiao_dim[['Nome_Religiao', 'Classificacao']].drop_duplicates().reset_index(drop=True)
     dim_religiao = pd.concat([dim_religiao, pd.DataFrame([{'Nome_Religiao': 'nao_informado', 'Classificacao': 'Não Informado'}])], ignore_index=True)
-    dim_religiao['ID_Religiao'] = np.arange(1, len(dim_religiao)+1)
-
-    # 4. Transformar o DataFrame temporário em DF Fato com Chaves
+    if incremental:
+        dim_religiao, deltas['dim_religiao'] = dimensoes.atualiza_dimensao('dim_religiao', dim_religiao, 'Nome_Religiao', 'ID_Religiao', dir_registros)
+    else:
+        dim_religiao['ID_Religiao'] = np.arange(1, len(dim_religiao)+1)
 
-    # Join com Dim_Tempo
-    df_fato_merge = df_fato_temp.merge(
-        dim_tempo[['ID_Tempo','Ano']],
-        left_on='Year', right_on='Ano', how='left'
-    )
+    return dim_tempo, dim_local, dim_religiao, deltas
 
-    # Join com Dim_Local
-    df_fato_merge = df_fato_merge.merge(
-        dim_local[['ID_Local','Pais']],
-        left_on='Entity', right_on='Pais', how='left'
-    )
+def monta_fato(df_fato_temp, dim_tempo, dim_local, dim_religiao):
+    """
+    Etapa 4 do pipeline: substitui ano, país e religião pelas chaves das dimensões e
+    retorna o DataFrame de fato final.
+    """
+    # As chaves das dimensões são obtidas por busca em índice hash, sem merges
 
-    # Join com Dim_Religiao: garanta que ambos os campos estejam em minúsculas para consistência
+    df_fato_merge = df_fato_temp
+    df_fato_merge['ID_Tempo'] = mapeia_chaves(df_fato_merge['Year'], dim_tempo['Ano'], dim_tempo['ID_Tempo'])
+    df_fato_merge['ID_Local'] = mapeia_chaves(df_fato_merge['Entity'], dim_local['Pais'], dim_local['ID_Local'])
     df_fato_merge['Religiao_Predominante'] = df_fato_merge['Religiao_Predominante'].fillna('nao_informado')
-    df_fato_merge = df_fato_merge.merge(
-        dim_religiao[['ID_Religiao','Nome_Religiao']],
-        left_on='Religiao_Predominante', right_on='Nome_Religiao', how='left'
-    )
+    df_fato_merge['ID_Religiao'] = mapeia_chaves(df_fato_merge['Religiao_Predominante'],
+                                                 dim_religiao['Nome_Religiao'], dim_religiao['ID_Religiao'])
 
     # Monta o DataFrame final de fato
     df_fact_final = pd.DataFrame({
@@ -404,16 +505,280 @@ def run_pipeline(df_historico_pais, df_pib_per_capita, df_acesso_educacao,
         'Medicos_Por_Habitante': df_fato_merge['Medicos_Por_Habitante']
     })
 
-    # 5. Salva CSVs para Análise
+    return df_fact_final
+
+def run_pipeline(df_historico_pais, df_pib_per_capita, df_acesso_educacao,
+                 df_expectativa_vida, df_taxa_mortalidade, df_medicos_por_habitante,
+                 df_em_conflito, df_religiao_final, df_religiao_classificacao=None,
+                 resolver_entidades=True, incremental=True, dir_registros=None,
+                 workers=None, dir_saida="./arquivos_analise", formato_saida="csv"):
+    """
+    Executa o pipeline completo de transformação dos dados e monta os DataFrames
+    finais (fato e dimensões).
+
+    Parâmetros:
+        df_historico_pais: DataFrame com os dados históricos (contém colunas Country, Population, Growth_Rate, Urban_Population, Rural_Population)
+        df_pib_per_capita: DataFrame com dados do PIB per capita
+        df_acesso_educacao: DataFrame com dados de acesso à educação
+        df_expectativa_vida: DataFrame com dados de expectativa de vida
+        df_taxa_mortalidade: DataFrame com dados de taxa de mortalidade (colunas location_name e year serão renomeadas)
+        df_medicos_por_habitante: DataFrame com dados de médicos por habitante (colunas Location e Period serão renomeadas)
+        df_em_conflito: DataFrame com dados da coluna Em_Conflito
+        df_religiao_final: DataFrame unificado com os dados de religião (deve conter colunas Entity, Year e Religiao_Predominante)
+        df_religiao_classificacao: opcional; quando informado (saída de dados_fetch.fetch_religiao_predominante),
+            df_religiao_final está no formato compacto (ano, nome do pais, Religiao_Predominante) e este
+            DataFrame traz a classificação de cada religião (religiao, classificacao)
+        resolver_entidades: se True (padrão), os nomes de países de todas as fontes são resolvidos
+            para o nome canônico do Worldometers via entidades.ResolvedorEntidades; se False,
+            apenas strip/lower, como antes
+        incremental: se True (padrão), os IDs das dimensões vêm dos registros persistentes de
+            dimensoes (membros existentes mantêm o ID, novos recebem IDs a seguir do maior) e apenas
+            as linhas novas/alteradas são gravadas em <dir_saida>/incremental; se False,
+            as dimensões são numeradas de 1 a n a cada execução, como antes
+        dir_registros: diretório dos registros (padrão: dimensoes.DIR_REGISTROS)
+        workers: se maior que 1, o alinhamento das fontes é particionado por país e executado
+            em um pool com esse número de processos (alinha_particionado); a saída é idêntica
+        dir_saida: diretório onde as tabelas finais são gravadas
+        formato_saida: "csv" (padrão; CSVs UTF-8 com BOM) ou "parquet" (Parquet tipado, com o
+            fato particionado por Decada; ver saida)
+        
+    Retorna:
+        Um dicionário com os DataFrames finais: df_fact_final, dim_tempo, dim_local e dim_religiao,
+        o relatório de correspondência de nomes por fonte (relatorio_entidades) e, no modo incremental,
+        as linhas novas/alteradas de cada tabela (deltas).
+    """
+
+    resolvedor = ResolvedorEntidades() if resolver_entidades else None
+
+    def padroniza_entidades(serie, fonte):
+        if resolvedor is None:
+            return padroniza_nomes(serie)
+        return resolvedor.padroniza(serie, fonte)
+
+    # 1. Leitura e Tratamento dos DataFrames de Origem
+    entradas = [df_historico_pais, df_pib_per_capita, df_acesso_educacao, df_expectativa_vida,
+                df_taxa_mortalidade, df_medicos_por_habitante, df_em_conflito, df_religiao_final]
+    with metricas.etapa("integration.prepara_fontes", metricas.conta_linhas(entradas)) as etapa:
+        df_hist, fontes, df_religiao_dim = prepara_fontes(
+            df_historico_pais, df_pib_per_capita, df_acesso_educacao, df_expectativa_vida,
+            df_taxa_mortalidade, df_medicos_por_habitante, df_em_conflito, df_religiao_final,
+            df_religiao_classificacao, padroniza_entidades)
+        linhas_fontes = len(df_hist) + sum(len(df) for df, _ in fontes)
+        etapa.linhas_saida = linhas_fontes
+
+    # 2. Montar o DataFrame temporário de Fato (para posterior inserção das chaves)
+    # Todas as fontes são alinhadas de uma vez por chaves inteiras (país codificado + ano)
+
+    with metricas.etapa("integration.alinha", linhas_fontes) as etapa:
+        if workers and workers > 1:
+            df_fato_temp = alinha_particionado(df_hist, fontes, workers)
+        else:
+            df_fato_temp = _alinha_particao(df_hist, fontes)
+        etapa.linhas_saida = len(df_fato_temp)
+
+    # 3. Criação das Dimensões
+    with metricas.etapa("integration.dimensoes", len(df_fato_temp)) as etapa:
+        dim_tempo, dim_local, dim_religiao, deltas = cria_dimensoes(
+            df_fato_temp['Year'], df_fato_temp[['Entity']], df_religiao_dim, incremental, dir_registros)
+        etapa.linhas_saida = len(dim_tempo) + len(dim_local) + len(dim_religiao)
+
+    # 4. Transformar o DataFrame temporário em DF Fato com Chaves
+    with metricas.etapa("integration.monta_fato", len(df_fato_temp)) as etapa:
+        df_fact_final = monta_fato(df_fato_temp, dim_tempo, dim_local, dim_religiao)
+        etapa.linhas_saida = len(df_fact_final)
+    del df_fato_temp
+
+    relatorio_entidades = None
+    if resolvedor is not None:
+        resolvedor.log_relatorio()
+        relatorio_entidades = resolvedor.relatorio()
+
+    # 5. Salva as tabelas para Análise (CSV ou Parquet)
+
+    tabelas = {
+        'df_fact_final': df_fact_final,
+        'dim_tempo': dim_tempo,
+        'dim_local': dim_local,
+        'dim_religiao': dim_religiao,
+    }
+    linhas_tabelas = metricas.conta_linhas(tabelas)
+    with metricas.etapa("integration.grava_saida", linhas_tabelas) as etapa:
+        saida.grava(tabelas, dir_saida, formato_saida)
+        etapa.linhas_saida = linhas_tabelas
 
-    df_fact_final.to_csv("./arquivos_analise/df_fato_final.csv", index=False, encoding="utf-8-sig")
-    dim_tempo.to_csv("./arquivos_analise/dim_tempo.csv", index=False, encoding="utf-8-sig")
-    dim_local.to_csv("./arquivos_analise/dim_local.csv", index=False, encoding="utf-8-sig")
-    dim_religiao.to_csv("./arquivos_analise/dim_religiao.csv", index=False, encoding="utf-8-sig")
+    # 6. Modo incremental: grava apenas o que mudou e atualiza os registros
+    if incremental:
+        with metricas.etapa("integration.incremental", len(df_fact_final)) as etapa:
+            deltas['df_fact_final'], deltas['fatos_removidos'], hashes_fato = dimensoes.delta_fato(df_fact_final, diretorio=dir_registros)
+            os.makedirs(os.path.join(dir_saida, "incremental"), exist_ok=True)
+            for nome, df in deltas.items():
+                df.to_csv(os.path.join(dir_saida, "incremental", f"{nome}.csv"), index=False, encoding="utf-8-sig")
+            dimensoes.salva_registros({
+                'dim_tempo': dim_tempo,
+                'dim_local': dim_local,
+                'dim_religiao': dim_religiao,
+                'fato_hashes': hashes_fato,
+            }, dir_registros)
+            etapa.linhas_saida = metricas.conta_linhas(deltas)
+        logger.info("Incremental: " + ", ".join(f"{nome}={len(df)}" for nome, df in deltas.items()))
 
     return {
         'df_fact_final': df_fact_final,
         'dim_tempo': dim_tempo,
         'dim_local': dim_local,
-        'dim_religiao': dim_religiao
+        'dim_religiao': dim_religiao,
+        'relatorio_entidades': relatorio_entidades,
+        'deltas': deltas
+    }
+
+# Coluna de ano de cada fonte, antes da renomeação feita por prepara_fontes
+# (taxa de mortalidade chega como Year de dados_fetch ou como year no formato original)
+COLUNAS_ANO = {
+    'df_historico_pais': ('Year',),
+    'df_pib_per_capita': ('Year',),
+    'df_acesso_educacao': ('Year',),
+    'df_expectativa_vida': ('Year',),
+    'df_taxa_mortalidade': ('Year', 'year'),
+    'df_medicos_por_habitante': ('Period',),
+    'df_em_conflito': ('Year',),
+    'df_religiao_final': ('ano',),
+}
+
+LINHAS_POR_LOTE = 100_000
+
+def _colunas(fonte):
+    if isinstance(fonte, pd.DataFrame):
+        return fonte.columns
+    import pyarrow.parquet as pq
+    return pq.read_schema(fonte).names
+
+def le_bloco(fonte, colunas_ano, inicio, fim):
+    """
+    Retorna as linhas de `fonte` com inicio <= ano < fim, usando a primeira coluna de
+    `colunas_ano` presente. `fonte` pode ser um DataFrame ou o caminho de um arquivo Parquet;
+    neste caso o filtro é aplicado na leitura (pyarrow), sem carregar o arquivo inteiro.
+    """
+    coluna_ano = next(c for c in colunas_ano if c in _colunas(fonte))
+    if isinstance(fonte, pd.DataFrame):
+        anos = fonte[coluna_ano]
+        return fonte[(anos >= inicio) & (anos < fim)]
+    return pd.read_parquet(fonte, filters=[(coluna_ano, '>=', inicio), (coluna_ano, '<', fim)])
+
+def itera_lotes(fonte, colunas, linhas_por_lote=LINHAS_POR_LOTE):
+    """
+    Percorre `colunas` de `fonte` (DataFrame ou caminho Parquet) em lotes, na ordem das linhas.
+    """
+    if isinstance(fonte, pd.DataFrame):
+        for i in range(0, len(fonte), linhas_por_lote):
+            yield fonte[colunas].iloc[i:i + linhas_por_lote]
+        return
+    import pyarrow.parquet as pq
+    for lote in pq.ParquetFile(fonte).iter_batches(batch_size=linhas_por_lote, columns=colunas):
+        yield lote.to_pandas()
+
+def run_pipeline_streaming(fontes, dir_saida="./arquivos_analise", anos_por_bloco=10,
+                           resolver_entidades=True, incremental=True, dir_registros=None,
+                           formato_saida="csv"):
+    """
+    Versão em fluxo de run_pipeline, com memória limitada pelo tamanho do bloco e não pelo
+    volume total dos dados.
+
+    1. As dimensões são montadas antes, percorrendo apenas as colunas Country/Year do
+       histórico em lotes (Dim_Tempo, Dim_Local e Dim_Religiao são pequenas e ficam em memória).
+    2. Para cada faixa de `anos_por_bloco` anos, as fontes são lidas apenas naquela faixa
+       (le_bloco), tratadas (prepara_fontes), alinhadas e convertidas em linhas de fato, que
+       são acrescentadas diretamente ao CSV de saída; o bloco é descartado em seguida.
+
+    Parâmetros:
+        fontes: dicionário com os mesmos nomes dos parâmetros de run_pipeline; cada valor é um
+            DataFrame ou o caminho de um arquivo Parquet. A religião deve estar no formato
+            compacto, com df_religiao_classificacao informado (DataFrame).
+        anos_por_bloco: tamanho de cada faixa de anos
+        resolver_entidades, incremental, dir_registros: como em run_pipeline. No modo incremental
+            os IDs das dimensões vêm dos registros, mas as linhas de fato alteradas não são
+            separadas (o fato é sempre gravado por completo).
+        formato_saida: "csv" ou "parquet"; no Parquet cada bloco vira um conjunto de arquivos
+            nas partições de Decada do fato
+
+    Retorna:
+        Um dicionário com dim_tempo, dim_local, dim_religiao, o número de linhas de fato gravadas
+        e o relatório de correspondência de nomes por fonte (relatorio_entidades, somado sobre
+        os blocos). As linhas de fato são as mesmas de run_pipeline, agrupadas por faixa de anos.
+    """
+    if fontes.get('df_religiao_classificacao') is None:
+        raise ValueError("O modo em fluxo requer df_religiao_classificacao (religião no formato compacto).")
+
+    resolvedor = ResolvedorEntidades() if resolver_entidades else None
+
+    def padroniza_entidades(serie, fonte):
+        if resolvedor is None:
+            return padroniza_nomes(serie)
+        return resolvedor.padroniza(serie, fonte)
+
+    # 1. Dimensões a partir das chaves do histórico
+    # (sem fonte: o histórico entra no relatório de correspondência pelos blocos do passo 2)
+    entidades, anos = {}, set()
+    for lote in itera_lotes(fontes['df_historico_pais'], ['Country', 'Year']):
+        for nome in pd.unique(padroniza_entidades(lote['Country'], None)):
+            entidades.setdefault(nome, None)
+        anos.update(lote['Year'].astype(int).unique().tolist())
+    df_religiao_dim = fontes['df_religiao_classificacao'].rename(
+        columns={'religiao': 'Nome_Religiao', 'classificacao': 'Classificacao'})
+    dim_tempo, dim_local, dim_religiao, _ = cria_dimensoes(
+        sorted(anos), pd.DataFrame({'Entity': list(entidades)}), df_religiao_dim, incremental, dir_registros)
+
+    # 2. Fato em blocos de anos, gravado à medida que é produzido
+    os.makedirs(dir_saida, exist_ok=True)
+    dimensoes_finais = {'dim_tempo': dim_tempo, 'dim_local': dim_local, 'dim_religiao': dim_religiao}
+    if formato_saida == "parquet":
+        saida.grava_parquet(dimensoes_finais, dir_saida)
+        shutil.rmtree(os.path.join(dir_saida, saida.SUBDIR_PARQUET, saida.ARQUIVOS_PARQUET['df_fact_final']),
+                      ignore_errors=True)
+        arquivo_csv = None
+    else:
+        saida.grava_csv(dimensoes_finais, dir_saida)
+        arquivo_csv = open(os.path.join(dir_saida, saida.ARQUIVOS_CSV['df_fact_final']), "w",
+                           encoding="utf-8-sig", newline="")
+    linhas, hashes = 0, []
+    try:
+        for numero, inicio in enumerate(range(min(anos, default=0), max(anos, default=-1) + 1, anos_por_bloco)):
+            blocos = {nome: le_bloco(fontes[nome], colunas, inicio, inicio + anos_por_bloco)
+                      for nome, colunas in COLUNAS_ANO.items()}
+            df_hist, fontes_bloco, _ = prepara_fontes(
+                **blocos, df_religiao_classificacao=fontes['df_religiao_classificacao'],
+                padroniza_entidades=padroniza_entidades)
+            del blocos
+            df_fato = monta_fato(_alinha_particao(df_hist, fontes_bloco), dim_tempo, dim_local, dim_religiao)
+            del df_hist, fontes_bloco
+            if arquivo_csv is None:
+                saida.acrescenta_fato_parquet(df_fato, dim_tempo, dir_saida, bloco=numero)
+            else:
+                df_fato.to_csv(arquivo_csv, index=False, header=(linhas == 0))
+            linhas += len(df_fato)
+            if incremental:
+                hashes.append(dimensoes.hashes_fato(df_fato))
+    finally:
+        if arquivo_csv is not None:
+            arquivo_csv.close()
+
+    if incremental:
+        dimensoes.salva_registros({
+            'dim_tempo': dim_tempo,
+            'dim_local': dim_local,
+            'dim_religiao': dim_religiao,
+            'fato_hashes': pd.concat(hashes, ignore_index=True) if hashes else pd.DataFrame(columns=dimensoes.CHAVES_FATO + ['Hash']),
+        }, dir_registros)
+    logger.info(f"Pipeline em fluxo: {linhas} linhas de fato gravadas em blocos de {anos_por_bloco} anos.")
+
+    relatorio_entidades = None
+    if resolvedor is not None:
+        resolvedor.log_relatorio()
+        relatorio_entidades = resolvedor.relatorio()
+
+    return {
+        'dim_tempo': dim_tempo,
+        'dim_local': dim_local,
+        'dim_religiao': dim_religiao,
+        'linhas_fato': linhas,
+        'relatorio_entidades': relatorio_entidades,
     }
\ No newline at end of file
@@ -0,0 +1,369 @@
+"""
+metricas.py
+
+Este módulo instrumenta as etapas do ETL (scraping, dados_fetch e integration) para que se
+possa saber onde uma execução lenta gasta seu tempo. Para cada etapa são registrados o tempo
+de parede, as linhas de entrada e de saída, o pico de memória (tracemalloc) e os bytes HTTP;
+para cada requisição HTTP (feita via http_cache) são registrados a latência, em um histograma
+por host e origem (hit, revalidado, miss), e os bytes recebidos.
+
+A instrumentação fica desligada por padrão: etapa() devolve um objeto nulo compartilhado e
+as demais funções retornam na primeira linha, de modo que o custo é o de uma chamada de função.
+Uso:
+    metricas.configurar(habilitado=True)
+    ... scraping.scrape(), dados_fetch.fetch_all(), integration.run_pipeline(...) ...
+    metricas.grava_relatorio("./logs/metricas.json")      # relatório da execução em JSON
+    metricas.grava_prometheus("./logs/metricas.prom")     # textfile do node_exporter
+
+Etapas executadas várias vezes (como o parsing de cada página de país) são agregadas pelo nome.
+O pico de memória de uma etapa é o maior volume alocado (acima do início da etapa) enquanto ela
+estava ativa, incluindo o que outras threads alocaram no mesmo intervalo.
+"""
+
+import functools
+import json
+import logging
+import os
+import threading
+import time
+import tracemalloc
+from datetime import datetime
+from urllib.parse import urlsplit
+
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+# Configuração padrão (pode ser alterada via configurar)
+HABILITADO = False
+MEDIR_MEMORIA = True      # o tracemalloc deixa o código instrumentado várias vezes mais lento
+
+# Limites superiores (segundos) dos buckets do histograma de latência HTTP
+BUCKETS_LATENCIA = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+_lock = threading.Lock()
+_local = threading.local()     # pilha das etapas ativas em cada thread
+_ativas = set()                # etapas ativas em todas as threads (para o pico de memória)
+_etapas = {}                   # nome -> valores agregados
+_http = {}                     # (host, origem) -> contagens, bytes e histograma
+_inicio = {"data": None, "perf": None}
+_tracemalloc_proprio = False
+
+def configurar(habilitado=None, medir_memoria=None):
+    """
+    Altera a configuração global. Parâmetros omitidos mantêm o valor atual.
+    Ao habilitar, os contadores são zerados e começa uma nova execução.
+    """
+    global HABILITADO, MEDIR_MEMORIA
+    if medir_memoria is not None:
+        MEDIR_MEMORIA = medir_memoria
+    if habilitado is not None:
+        if habilitado and not HABILITADO:
+            zerar()
+        HABILITADO = habilitado
+    _ajusta_tracemalloc()
+
+def _ajusta_tracemalloc():
+    global _tracemalloc_proprio
+    if HABILITADO and MEDIR_MEMORIA and not tracemalloc.is_tracing():
+        tracemalloc.start()
+        _tracemalloc_proprio = True
+    elif not (HABILITADO and MEDIR_MEMORIA) and _tracemalloc_proprio:
+        tracemalloc.stop()
+        _tracemalloc_proprio = False
+
+def zerar():
+    with _lock:
+        _etapas.clear()
+        _http.clear()
+        _inicio["data"] = datetime.now().isoformat(timespec="seconds")
+        _inicio["perf"] = time.perf_counter()
+
+class _EtapaNula:
+    """
+    Etapa devolvida quando a instrumentação está desligada: não mede nada. É compartilhada
+    entre as threads, então atribuições (e.linhas_saida = ...) são descartadas.
+    """
+    linhas_entrada = None
+    linhas_saida = None
+
+    def __setattr__(self, nome, valor):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *excecao):
+        return False
+
+_ETAPA_NULA = _EtapaNula()
+
+class Etapa:
+    """
+    Medição de uma execução de etapa, usada como gerenciador de contexto (ver etapa()).
+    `linhas_entrada` e `linhas_saida` podem ser atribuídas dentro do bloco; adiciona_entrada()
+    e registra_http() somam à etapa mais interna ativa na thread.
+    """
+
+    def __init__(self, nome, linhas_entrada=None):
+        self.nome = nome
+        self.linhas_entrada = linhas_entrada
+        self.linhas_saida = None
+        self.bytes_http = 0
+        self.pico = 0
+        self.base = 0
+
+    def __enter__(self):
+        pilha = _pilha()
+        pilha.append(self)
+        if _mede_memoria():
+            with _lock:
+                _propaga_pico()
+                self.base = tracemalloc.get_traced_memory()[0]
+                _ativas.add(self)
+        self.inicio = time.perf_counter()
+        return self
+
+    def __exit__(self, tipo, excecao, rastro):
+        duracao = time.perf_counter() - self.inicio
+        pilha = _pilha()
+        if self in pilha:
+            pilha.remove(self)
+        with _lock:
+            if self in _ativas:
+                _propaga_pico()
+                _ativas.discard(self)
+            _acumula(self, duracao, tipo is not None)
+        return False
+
+def _mede_memoria():
+    return MEDIR_MEMORIA and tracemalloc.is_tracing()
+
+def _pilha():
+    pilha = getattr(_local, "pilha", None)
+    if pilha is None:
+        pilha = _local.pilha = []
+    return pilha
+
+def _propaga_pico():
+    # Chamado com _lock: repassa o pico desde o último reset a todas as etapas ativas
+    if not _mede_memoria():
+        return
+    pico = tracemalloc.get_traced_memory()[1]
+    for ativa in _ativas:
+        ativa.pico = max(ativa.pico, pico - ativa.base)
+    tracemalloc.reset_peak()
+
+def _acumula(etapa_, duracao, falhou):
+    agregado = _etapas.setdefault(etapa_.nome, {
+        "execucoes": 0, "falhas": 0, "s": 0.0, "s_max": 0.0, "pico_bytes": 0,
+        "linhas_entrada": None, "linhas_saida": None, "bytes_http": 0,
+    })
+    agregado["execucoes"] += 1
+    agregado["falhas"] += int(falhou)
+    agregado["s"] += duracao
+    agregado["s_max"] = max(agregado["s_max"], duracao)
+    agregado["pico_bytes"] = max(agregado["pico_bytes"], etapa_.pico)
+    agregado["bytes_http"] += etapa_.bytes_http
+    for chave in ("linhas_entrada", "linhas_saida"):
+        valor = getattr(etapa_, chave)
+        if valor is not None:
+            agregado[chave] = (agregado[chave] or 0) + int(valor)
+
+def etapa(nome, linhas_entrada=None):
+    """
+    Gerenciador de contexto que mede um bloco como a etapa `nome`:
+        with metricas.etapa("integration.alinha", len(df_hist)) as e:
+            ...
+            e.linhas_saida = len(df_fato_temp)
+    Com a instrumentação desligada devolve um objeto nulo compartilhado.
+    """
+    if not HABILITADO:
+        return _ETAPA_NULA
+    return Etapa(nome, linhas_entrada)
+
+def mede(nome):
+    """
+    Decorador que mede cada chamada da função como a etapa `nome`, com as linhas de saída
+    contadas no valor retornado (conta_linhas). Desligado, apenas repassa a chamada.
+    """
+    def decorador(funcao):
+        @functools.wraps(funcao)
+        def medida(*args, **kwargs):
+            if not HABILITADO:
+                return funcao(*args, **kwargs)
+            with Etapa(nome) as e:
+                resultado = funcao(*args, **kwargs)
+                e.linhas_saida = conta_linhas(resultado)
+            return resultado
+        return medida
+    return decorador
+
+def conta_linhas(resultado):
+    """
+    Número de linhas de um DataFrame, ou a soma para tuplas, listas e dicionários de DataFrames.
+    """
+    if isinstance(resultado, pd.DataFrame):
+        return len(resultado)
+    if isinstance(resultado, dict):
+        return sum(conta_linhas(valor) for valor in resultado.values())
+    if isinstance(resultado, (list, tuple)):
+        return sum(conta_linhas(valor) for valor in resultado)
+    return 0
+
+def adiciona_entrada(linhas):
+    """
+    Soma `linhas` às linhas de entrada da etapa mais interna ativa nesta thread
+    (usado pelas leituras de CSV, que não sabem em qual etapa estão).
+    """
+    if not HABILITADO:
+        return
+    pilha = _pilha()
+    if pilha:
+        pilha[-1].linhas_entrada = (pilha[-1].linhas_entrada or 0) + linhas
+
+def registra_http(url, segundos, n_bytes, origem, status=None):
+    """
+    Registra uma requisição HTTP: latência no histograma de (host, origem) e bytes recebidos,
+    também somados à etapa mais interna ativa nesta thread.
+    """
+    if not HABILITADO:
+        return
+    pilha = _pilha()
+    if pilha:
+        pilha[-1].bytes_http += n_bytes
+    chave = (urlsplit(url).hostname or "", origem)
+    with _lock:
+        serie = _http.get(chave)
+        if serie is None:
+            serie = _http[chave] = {"requisicoes": 0, "erros": 0, "bytes": 0, "soma_s": 0.0,
+                                    "buckets": [0] * (len(BUCKETS_LATENCIA) + 1)}
+        serie["requisicoes"] += 1
+        serie["erros"] += int(status is None or status >= 400)
+        serie["bytes"] += n_bytes
+        serie["soma_s"] += segundos
+        for i, limite in enumerate(BUCKETS_LATENCIA):
+            if segundos <= limite:
+                serie["buckets"][i] += 1
+                break
+        else:
+            serie["buckets"][-1] += 1
+
+def relatorio():
+    """
+    Retorna o relatório da execução: {inicio, duracao_s, etapas: {nome: ...}, http: [...]}.
+    Os buckets do histograma HTTP são cumulativos (como no Prometheus), com o último em "+Inf".
+    """
+    with _lock:
+        _propaga_pico()
+        etapas = {nome: dict(valores) for nome, valores in _etapas.items()}
+        http = []
+        for (host, origem), serie in sorted(_http.items()):
+            acumulado, buckets = 0, {}
+            for limite, contagem in zip(BUCKETS_LATENCIA + ("+Inf",), serie["buckets"]):
+                acumulado += contagem
+                buckets[str(limite)] = acumulado
+            http.append({"host": host, "origem": origem, "requisicoes": serie["requisicoes"],
+                         "erros": serie["erros"], "bytes": serie["bytes"], "soma_s": serie["soma_s"],
+                         "buckets": buckets})
+        inicio = dict(_inicio)
+    for valores in etapas.values():
+        valores["pico_mib"] = valores.pop("pico_bytes") / 2**20
+    return {
+        "inicio": inicio["data"],
+        "duracao_s": time.perf_counter() - inicio["perf"] if inicio["perf"] is not None else None,
+        "memoria_medida": MEDIR_MEMORIA,
+        "etapas": etapas,
+        "http": http,
+    }
+
+def _grava_atomico(caminho, texto):
+    diretorio = os.path.dirname(caminho)
+    if diretorio:
+        os.makedirs(diretorio, exist_ok=True)
+    temporario = f"{caminho}.{os.getpid()}.tmp"
+    with open(temporario, "w", encoding="utf-8") as f:
+        f.write(texto)
+    os.replace(temporario, caminho)
+
+def grava_relatorio(caminho):
+    """
+    Grava relatorio() em JSON em `caminho` e o retorna.
+    """
+    resultado = relatorio()
+    _grava_atomico(caminho, json.dumps(resultado, indent=2, ensure_ascii=False))
+    return resultado
+
+def _escapa(valor):
+    return str(valor).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+def _rotulos(**rotulos):
+    return "{" + ",".join(f'{chave}="{_escapa(valor)}"' for chave, valor in rotulos.items()) + "}"
+
+def formato_prometheus(resultado=None):
+    """
+    Converte relatorio() para o formato texto de exposição do Prometheus.
+    """
+    resultado = relatorio() if resultado is None else resultado
+    linhas = []
+
+    def metrica(nome, tipo, ajuda, amostras):
+        linhas.append(f"# HELP {nome} {ajuda}")
+        linhas.append(f"# TYPE {nome} {tipo}")
+        linhas.extend(f"{nome}{rotulos} {valor}" for rotulos, valor in amostras)
+
+    etapas = resultado["etapas"]
+    for nome, campo, ajuda in (
+        ("etl_etapa_duracao_segundos", "s", "Tempo de parede acumulado da etapa."),
+        ("etl_etapa_execucoes", "execucoes", "Número de execuções da etapa."),
+        ("etl_etapa_falhas", "falhas", "Execuções da etapa encerradas por exceção."),
+        ("etl_etapa_linhas_entrada", "linhas_entrada", "Linhas de entrada da etapa."),
+        ("etl_etapa_linhas_saida", "linhas_saida", "Linhas de saída da etapa."),
+        ("etl_etapa_http_bytes", "bytes_http", "Bytes HTTP recebidos durante a etapa."),
+    ):
+        metrica(nome, "gauge", ajuda, [(_rotulos(etapa=etapa_), valores[campo])
+                                       for etapa_, valores in etapas.items() if valores[campo] is not None])
+    if resultado.get("memoria_medida"):
+        metrica("etl_etapa_pico_memoria_bytes", "gauge", "Pico de memória alocada durante a etapa (tracemalloc).",
+                [(_rotulos(etapa=etapa_), round(valores["pico_mib"] * 2**20)) for etapa_, valores in etapas.items()])
+
+    linhas.append("# HELP etl_http_latencia_segundos Latência das requisições HTTP (incluindo as servidas pelo cache).")
+    linhas.append("# TYPE etl_http_latencia_segundos histogram")
+    for serie in resultado["http"]:
+        rotulos = dict(host=serie["host"], origem=serie["origem"])
+        for limite, contagem in serie["buckets"].items():
+            linhas.append(f"etl_http_latencia_segundos_bucket{_rotulos(**rotulos, le=limite)} {contagem}")
+        linhas.append(f"etl_http_latencia_segundos_sum{_rotulos(**rotulos)} {serie['soma_s']}")
+        linhas.append(f"etl_http_latencia_segundos_count{_rotulos(**rotulos)} {serie['requisicoes']}")
+    metrica("etl_http_bytes_total", "counter", "Bytes recebidos (ou servidos pelo cache) por host e origem.",
+            [(_rotulos(host=s["host"], origem=s["origem"]), s["bytes"]) for s in resultado["http"]])
+    metrica("etl_http_erros_total", "counter", "Requisições HTTP com erro (status >= 400 ou exceção).",
+            [(_rotulos(host=s["host"], origem=s["origem"]), s["erros"]) for s in resultado["http"]])
+    if resultado.get("duracao_s") is not None:
+        metrica("etl_execucao_duracao_segundos", "gauge", "Tempo desde o início da execução instrumentada.",
+                [("", resultado["duracao_s"])])
+    metrica("etl_execucao_timestamp_segundos", "gauge", "Momento em que as métricas foram exportadas.",
+            [("", time.time())])
+    return "\n".join(linhas) + "\n"
+
+def grava_prometheus(caminho, resultado=None):
+    """
+    Grava as métricas em `caminho` no formato textfile do Prometheus (node_exporter
+    --collector.textfile.directory). A escrita é atômica, como o coletor exige.
+    """
+    _grava_atomico(caminho, formato_prometheus(resultado))
+
+def log_resumo():
+    """
+    Registra no log o tempo, as linhas e o pico de memória de cada etapa.
+    """
+    resultado = relatorio()
+    for nome, valores in resultado["etapas"].items():
+        logger.info(f"Etapa {nome}: {valores['execucoes']}x, {valores['s']:.2f}s, "
+                    f"{valores['linhas_entrada']} -> {valores['linhas_saida']} linhas, "
+                    f"pico {valores['pico_mib']:.1f} MiB, {valores['bytes_http'] / 1e6:.1f} MB HTTP.")
+    for serie in resultado["http"]:
+        media = serie["soma_s"] / serie["requisicoes"] if serie["requisicoes"] else 0
+        logger.info(f"HTTP {serie['host']} [{serie['origem']}]: {serie['requisicoes']} requisições, "
+                    f"média {media * 1000:.1f} ms, {serie['bytes'] / 1e6:.1f} MB, {serie['erros']} erros.")
+    return resultado
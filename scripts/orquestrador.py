@@ -0,0 +1,459 @@
+"""
+orquestrador.py
+
+Este módulo executa o ETL como um grafo de etapas (DAG) declaradas com suas dependências,
+em vez da sequência manual de chamadas do notebook. Etapas independentes (o scraping, as
+buscas do Our World in Data e a leitura das fontes locais) rodam em paralelo em um pool de
+threads; cada etapa recebe as saídas das suas dependências como argumentos nomeados.
+
+A saída de cada etapa é gravada em CHECKPOINT_DIR junto com uma impressão digital das suas
+entradas: o código dos módulos envolvidos, os parâmetros, a assinatura (tamanho e data de
+modificação) dos arquivos lidos e a impressão do conteúdo das saídas das dependências. Uma
+etapa cuja impressão coincide com a do checkpoint não é executada, e a saída só é lida do disco
+se alguma etapa seguinte precisar ser executada. Assim:
+  - se uma etapa falha, a próxima execução retoma a partir dela, reaproveitando as anteriores;
+  - uma segunda execução com as mesmas entradas praticamente não faz nada;
+  - uma fonte que é baixada de novo, mas volta com o mesmo conteúdo, não invalida a integração.
+Fontes remotas não têm assinatura local: seus checkpoints valem por `validade` segundos
+(o TTL do http_cache). Etapas com efeitos fora do checkpoint usam `valida`, que confere o
+estado atual antes de reaproveitá-lo: a integração confere se os arquivos que gravou (tabelas
+e registros incrementais) continuam com o mesmo conteúdo, e a carga, a versão dos dados no banco.
+
+Uso pela linha de comando (a partir da raiz do projeto):
+    python -m scripts.orquestrador [--conn postgresql://...] [--forca ETAPA ...] [--workers N]
+                                   [--saida DIR] [--completo] [--limpa]
+"""
+
+import argparse
+import asyncio
+import hashlib
+import inspect
+import json
+import logging
+import os
+import pickle
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+CHECKPOINT_DIR = "./cache/orquestrador"
+WORKERS = 4
+
+class FalhaEtapa(RuntimeError):
+    """
+    Uma etapa falhou; as etapas concluídas continuam no checkpoint para a próxima execução.
+    """
+
+class Etapa:
+    """
+    Declaração de uma etapa do grafo:
+        nome: identificador (e nome do argumento com que a saída é passada às dependentes)
+        funcao: chamada com as saídas das `dependencias` como argumentos nomeados; pode ser async
+        dependencias: nomes das etapas cujas saídas a etapa recebe
+        arquivos: arquivos locais lidos pela etapa (entram na impressão pela assinatura)
+        modulos: módulos cujo código entra na impressão (uma alteração invalida o checkpoint)
+        parametros: valores serializáveis em JSON que entram na impressão
+        validade: segundos em que o checkpoint vale (para fontes remotas); None = sem limite
+        valida: função(saida) -> bool que confere se o checkpoint ainda vale (efeitos externos)
+    """
+
+    def __init__(self, nome, funcao, dependencias=(), arquivos=(), modulos=(), parametros=None,
+                 validade=None, valida=None):
+        self.nome = nome
+        self.funcao = funcao
+        self.dependencias = tuple(dependencias)
+        self.arquivos = tuple(arquivos)
+        self.modulos = tuple(modulos)
+        self.parametros = parametros
+        self.validade = validade
+        self.valida = valida
+
+def configurar(diretorio=None, workers=None):
+    """
+    Altera a configuração global. Parâmetros omitidos mantêm o valor atual.
+    """
+    global CHECKPOINT_DIR, WORKERS
+    if diretorio is not None:
+        CHECKPOINT_DIR = diretorio
+    if workers is not None:
+        WORKERS = workers
+
+def ordem_topologica(etapas):
+    """
+    Retorna os nomes das etapas em uma ordem em que cada uma vem depois das suas dependências.
+    Levanta ValueError para dependências desconhecidas ou ciclos.
+    """
+    por_nome = {etapa.nome: etapa for etapa in etapas}
+    for etapa in etapas:
+        desconhecidas = [d for d in etapa.dependencias if d not in por_nome]
+        if desconhecidas:
+            raise ValueError(f"Etapa '{etapa.nome}' depende de etapas inexistentes: {desconhecidas}")
+    pendentes = {etapa.nome: set(etapa.dependencias) for etapa in etapas}
+    ordem = []
+    while pendentes:
+        prontas = sorted(nome for nome, deps in pendentes.items() if not deps)
+        if not prontas:
+            raise ValueError(f"Ciclo entre as etapas: {sorted(pendentes)}")
+        for nome in prontas:
+            del pendentes[nome]
+            ordem.append(nome)
+        for deps in pendentes.values():
+            deps.difference_update(prontas)
+    return ordem
+
+def impressao_saida(valor):
+    """
+    Impressão digital do conteúdo de uma saída: DataFrames pelo hash de cada linha (com índice,
+    colunas e dtypes), contêineres recursivamente e os demais objetos pelo pickle.
+    """
+    h = hashlib.sha256()
+
+    def atualiza(v):
+        if isinstance(v, pd.DataFrame):
+            h.update(b"df")
+            h.update(json.dumps([list(map(str, v.columns)), list(map(str, v.dtypes))]).encode("utf-8"))
+            h.update(pd.util.hash_pandas_object(v, index=True).to_numpy().tobytes())
+        elif isinstance(v, dict):
+            h.update(b"dict")
+            for chave in sorted(v, key=str):
+                h.update(str(chave).encode("utf-8"))
+                atualiza(v[chave])
+        elif isinstance(v, (list, tuple)):
+            h.update(type(v).__name__.encode("utf-8"))
+            for item in v:
+                atualiza(item)
+        else:
+            h.update(pickle.dumps(v, protocol=pickle.HIGHEST_PROTOCOL))
+
+    atualiza(valor)
+    return h.hexdigest()
+
+def _assinatura_arquivo(caminho):
+    try:
+        stat = os.stat(caminho)
+    except OSError:
+        return None
+    return f"{stat.st_size}-{stat.st_mtime_ns}"
+
+def impressao_arquivos(caminhos):
+    """
+    Impressão do conteúdo de cada arquivo de `caminhos` ({caminho: sha256}; None se não existir).
+    Ao contrário da assinatura por data, não muda quando o arquivo é regravado com o mesmo conteúdo.
+    """
+    impressoes = {}
+    for caminho in caminhos:
+        try:
+            with open(caminho, "rb") as f:
+                impressoes[caminho] = hashlib.sha256(f.read()).hexdigest()
+        except OSError:
+            impressoes[caminho] = None
+    return impressoes
+
+def _assinatura_codigo(modulo):
+    caminho = inspect.getsourcefile(modulo)
+    with open(caminho, "rb") as f:
+        return hashlib.sha256(f.read()).hexdigest()
+
+def chave(etapa, impressoes_dependencias):
+    """
+    Impressão das entradas de `etapa`, dada a impressão da saída de cada dependência.
+    """
+    partes = {
+        "nome": etapa.nome,
+        "modulos": {m.__name__: _assinatura_codigo(m) for m in etapa.modulos},
+        "parametros": etapa.parametros,
+        "arquivos": {caminho: _assinatura_arquivo(caminho) for caminho in etapa.arquivos},
+        "dependencias": {nome: impressoes_dependencias[nome] for nome in etapa.dependencias},
+    }
+    return hashlib.sha256(json.dumps(partes, sort_keys=True, default=str).encode("utf-8")).hexdigest()
+
+def _caminhos(nome):
+    return (os.path.join(CHECKPOINT_DIR, nome + ".json"),
+            os.path.join(CHECKPOINT_DIR, nome + ".pkl"))
+
+def _le_meta(nome):
+    try:
+        with open(_caminhos(nome)[0], "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+def _le_saida(nome):
+    with open(_caminhos(nome)[1], "rb") as f:
+        return pickle.load(f)
+
+def _grava_checkpoint(nome, meta, saida):
+    os.makedirs(CHECKPOINT_DIR, exist_ok=True)
+    caminho_meta, caminho_saida = _caminhos(nome)
+    sufixo = f".{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(caminho_saida + sufixo, "wb") as f:
+        pickle.dump(saida, f, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(caminho_saida + sufixo, caminho_saida)
+    # Os metadados são gravados por último: um checkpoint só vale depois que a saída está completa
+    with open(caminho_meta + sufixo, "w", encoding="utf-8") as f:
+        json.dump(meta, f)
+    os.replace(caminho_meta + sufixo, caminho_meta)
+
+def limpa(nomes=None):
+    """
+    Remove os checkpoints de `nomes` (ou todos).
+    """
+    if not os.path.isdir(CHECKPOINT_DIR):
+        return
+    for arquivo in os.listdir(CHECKPOINT_DIR):
+        if nomes is None or os.path.splitext(arquivo)[0] in nomes:
+            os.remove(os.path.join(CHECKPOINT_DIR, arquivo))
+
+def _checkpoint_valido(etapa, meta, chave_atual):
+    if meta is None or meta.get("chave") != chave_atual:
+        return False
+    if etapa.validade is not None and time.time() - meta["criado_em"] > etapa.validade:
+        return False
+    if etapa.valida is not None:
+        try:
+            return bool(etapa.valida(_le_saida(etapa.nome)))
+        except Exception as e:
+            logger.info(f"Checkpoint de '{etapa.nome}' descartado: {e}")
+            return False
+    return True
+
+def _chama(funcao, argumentos):
+    if inspect.iscoroutinefunction(funcao):
+        # Cada etapa assíncrona ganha um event loop próprio na sua thread
+        loop = asyncio.new_event_loop()
+        try:
+            asyncio.set_event_loop(loop)
+            return loop.run_until_complete(funcao(**argumentos))
+        finally:
+            asyncio.set_event_loop(None)
+            loop.close()
+    return funcao(**argumentos)
+
+_ultimo_relatorio = None
+
+def executa(etapas, alvos=None, forca=(), workers=None):
+    """
+    Executa o grafo `etapas` (lista de Etapa) até as etapas `alvos` (padrão: as que não têm
+    dependentes), reaproveitando os checkpoints válidos. `forca` lista etapas executadas mesmo
+    com checkpoint válido (as dependentes são reexecutadas se a saída mudar).
+    Retorna {alvo: saida}. Em caso de falha levanta FalhaEtapa depois que as etapas em andamento
+    terminam; as concluídas ficam no checkpoint. O relatório fica em relatorio().
+    """
+    global _ultimo_relatorio
+    por_nome = {etapa.nome: etapa for etapa in etapas}
+    ordem = ordem_topologica(etapas)
+    if alvos is None:
+        com_dependentes = {d for etapa in etapas for d in etapa.dependencias}
+        alvos = [nome for nome in ordem if nome not in com_dependentes]
+    necessarias, fila = set(), list(alvos)
+    while fila:
+        nome = fila.pop()
+        if nome not in necessarias:
+            necessarias.add(nome)
+            fila.extend(por_nome[nome].dependencias)
+    ordem = [nome for nome in ordem if nome in necessarias]
+    dependentes = {nome: [n for n in ordem if nome in por_nome[n].dependencias] for nome in ordem}
+
+    impressoes = {}      # nome -> impressão da saída (resolvidas)
+    saidas = {}          # saídas em memória (executadas ou lidas do checkpoint)
+    estados = {nome: {"etapa": nome, "estado": "pendente", "s": None} for nome in ordem}
+    falhas = {}
+    inicio_execucao = time.perf_counter()
+
+    def saida(nome):
+        if nome not in saidas:
+            saidas[nome] = _le_saida(nome)
+        return saidas[nome]
+
+    def executa_etapa(etapa, chave_atual, argumentos):
+        inicio = time.perf_counter()
+        resultado = _chama(etapa.funcao, argumentos)
+        duracao = time.perf_counter() - inicio
+        impressao = impressao_saida(resultado)
+        _grava_checkpoint(etapa.nome, {"chave": chave_atual, "impressao": impressao,
+                                       "criado_em": time.time(), "s": duracao}, resultado)
+        return resultado, impressao, duracao
+
+    with ThreadPoolExecutor(max_workers=workers or WORKERS) as executor:
+        em_andamento = {}
+        restantes = list(ordem)
+        while restantes or em_andamento:
+            # Resolve (pelo checkpoint) ou submete as etapas cujas dependências já foram resolvidas
+            avancou = True
+            while avancou and not falhas:
+                avancou = False
+                for nome in list(restantes):
+                    etapa = por_nome[nome]
+                    if any(d not in impressoes for d in etapa.dependencias):
+                        continue
+                    restantes.remove(nome)
+                    avancou = True
+                    chave_atual = chave(etapa, impressoes)
+                    meta = _le_meta(nome)
+                    if nome not in forca and _checkpoint_valido(etapa, meta, chave_atual):
+                        impressoes[nome] = meta["impressao"]
+                        estados[nome].update(estado="checkpoint", s=0.0)
+                        continue
+                    argumentos = {d: saida(d) for d in etapa.dependencias}
+                    estados[nome]["estado"] = "executando"
+                    em_andamento[executor.submit(executa_etapa, etapa, chave_atual, argumentos)] = nome
+            if not em_andamento:
+                break
+            concluidos, _ = wait(em_andamento, return_when=FIRST_COMPLETED)
+            for futuro in concluidos:
+                nome = em_andamento.pop(futuro)
+                try:
+                    resultado, impressao, duracao = futuro.result()
+                except Exception as e:
+                    falhas[nome] = e
+                    estados[nome]["estado"] = "falhou"
+                    logger.error(f"Etapa '{nome}' falhou: {e}")
+                    continue
+                saidas[nome], impressoes[nome] = resultado, impressao
+                estados[nome].update(estado="executada", s=duracao)
+                logger.info(f"Etapa '{nome}' executada em {duracao:.2f}s.")
+                # Saídas que nenhuma etapa restante usa não precisam ficar em memória
+                for dep in por_nome[nome].dependencias:
+                    if dep not in alvos and all(d in impressoes for d in dependentes[dep]):
+                        saidas.pop(dep, None)
+
+    _ultimo_relatorio = pd.DataFrame(list(estados.values()))
+    duracao_total = time.perf_counter() - inicio_execucao
+    contagem = _ultimo_relatorio["estado"].value_counts().to_dict()
+    logger.info(f"Orquestrador: {contagem.get('executada', 0)} etapas executadas, "
+                f"{contagem.get('checkpoint', 0)} do checkpoint, {contagem.get('falhou', 0)} com falha, "
+                f"{contagem.get('pendente', 0)} pendentes, em {duracao_total:.2f}s.")
+    if falhas:
+        nome, erro = next(iter(falhas.items()))
+        raise FalhaEtapa(f"A etapa '{nome}' falhou ({erro}); as etapas concluídas serão retomadas "
+                         f"do checkpoint na próxima execução.") from erro
+    return {nome: saida(nome) for nome in alvos}
+
+def relatorio():
+    """
+    Retorna o DataFrame (etapa, estado, s) da última execução.
+    """
+    return _ultimo_relatorio
+
+def etapas_etl(conn_string=None, dir_saida="./arquivos_analise", max_concorrencia=None, incluir_metadados=False,
+               incremental=True):
+    """
+    Declara o ETL do notebook: scraping do Worldometers, as fontes de dados_fetch, a integração
+    (run_pipeline) e, com `conn_string`, o desenho físico e a carga no PostgreSQL.
+    As etapas de fontes têm os nomes dos parâmetros de integration.run_pipeline. `incremental`
+    tem o mesmo padrão de run_pipeline, para que o orquestrador e a célula de integração do
+    notebook gravem os mesmos IDs em `dir_saida` e no banco: com True, a integração usa e
+    atualiza os registros incrementais (ver dimensoes) e a carga usa apenas os deltas; com
+    False, os IDs são recalculados e a carga substitui o conteúdo das tabelas.
+    """
+    # Imports locais: scraping configura o logging (./logs/scraping.log) ao ser importado
+    from scripts import armazenamento, carga, dados_fetch, dimensoes, entidades, esquema, faixas
+    from scripts import http_cache, integration, saida, scraping
+
+    async def historico():
+        resultado = await scraping.scrape(max_concorrencia or scraping.MAX_CONCORRENCIA)
+        df = resultado["Historico_Pais"]
+        if df is None or df.empty:
+            raise RuntimeError("O scraping não retornou dados históricos.")
+        return df
+
+    def fonte_owid(funcao):
+        return lambda: funcao(incluir_metadados)
+
+    # Código usado pelas fontes: dados_fetch classifica o Em_Conflito com faixas.aplica_faixas
+    modulos_fontes = (dados_fetch, armazenamento, faixas)
+
+    etapas = [Etapa("df_historico_pais", historico, modulos=(scraping,),
+                    parametros={"concorrencia": max_concorrencia}, validade=http_cache.TTL_PADRAO)]
+    for nome, funcao in dados_fetch.FONTES_OWID.items():
+        etapas.append(Etapa(nome, fonte_owid(funcao), modulos=modulos_fontes,
+                            parametros={"metadados": incluir_metadados}, validade=http_cache.TTL_PADRAO))
+    arquivos_locais = {
+        "df_taxa_mortalidade": "./data/taxa_mortalidade.csv",
+        "df_medicos_por_habitante": "./data/medicos_por_habitante.csv",
+    }
+    for nome, funcao in dados_fetch.FONTES_LOCAIS.items():
+        etapas.append(Etapa(nome, funcao, arquivos=(arquivos_locais[nome],), modulos=modulos_fontes))
+    etapas.append(Etapa("religiao", dados_fetch.fetch_religiao_predominante, arquivos=("./data/national.csv",),
+                        modulos=modulos_fontes))
+
+    fontes = [etapa.nome for etapa in etapas]
+
+    def arquivos_integracao():
+        # Arquivos gravados pela integração: as tabelas em dir_saida e, no modo incremental, os registros
+        arquivos = [os.path.join(dir_saida, arquivo) for arquivo in saida.ARQUIVOS_CSV.values()]
+        if incremental:
+            arquivos += [os.path.join(dimensoes.DIR_REGISTROS, nome + ".csv")
+                         for nome in ("dim_tempo", "dim_local", "dim_religiao", "fato_hashes")]
+        return impressao_arquivos(arquivos)
+
+    def integra(religiao, **dados):
+        df_religiao_final, df_religiao_classificacao = religiao
+        resultado = integration.run_pipeline(**dados, df_religiao_final=df_religiao_final,
+                                             df_religiao_classificacao=df_religiao_classificacao,
+                                             incremental=incremental, dir_saida=dir_saida)
+        resultado["arquivos"] = arquivos_integracao()
+        return resultado
+
+    def integracao_vigente(resultado):
+        # O checkpoint só vale se os arquivos gravados não foram apagados nem sobrescritos desde então
+        return resultado.get("arquivos") == arquivos_integracao()
+
+    etapas.append(Etapa("integracao", integra, dependencias=fontes, arquivos=(entidades.TABELA_PAISES,),
+                        modulos=(integration, dimensoes, entidades, saida), parametros={"saida": dir_saida, "incremental": incremental},
+                        valida=integracao_vigente))
+
+    if conn_string:
+        def carrega(integracao):
+            conn = carga.conecta(conn_string)
+            try:
+                esquema.aplica(conn, particionado=True, indices_fk=True,
+                               decadas=integracao["dim_tempo"]["Decada"])
+                linhas = carga.carrega_resultado(conn, integracao, incremental)
+                return {"linhas": linhas, "versao": carga.versao_dados(conn)}
+            finally:
+                conn.close()
+
+        def carga_vigente(resultado):
+            # O checkpoint só vale se ninguém recarregou (ou recriou) o banco desde então
+            conn = carga.conecta(conn_string)
+            try:
+                return carga.versao_dados(conn) == resultado["versao"]
+            finally:
+                conn.close()
+
+        etapas.append(Etapa("carga", carrega, dependencias=("integracao",), modulos=(carga, esquema),
+                            valida=carga_vigente))
+    return etapas
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Executa o ETL como um grafo de etapas com checkpoints.")
+    parser.add_argument("--conn", default=None, help="Inclui a carga no PostgreSQL.")
+    parser.add_argument("--forca", nargs="*", default=(), help="Etapas executadas mesmo com checkpoint válido.")
+    parser.add_argument("--workers", type=int, default=WORKERS)
+    parser.add_argument("--saida", default="./arquivos_analise")
+    parser.add_argument("--concorrencia", type=int, default=None)
+    parser.add_argument("--completo", action="store_true",
+                        help="Recalcula os IDs sem os registros incrementais e substitui o conteúdo do banco.")
+    parser.add_argument("--limpa", action="store_true", help="Remove os checkpoints antes de executar.")
+    args = parser.parse_args(argv)
+
+    if args.limpa:
+        limpa()
+    etapas = etapas_etl(args.conn, args.saida, args.concorrencia, incremental=not args.completo)
+    try:
+        executa(etapas, forca=args.forca, workers=args.workers)
+    except FalhaEtapa as e:
+        logger.error(str(e))
+        return 1
+    finally:
+        if relatorio() is not None:
+            print(relatorio().to_string(index=False))
+    return 0
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,258 @@
+"""
+reproducao.py
+
+Este módulo implementa a gravação e a reprodução das respostas HTTP usadas por scraping e
+dados_fetch, para execuções completamente offline. Como todas as requisições passam por
+http_cache.get / get_async, o desvio é feito ali, em processo, sem servidor:
+  - gravação: cada resposta devolvida (da rede ou do cache em disco) é registrada e, ao
+    encerrar, todas são gravadas em um único arquivo ZIP compactado com LZMA (indice.json
+    com URL, status e cabeçalhos; os corpos ficam em corpos/<sha256>, sem duplicatas);
+  - reprodução: as respostas são servidas do arquivo, sem acesso à rede e sem ler ou gravar
+    o cache HTTP; uma URL ausente do arquivo gera RespostaAusente (nunca vai à rede).
+Com isso uma execução gravada é reproduzida de forma determinística e sem latência de rede,
+o que também permite medir o parsing e a integração isoladamente.
+
+Uso:
+    reproducao.gravar("./cache/gravacao.zip")      # ... scrape / fetch_all ...
+    reproducao.encerrar()                          # grava o arquivo
+    reproducao.reproduzir("./cache/gravacao.zip")  # ... mesmas chamadas, offline ...
+    reproducao.encerrar()
+
+Uso pela linha de comando (a partir da raiz do projeto):
+    python -m scripts.reproducao grava ARQUIVO.zip [--acrescentar] [--sem-cache] [--metadados] [--concorrencia N]
+    python -m scripts.reproducao executa ARQUIVO.zip [--saida DIR] [--metadados] [--metricas PREFIXO]
+    python -m scripts.reproducao lista ARQUIVO.zip
+"""
+
+import argparse
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import tempfile
+import threading
+import time
+import zipfile
+
+import requests
+
+logger = logging.getLogger(__name__)
+
+GRAVANDO = "gravando"
+REPRODUZINDO = "reproduzindo"
+
+MODO = None            # None, GRAVANDO ou REPRODUZINDO
+ARQUIVO = None
+
+INDICE = "indice.json"
+
+_lock = threading.Lock()
+_indice = {}           # url -> {status_code, headers, encoding, corpo (sha256), tamanho}
+_corpos = {}           # sha256 -> bytes (gravação)
+_zip = None            # arquivo aberto (reprodução)
+_estatisticas = {"gravadas": 0, "reproduzidas": 0, "ausentes": 0}
+
+class RespostaAusente(requests.ConnectionError):
+    """
+    A URL pedida durante a reprodução não está no arquivo gravado.
+    """
+
+def _incrementa(chave, valor=1):
+    with _lock:
+        _estatisticas[chave] += valor
+
+def _le_arquivo(caminho):
+    arquivo = zipfile.ZipFile(caminho, "r")
+    return arquivo, json.loads(arquivo.read(INDICE).decode("utf-8"))
+
+def gravar(caminho, acrescentar=False):
+    """
+    Passa a registrar todas as respostas HTTP, que serão gravadas em `caminho` por encerrar().
+    Com `acrescentar=True` as entradas de um arquivo existente são mantidas
+    (as URLs buscadas novamente são substituídas).
+    """
+    global MODO, ARQUIVO
+    encerrar()
+    with _lock:
+        _indice.clear()
+        _corpos.clear()
+        if acrescentar and os.path.exists(caminho):
+            arquivo, indice = _le_arquivo(caminho)
+            with arquivo:
+                for url, entrada in indice.items():
+                    _indice[url] = entrada
+                    _corpos[entrada["corpo"]] = arquivo.read(f"corpos/{entrada['corpo']}")
+        MODO, ARQUIVO = GRAVANDO, caminho
+    logger.info(f"Gravação de respostas HTTP em {caminho} iniciada ({len(_indice)} entradas existentes).")
+
+def reproduzir(caminho):
+    """
+    Passa a servir as respostas HTTP do arquivo `caminho` (gerado por gravar/encerrar).
+    """
+    global MODO, ARQUIVO, _zip
+    encerrar()
+    arquivo, indice = _le_arquivo(caminho)
+    with _lock:
+        _indice.clear()
+        _indice.update(indice)
+        _zip = arquivo
+        MODO, ARQUIVO = REPRODUZINDO, caminho
+    logger.info(f"Reprodução de {len(indice)} respostas HTTP de {caminho}.")
+
+def encerrar():
+    """
+    Encerra o modo atual. Na gravação, escreve o arquivo (de forma atômica) e retorna
+    seu resumo (ver resumo()); caso contrário retorna None.
+    """
+    global MODO, ARQUIVO, _zip
+    with _lock:
+        modo, caminho = MODO, ARQUIVO
+        MODO = ARQUIVO = None
+        if _zip is not None:
+            _zip.close()
+            _zip = None
+        indice, corpos = dict(_indice), dict(_corpos)
+        _indice.clear()
+        _corpos.clear()
+    if modo != GRAVANDO:
+        return None
+    diretorio = os.path.dirname(caminho)
+    if diretorio:
+        os.makedirs(diretorio, exist_ok=True)
+    temporario = f"{caminho}.{os.getpid()}.tmp"
+    with zipfile.ZipFile(temporario, "w", compression=zipfile.ZIP_LZMA) as arquivo:
+        arquivo.writestr(INDICE, json.dumps(indice, indent=1, sort_keys=True))
+        for chave in sorted({entrada["corpo"] for entrada in indice.values()}):
+            arquivo.writestr(f"corpos/{chave}", corpos[chave])
+    os.replace(temporario, caminho)
+    resultado = resumo(caminho)
+    logger.info(f"Gravação encerrada: {resultado['respostas']} respostas, "
+                f"{resultado['bytes'] / 1e6:.1f} MB em {resultado['bytes_arquivo'] / 1e6:.1f} MB ({caminho}).")
+    return resultado
+
+def registra(url, status_code, conteudo, headers, encoding):
+    """
+    Registra uma resposta (chamado por http_cache durante a gravação).
+    """
+    chave = hashlib.sha256(conteudo).hexdigest()
+    entrada = {"status_code": status_code, "headers": dict(headers or {}), "encoding": encoding,
+               "corpo": chave, "tamanho": len(conteudo)}
+    with _lock:
+        if MODO != GRAVANDO:
+            return
+        _corpos.setdefault(chave, conteudo)
+        _indice[url] = entrada
+    _incrementa("gravadas")
+
+def resposta(url):
+    """
+    Retorna (status_code, conteudo, headers, encoding) gravados para `url`
+    (chamado por http_cache durante a reprodução). Levanta RespostaAusente se não houver.
+    """
+    with _lock:
+        entrada = _indice.get(url)
+        conteudo = _zip.read(f"corpos/{entrada['corpo']}") if entrada is not None else None
+    if entrada is None:
+        _incrementa("ausentes")
+        raise RespostaAusente(f"Resposta não gravada em {ARQUIVO}: {url}")
+    _incrementa("reproduzidas")
+    return entrada["status_code"], conteudo, entrada["headers"], entrada["encoding"]
+
+def resumo(caminho):
+    """
+    Retorna {respostas, corpos, bytes (sem compressão), bytes_arquivo, hosts: {host: respostas}}.
+    """
+    arquivo, indice = _le_arquivo(caminho)
+    with arquivo:
+        hosts = {}
+        for url in indice:
+            host = requests.utils.urlparse(url).hostname or ""
+            hosts[host] = hosts.get(host, 0) + 1
+        return {
+            "respostas": len(indice),
+            "corpos": len({entrada["corpo"] for entrada in indice.values()}),
+            "bytes": sum(entrada["tamanho"] for entrada in indice.values()),
+            "bytes_arquivo": os.path.getsize(caminho),
+            "hosts": hosts,
+        }
+
+def estatisticas():
+    with _lock:
+        return dict(_estatisticas)
+
+def zerar_estatisticas():
+    with _lock:
+        for chave in _estatisticas:
+            _estatisticas[chave] = 0
+
+def _executa_etl(concorrencia, incluir_metadados, diretorio_saida=None):
+    # Import local: scraping configura o logging (./logs/scraping.log) ao ser importado
+    from scripts import dados_fetch, integration, scraping
+    inicio = time.perf_counter()
+    historico = asyncio.run(scraping.scrape(concorrencia, full=True))["Historico_Pais"]
+    fontes = dados_fetch.fetch_all(incluir_metadados)
+    tempos = {"coleta_s": time.perf_counter() - inicio}
+    if diretorio_saida is not None:
+        if historico is None or historico.empty:
+            raise RuntimeError("Nenhum dado histórico foi reproduzido; o arquivo cobre a página principal?")
+        inicio = time.perf_counter()
+        integration.run_pipeline(historico, **fontes, incremental=False, dir_saida=diretorio_saida)
+        tempos["integracao_s"] = time.perf_counter() - inicio
+    return tempos
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Gravação e reprodução das respostas HTTP do ETL.")
+    sub = parser.add_subparsers(dest="comando", required=True)
+    p_grava = sub.add_parser("grava", help="Executa o scraping e as buscas remotas gravando as respostas.")
+    p_grava.add_argument("arquivo")
+    p_grava.add_argument("--acrescentar", action="store_true", help="Mantém as entradas de um arquivo existente.")
+    p_grava.add_argument("--sem-cache", action="store_true", help="Ignora o cache HTTP em disco (tudo da rede).")
+    p_grava.add_argument("--concorrencia", type=int, default=10)
+    p_grava.add_argument("--metadados", action="store_true", help="Grava também os metadados do Our World in Data.")
+    p_executa = sub.add_parser("executa", help="Reproduz o scraping, as buscas e o pipeline offline.")
+    p_executa.add_argument("arquivo")
+    p_executa.add_argument("--saida", default=None, help="Diretório das tabelas (padrão: temporário).")
+    p_executa.add_argument("--concorrencia", type=int, default=10)
+    p_executa.add_argument("--metadados", action="store_true")
+    p_executa.add_argument("--metricas", metavar="PREFIXO", help="Grava PREFIXO.json e PREFIXO.prom (ver metricas).")
+    p_lista = sub.add_parser("lista", help="Resumo de um arquivo gravado.")
+    p_lista.add_argument("arquivo")
+    args = parser.parse_args(argv)
+
+    if args.comando == "lista":
+        print(json.dumps(resumo(args.arquivo), indent=2))
+        return 0
+
+    from scripts import http_cache, metricas
+    if args.comando == "grava":
+        if args.sem_cache:
+            http_cache.configurar(habilitado=False)
+        gravar(args.arquivo, args.acrescentar)
+        try:
+            tempos = _executa_etl(args.concorrencia, args.metadados)
+        finally:
+            resultado = encerrar()
+        print(json.dumps({**tempos, **resultado}, indent=2))
+        return 0
+
+    if args.metricas:
+        metricas.configurar(habilitado=True)
+    reproduzir(args.arquivo)
+    try:
+        with tempfile.TemporaryDirectory(prefix="reproducao_") as temporario:
+            tempos = _executa_etl(args.concorrencia, args.metadados, args.saida or temporario)
+    finally:
+        encerrar()
+    print(json.dumps({**tempos, **estatisticas()}, indent=2))
+    if args.metricas:
+        metricas.log_resumo()
+        metricas.grava_relatorio(args.metricas + ".json")
+        metricas.grava_prometheus(args.metricas + ".prom")
+    return 1 if estatisticas()["ausentes"] else 0
+
+if __name__ == "__main__":
+    # Executado como __main__, este arquivo é um módulo diferente do scripts.reproducao
+    # consultado por http_cache; o estado (MODO, índice) precisa ficar no segundo
+    from scripts import reproducao
+    raise SystemExit(reproducao.main())
@@ -0,0 +1,223 @@
+"""
+saida.py
+
+Este módulo grava e lê as tabelas finais do pipeline (fato e dimensões) em ./arquivos_analise.
+Há dois formatos:
+  - "csv": os CSVs UTF-8 com BOM de sempre (df_fato_final.csv, dim_tempo.csv, ...);
+  - "parquet": Parquet com esquemas tipados, em ./arquivos_analise/parquet. O fato é
+    particionado por Decada (fato_populacao/Decada=1990/...), com chaves inteiras anuláveis
+    e Em_Conflito codificado como dicionário; os leitores podem filtrar décadas e colunas
+    sem ler o restante dos arquivos (predicate/projection pushdown).
+
+le_tabelas lê qualquer um dos dois formatos preservando os tipos (no CSV, as chaves são
+lidas como Int64, sem virar float quando há valores ausentes). Sem formato explícito, é lido
+o formato gravado por último (os dois podem coexistir no mesmo diretório).
+"""
+
+import os
+import shutil
+
+import pandas as pd
+
+try:
+    import pyarrow as pa
+    import pyarrow.dataset as ds
+    import pyarrow.parquet as pq
+    PYARROW_DISPONIVEL = True
+except ImportError:
+    pa = ds = pq = None
+    PYARROW_DISPONIVEL = False
+
+FORMATOS = ("csv", "parquet")
+SUBDIR_PARQUET = "parquet"
+
+# Nome do arquivo CSV de cada tabela
+ARQUIVOS_CSV = {
+    "df_fact_final": "df_fato_final.csv",
+    "dim_tempo": "dim_tempo.csv",
+    "dim_local": "dim_local.csv",
+    "dim_religiao": "dim_religiao.csv",
+}
+
+# Nome de cada tabela no diretório Parquet (o fato é um diretório particionado)
+ARQUIVOS_PARQUET = {
+    "df_fact_final": "fato_populacao",
+    "dim_tempo": "dim_tempo.parquet",
+    "dim_local": "dim_local.parquet",
+    "dim_religiao": "dim_religiao.parquet",
+}
+
+# Tipos de cada coluna (nomes de dtype do pandas); "dicionario" vira pa.dictionary(int8, string)
+TIPOS = {
+    "df_fact_final": {
+        "Chave_Tempo": "Int32", "Chave_Local": "Int32", "Chave_Religiao": "Int32",
+        "Em_Conflito": "dicionario",
+        "Populacao_Total": "Int64", "Populacao_Urbana": "Int64", "Populacao_Rural": "Int64",
+        "Taxa_Crescimento": "float64", "Expectativa_Vida": "float64", "Taxa_Mortalidade": "float64",
+        "PIB_Per_Capita": "float64", "Acesso_Educacao": "float64", "Medicos_Por_Habitante": "float64",
+    },
+    "dim_tempo": {"Ano": "Int32", "Decada": "Int32", "ID_Tempo": "Int32"},
+    "dim_local": {"Pais": "string", "Continente": "string", "ID_Local": "Int32"},
+    "dim_religiao": {"Nome_Religiao": "string", "Classificacao": "string", "ID_Religiao": "Int32"},
+}
+
+_TIPOS_ARROW = {
+    "Int32": "int32", "Int64": "int64", "float64": "float64", "string": "string",
+}
+
+def _esquema(tabela, colunas):
+    campos = []
+    for coluna in colunas:
+        tipo = TIPOS[tabela].get(coluna)
+        if tipo == "dicionario":
+            campos.append(pa.field(coluna, pa.dictionary(pa.int8(), pa.string())))
+        elif tipo is None:
+            campos.append(pa.field(coluna, pa.int32()))   # Decada, acrescentada ao fato
+        else:
+            campos.append(pa.field(coluna, pa.type_for_alias(_TIPOS_ARROW[tipo])))
+    return pa.schema(campos)
+
+def _tipa(df, tabela):
+    """
+    Converte as colunas de `df` para os tipos declarados em TIPOS (chaves como inteiros anuláveis).
+    """
+    conversoes = {}
+    for coluna, tipo in TIPOS[tabela].items():
+        if coluna not in df.columns:
+            continue
+        if tipo == "dicionario":
+            conversoes[coluna] = "category"
+        elif tipo.startswith("Int"):
+            conversoes[coluna] = tipo
+            if not pd.api.types.is_integer_dtype(df[coluna]):
+                df = df.assign(**{coluna: pd.to_numeric(df[coluna]).round()})
+        else:
+            conversoes[coluna] = tipo
+    df = df.astype(conversoes)
+    for coluna, tipo in TIPOS[tabela].items():
+        # Categorias ordenadas (faixas de Em_Conflito) viram um dicionário simples no Parquet
+        if tipo == "dicionario" and coluna in df.columns:
+            df[coluna] = df[coluna].cat.as_unordered()
+    return df
+
+def _para_arrow(df, tabela):
+    df = _tipa(df, tabela)
+    return pa.Table.from_pandas(df, schema=_esquema(tabela, df.columns), preserve_index=False)
+
+def _verifica_pyarrow():
+    if not PYARROW_DISPONIVEL:
+        raise ImportError("A saída em Parquet requer o pyarrow (pip install pyarrow).")
+
+def _com_decada(df_fato, dim_tempo):
+    posicoes = pd.Index(dim_tempo["ID_Tempo"]).get_indexer(df_fato["Chave_Tempo"])
+    decadas = pd.array(dim_tempo["Decada"].to_numpy()[posicoes], dtype="Int32")
+    decadas[posicoes < 0] = pd.NA
+    return df_fato.assign(Decada=decadas)
+
+def _grava_tabela(tabela, caminho):
+    temporario = caminho + ".tmp"
+    pq.write_table(tabela, temporario)
+    os.replace(temporario, caminho)
+
+def grava_csv(tabelas, dir_saida):
+    """
+    Grava cada DataFrame de `tabelas` ({'df_fact_final': ..., 'dim_tempo': ..., ...}) como CSV UTF-8 com BOM.
+    """
+    for nome, df in tabelas.items():
+        df.to_csv(os.path.join(dir_saida, ARQUIVOS_CSV[nome]), index=False, encoding="utf-8-sig")
+
+def grava_parquet(tabelas, dir_saida):
+    """
+    Grava as dimensões como arquivos Parquet tipados e o fato como dataset particionado por
+    Decada (obtida de dim_tempo), substituindo o conteúdo anterior.
+    """
+    _verifica_pyarrow()
+    diretorio = os.path.join(dir_saida, SUBDIR_PARQUET)
+    os.makedirs(diretorio, exist_ok=True)
+    for nome, df in tabelas.items():
+        if nome != "df_fact_final":
+            _grava_tabela(_para_arrow(df, nome), os.path.join(diretorio, ARQUIVOS_PARQUET[nome]))
+    if "df_fact_final" in tabelas:
+        caminho_fato = os.path.join(diretorio, ARQUIVOS_PARQUET["df_fact_final"])
+        shutil.rmtree(caminho_fato, ignore_errors=True)
+        acrescenta_fato_parquet(tabelas["df_fact_final"], tabelas["dim_tempo"], dir_saida)
+
+def acrescenta_fato_parquet(df_fato, dim_tempo, dir_saida, bloco=0):
+    """
+    Acrescenta linhas de fato ao dataset particionado por Decada (usado também pelo modo em
+    fluxo, um bloco por vez; `bloco` diferencia os nomes dos arquivos de cada chamada).
+    """
+    _verifica_pyarrow()
+    caminho_fato = os.path.join(dir_saida, SUBDIR_PARQUET, ARQUIVOS_PARQUET["df_fact_final"])
+    tabela = _para_arrow(_com_decada(df_fato, dim_tempo), "df_fact_final")
+    ds.write_dataset(tabela, caminho_fato, format="parquet",
+                     partitioning=ds.partitioning(pa.schema([("Decada", pa.int32())]), flavor="hive"),
+                     basename_template=f"bloco-{bloco}-{{i}}.parquet",
+                     existing_data_behavior="overwrite_or_ignore")
+
+def grava(tabelas, dir_saida, formato="csv"):
+    """
+    Grava as tabelas finais no formato escolhido ("csv" ou "parquet"), criando `dir_saida` se preciso.
+    """
+    if formato not in FORMATOS:
+        raise ValueError(f"Formato de saída desconhecido: {formato} (use {', '.join(FORMATOS)}).")
+    os.makedirs(dir_saida, exist_ok=True)
+    if formato == "parquet":
+        grava_parquet(tabelas, dir_saida)
+    else:
+        grava_csv(tabelas, dir_saida)
+
+def le_fato(dir_saida="./arquivos_analise", decadas=None, colunas=None):
+    """
+    Lê o fato em Parquet. `decadas` (lista, ex.: [1990, 2000]) é aplicada como filtro de
+    partição e `colunas` como projeção; partições e colunas não pedidas não são lidas.
+    """
+    _verifica_pyarrow()
+    caminho_fato = os.path.join(dir_saida, SUBDIR_PARQUET, ARQUIVOS_PARQUET["df_fact_final"])
+    dataset = ds.dataset(caminho_fato, format="parquet",
+                         partitioning=ds.partitioning(pa.schema([("Decada", pa.int32())]), flavor="hive"))
+    filtro = ds.field("Decada").isin(list(decadas)) if decadas is not None else None
+    tabela = dataset.to_table(columns=colunas, filter=filtro)
+    return tabela.to_pandas(types_mapper={pa.int32(): pd.Int32Dtype(), pa.int64(): pd.Int64Dtype()}.get)
+
+def _ultima_gravacao(caminho):
+    # Maior data de modificação de `caminho` (ou dos arquivos abaixo dele); None se não existir
+    if os.path.isfile(caminho):
+        return os.path.getmtime(caminho)
+    datas = [os.path.getmtime(os.path.join(raiz, arquivo))
+             for raiz, _, arquivos in os.walk(caminho) for arquivo in arquivos]
+    return max(datas, default=None)
+
+def formato_disponivel(dir_saida="./arquivos_analise"):
+    """
+    Retorna o formato do fato gravado por último em `dir_saida`: "parquet" se só houver o
+    Parquet ou se ele for mais recente que o CSV, senão "csv". Assim, uma execução em CSV
+    depois de outra em Parquet não deixa os leitores com os arquivos Parquet antigos.
+    """
+    if not PYARROW_DISPONIVEL:
+        return "csv"
+    parquet = _ultima_gravacao(os.path.join(dir_saida, SUBDIR_PARQUET, ARQUIVOS_PARQUET["df_fact_final"]))
+    if parquet is None:
+        return "csv"
+    csv = _ultima_gravacao(os.path.join(dir_saida, ARQUIVOS_CSV["df_fact_final"]))
+    return "parquet" if csv is None or parquet >= csv else "csv"
+
+def le_tabelas(dir_saida="./arquivos_analise", formato=None):
+    """
+    Lê fato e dimensões com os tipos de TIPOS. `formato` None escolhe o formato gravado por
+    último (formato_disponivel).
+    Retorna um dicionário com df_fact_final, dim_tempo, dim_local e dim_religiao.
+    """
+    formato = formato or formato_disponivel(dir_saida)
+    tabelas = {}
+    if formato == "parquet":
+        _verifica_pyarrow()
+        tabelas["df_fact_final"] = le_fato(dir_saida, colunas=list(TIPOS["df_fact_final"]))
+        for nome in ("dim_tempo", "dim_local", "dim_religiao"):
+            caminho = os.path.join(dir_saida, SUBDIR_PARQUET, ARQUIVOS_PARQUET[nome])
+            tabelas[nome] = _tipa(pd.read_parquet(caminho), nome)
+        return tabelas
+    for nome, arquivo in ARQUIVOS_CSV.items():
+        tipos = {c: ("category" if t == "dicionario" else t) for c, t in TIPOS[nome].items()}
+        tabelas[nome] = pd.read_csv(os.path.join(dir_saida, arquivo), encoding="utf-8-sig", dtype=tipos)
+    return tabelas
@@ -15,10 +15,21 @@ import nest_asyncio
 import numpy as np
 import logging
 import sys
+import time
+import os
+import hashlib
+import inspect
+import pickle
 import warnings
+import lxml.html
+from concurrent.futures import ThreadPoolExecutor
+from requests.adapters import HTTPAdapter
 from requests_html import AsyncHTMLSession
 from bs4 import BeautifulSoup
 from io import StringIO
+from scripts import controle_taxa
+from scripts import http_cache
+from scripts import metricas
 
 # Ignora warnings para manter a saída mais limpa 
 warnings.filterwarnings("ignore")
@@ -34,6 +45,33 @@ logger = logging.getLogger(__name__)
 # Permite o uso de asyncio em ambientes como Jupyter Notebook
 nest_asyncio.apply()
 
+# Número máximo de requisições simultâneas às páginas dos países. O pool de
+# conexões keep-alive e o pool de threads da sessão são dimensionados com o
+# mesmo valor, para que nenhuma conexão seja descartada e depois reaberta.
+MAX_CONCORRENCIA = 10
+
+# Número de threads usadas para interpretar as páginas históricas fora do event loop.
+# O lxml libera o GIL durante o parsing, então download e parsing se sobrepõem.
+PARSER_WORKERS = 4
+
+# Snapshot persistido do Historico_Pais (por país: hash da página, URL, versão do parser e
+# DataFrame processado), usado para que uma nova execução só reprocesse os países cujas
+# páginas (ou cujo código de parsing) mudaram.
+SNAPSHOT_HISTORICO = "./cache/historico_pais.pkl"
+
+def criar_sessao(max_concorrencia=MAX_CONCORRENCIA):
+    """
+    Cria uma AsyncHTMLSession cujo pool de threads e pool de conexões HTTP
+    comportam exatamente `max_concorrencia` requisições simultâneas.
+    Com pool_block=True, uma requisição excedente aguarda uma conexão livre
+    em vez de abrir (e descartar) uma nova conexão TCP/TLS.
+    """
+    session = AsyncHTMLSession(workers=max_concorrencia)
+    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=max_concorrencia, pool_block=True)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
+
 async def fetch_population_table(session):
     """
     Obtém a página principal de "Population by Country" e extrai a tabela via pandas.
@@ -42,7 +80,8 @@ async def fetch_population_table(session):
     """
     url = "https://www.worldometers.info/world-population/population-by-country/"
     try:
-        response = await session.get(url)
+        response = await controle_taxa.get_async(session, url)
+        response.raise_for_status()
         # Extrai a tabela com pd.read_html
         tables = pd.read_html(StringIO(response.text))
         pop_table = None
@@ -88,7 +127,7 @@ async def fetch_population_table(session):
         logger.error(f"Erro ao obter a tabela de população: {str(e)}")
         return None
 
-async def process_population_data():
+async def process_population_data(session=None):
     """
     Processa a tabela principal para gerar um DataFrame com:
       - Country
@@ -97,8 +136,12 @@ async def process_population_data():
       - Urban_Percent (da coluna "Urban Pop %")
       - Populacao_Urbana e Populacao_Rural (calculadas)
       - Country_URL (link para a página do país)
+    Se `session` for informada ela é reutilizada (e não é fechada aqui);
+    caso contrário uma sessão própria é criada e fechada ao final.
     """
-    session = AsyncHTMLSession()
+    sessao_propria = session is None
+    if sessao_propria:
+        session = AsyncHTMLSession()
     try:
         pop_table = await fetch_population_table(session)
         if pop_table is None:
@@ -150,7 +193,8 @@ async def process_population_data():
         logger.error(f"Erro crítico no processamento dos dados populacionais: {str(e)}")
         return None
     finally:
-        await session.close()
+        if sessao_propria:
+            await session.close()
 
 def process_historical_table(df, country_name):
     """
@@ -244,64 +288,228 @@ def process_historical_table(df, country_name):
     
     return df_out
 
-async def fetch_country_historical_data(session, country_name, country_url):
+def _encontra_tabela_historica_bs4(html):
+    soup = BeautifulSoup(html, 'html.parser')
+    # Procura por um <h2> cujo texto contenha "Population of" e "historical"
+    for h2 in soup.find_all("h2"):
+        txt = h2.get_text().strip()
+        if "Population of" in txt and "historical" in txt:
+            return h2.find_next("table", {"class": "table-list"})
+    return None
+
+@metricas.mede("scraping.parse")
+def parse_historical_page_bs4(html, country_name):
+    """
+    Caminho original: localiza a tabela histórica com BeautifulSoup (html.parser),
+    re-serializa a tabela e a lê novamente com pd.read_html.
+    Retorna o DataFrame já processado por process_historical_table ou None.
+    """
+    target_table = _encontra_tabela_historica_bs4(html)
+    if target_table is None:
+        return None
+    df_raw = pd.read_html(StringIO(str(target_table)))[0]
+    return process_historical_table(df_raw, country_name)
+
+@metricas.mede("scraping.parse")
+def parse_historical_page_lxml(html, country_name):
+    """
+    Caminho rápido: em uma única passada com lxml, localiza o <h2> "Population of ... historical",
+    a tabela "table-list" seguinte e extrai as células diretamente em listas por coluna,
+    sem re-serializar o HTML nem passar por pd.read_html.
+    Retorna o DataFrame já processado por process_historical_table ou None.
+    """
+    doc = lxml.html.fromstring(html)
+    target_table = None
+    for h2 in doc.iter("h2"):
+        txt = h2.text_content().strip()
+        if "Population of" in txt and "historical" in txt:
+            tabelas = h2.xpath("following::table[contains(concat(' ', normalize-space(@class), ' '), ' table-list ')][1]")
+            target_table = tabelas[0] if tabelas else None
+            break
+    if target_table is None:
+        return None
+
+    cabecalho = target_table.xpath("./thead/tr[1]/*")
+    linhas = target_table.xpath("./tbody/tr")
+    if not cabecalho:
+        # Tabela sem <thead>: a primeira linha com <th> é o cabeçalho
+        cabecalho = target_table.xpath("./tr[th][1]/*")
+    if not linhas:
+        linhas = target_table.xpath("./tr[td]")
+    nomes = [c.text_content().strip() for c in cabecalho]
+
+    colunas = [[] for _ in nomes]
+    for tr in linhas:
+        celulas = tr.findall("td")
+        if len(celulas) != len(nomes):
+            continue
+        for valores, td in zip(colunas, celulas):
+            valores.append(td.text_content().strip())
+
+    df_raw = pd.DataFrame({i: valores for i, valores in enumerate(colunas)})
+    df_raw.columns = nomes
+    return process_historical_table(df_raw, country_name)
+
+PARSERS_HISTORICO = {
+    "lxml": parse_historical_page_lxml,
+    "bs4": parse_historical_page_bs4,
+}
+
+# Funções cujo código determina o DataFrame extraído de uma página por cada parser
+CODIGO_PARSERS = {
+    "lxml": (parse_historical_page_lxml, process_historical_table),
+    "bs4": (parse_historical_page_bs4, _encontra_tabela_historica_bs4, process_historical_table),
+}
+
+_versoes_parser = {}
+
+def versao_parser(parser="lxml"):
+    """
+    Hash do código que interpreta as páginas históricas com `parser`. É gravado em cada entrada
+    do snapshot: depois de uma correção no parsing, as páginas inalteradas são interpretadas de
+    novo em vez de reaproveitar os DataFrames extraídos pelo código antigo.
+    """
+    if parser not in _versoes_parser:
+        codigo = "".join(inspect.getsource(inspect.unwrap(funcao)) for funcao in CODIGO_PARSERS[parser])
+        _versoes_parser[parser] = hashlib.sha256(codigo.encode("utf-8")).hexdigest()
+    return _versoes_parser[parser]
+
+async def fetch_country_historical_page(session, country_name, country_url, parser="lxml", executor=None, hash_anterior=None):
     """
     Acessa a página individual do país e extrai a tabela “Population of <país> (2025 and historical)”.
     Em seguida, processa essa tabela para manter somente as colunas de interesse.
-    Retorna um DataFrame com os dados históricos (um registro por ano) e com a coluna 'Country'.
+    O download passa por controle_taxa (concorrência adaptativa e novas tentativas com backoff
+    para 429/5xx/erros de conexão); o parsing (`parser` = "lxml" ou "bs4") roda em `executor`
+    (ou no executor padrão do loop), liberando o event loop para as demais requisições em andamento.
+    Se o hash do conteúdo da página for igual a `hash_anterior`, o parsing é pulado.
+    Retorna uma tupla (hash_conteudo, df, alterado): `df` é None se a página não mudou
+    (alterado=False) ou se houve erro (hash_conteudo=None).
     """
     try:
-        response = await session.get(country_url)
+        response = await controle_taxa.get_async(session, country_url)
         response.raise_for_status()
-        soup = BeautifulSoup(response.text, 'html.parser')
+        hash_conteudo = hashlib.sha256(response.content).hexdigest()
+        if hash_anterior is not None and hash_conteudo == hash_anterior:
+            return hash_conteudo, None, False
         
-        # Procura por um <h2> cujo texto contenha "Population of" e "historical"
-        target_table = None
-        for h2 in soup.find_all("h2"):
-            txt = h2.get_text().strip()
-            if "Population of" in txt and "historical" in txt:
-                target_table = h2.find_next("table", {"class": "table-list"})
-                break
+        loop = asyncio.get_running_loop()
+        df_processed = await loop.run_in_executor(executor, PARSERS_HISTORICO[parser], response.text, country_name)
         
-        if target_table is None:
+        if df_processed is None:
             logger.error(f"Tabela histórica não encontrada para {country_name} ({country_url}).")
-            return None
-        
-        # Lê a tabela com pandas
-        df_raw = pd.read_html(str(target_table))[0]
-        # Processa a tabela para extrair apenas as colunas desejadas
-        df_processed = process_historical_table(df_raw, country_name)
-        return df_processed
+            return None, None, False
+        return hash_conteudo, df_processed, True
     except Exception as e:
         logger.error(f"Erro ao extrair dados históricos para {country_name}: {e}")
-        return None
+        return None, None, False
+
+async def fetch_country_historical_data(session, country_name, country_url, parser="lxml", executor=None):
+    """
+    Versão simples de fetch_country_historical_page, sem controle de snapshot.
+    Retorna um DataFrame com os dados históricos (um registro por ano) e com a coluna 'Country'.
+    """
+    _, df_processed, _ = await fetch_country_historical_page(session, country_name, country_url, parser, executor)
+    return df_processed
+
+def carrega_snapshot_historico(caminho=SNAPSHOT_HISTORICO):
+    """
+    Lê o snapshot do Historico_Pais: {país: {'hash': ..., 'url': ..., 'parser': ..., 'df': DataFrame}}.
+    Retorna um dicionário vazio se o arquivo não existir ou estiver corrompido.
+    """
+    try:
+        with open(caminho, "rb") as f:
+            return pickle.load(f)
+    except (OSError, pickle.UnpicklingError, EOFError):
+        return {}
 
-async def fetch_all_historical_data():
+def salva_snapshot_historico(snapshot, caminho=SNAPSHOT_HISTORICO):
+    os.makedirs(os.path.dirname(caminho), exist_ok=True)
+    temporario = caminho + ".tmp"
+    with open(temporario, "wb") as f:
+        pickle.dump(snapshot, f, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(temporario, caminho)
+
+async def fetch_all_historical_data(max_concorrencia=MAX_CONCORRENCIA, session=None, main_df=None, parser="lxml", full=False):
     """
     A partir do DataFrame principal (obtido via process_population_data),
     acessa o link de cada país e extrai a tabela histórica.
+    No máximo `max_concorrencia` páginas são requisitadas ao mesmo tempo, reutilizando
+    as conexões keep-alive da sessão; dentro desse teto, controle_taxa ajusta a concorrência
+    (AIMD) e repete as requisições que falharem. Ao final é registrada a vazão (páginas/s).
+    Se `main_df` for informado, a página principal não é baixada novamente e suas
+    URLs são usadas diretamente; se `session` for informada ela é reutilizada (e não é fechada aqui).
+    As páginas são interpretadas com `parser` em um pool de PARSER_WORKERS threads.
+    Execução incremental: países cuja página tem o mesmo hash registrado em SNAPSHOT_HISTORICO
+    (e que foram interpretados pela mesma versão do parser, ver versao_parser) reaproveitam os
+    dados do snapshot, e apenas os países alterados são reprocessados
+    (a revalidação condicional do http_cache faz com que páginas inalteradas custem um 304).
+    Com `full=True` o snapshot é ignorado e todos os países são reprocessados.
     Retorna um DataFrame consolidado em que cada linha é um registro (Country, Year, ...)
     contendo os dados extraídos (Population, Growth_Rate, Urban_Percent, Urban_Population e Rural_Population).
     """
-    session = AsyncHTMLSession()
+    sessao_propria = session is None
+    if sessao_propria:
+        session = criar_sessao(max_concorrencia)
+        controle_taxa.inicia_execucao(max_concorrencia)
+    executor = ThreadPoolExecutor(max_workers=PARSER_WORKERS)
     try:
-        main_df = await process_population_data()
+        if main_df is None:
+            main_df = await process_population_data(session)
         if main_df is None or main_df.empty:
             logger.error("DataFrame principal com os links dos países está vazio.")
             return None
         
         logger.info(f"Foram encontrados {len(main_df)} países para processar dados históricos.")
+        snapshot = {} if full else carrega_snapshot_historico()
+        versao = versao_parser(parser)
+
+        async def fetch_limitado(country_name, country_url):
+            # A concorrência é limitada por controle_taxa, por host
+            anterior = snapshot.get(country_name)
+            reaproveitavel = anterior and anterior["url"] == country_url and anterior.get("parser") == versao
+            hash_anterior = anterior["hash"] if reaproveitavel else None
+            return await fetch_country_historical_page(session, country_name, country_url, parser, executor, hash_anterior)
+
         tasks = []
+        paises = []
         for _, row in main_df.iterrows():
             country_name = row["Country"]
             country_url = row.get("Country_URL", None)
             if pd.isna(country_url) or not country_url:
                 logger.warning(f"URL para {country_name} não encontrada; pulando.")
                 continue
-            tasks.append(fetch_country_historical_data(session, country_name, country_url))
+            tasks.append(fetch_limitado(country_name, country_url))
+            paises.append((country_name, country_url))
         
+        inicio = time.perf_counter()
         results = await asyncio.gather(*tasks)
-        df_list = [df for df in results if df is not None and not df.empty]
+        duracao = time.perf_counter() - inicio
+        logger.info(f"{len(tasks)} páginas de países em {duracao:.2f}s "
+                    f"({len(tasks) / duracao if duracao > 0 else 0:.2f} páginas/s, "
+                    f"concorrência máxima {max_concorrencia}).")
+
+        # Junta os deltas ao snapshot: países inalterados (ou que falharam agora)
+        # mantêm os dados anteriores; os alterados são substituídos
+        novo_snapshot = {}
+        alterados = inalterados = falhas = 0
+        for (country_name, country_url), (hash_conteudo, df, alterado) in zip(paises, results):
+            if alterado and df is not None and not df.empty:
+                novo_snapshot[country_name] = {"hash": hash_conteudo, "url": country_url, "parser": versao, "df": df}
+                alterados += 1
+            elif country_name in snapshot:
+                novo_snapshot[country_name] = snapshot[country_name]
+                if hash_conteudo is None:
+                    falhas += 1
+                else:
+                    inalterados += 1
+            else:
+                falhas += 1
+        logger.info(f"Histórico incremental: {alterados} países atualizados, {inalterados} inalterados, "
+                    f"{falhas} sem dados novos por erro.")
+        if alterados:
+            salva_snapshot_historico(novo_snapshot)
+
+        df_list = [entrada["df"] for entrada in novo_snapshot.values()]
         if df_list:
             df_all = pd.concat(df_list, ignore_index=True)
             return df_all
@@ -312,26 +520,37 @@ async def fetch_all_historical_data():
         logger.error(f"Erro crítico ao extrair dados históricos: {e}")
         return None
     finally:
-        await session.close()
+        executor.shutdown(wait=False)
+        if sessao_propria:
+            controle_taxa.log_estatisticas()
+            await session.close()
 
-async def scrape():
+async def scrape(max_concorrencia=MAX_CONCORRENCIA, parser="lxml", full=False):
     """
-    Função principal que:
-      - Extrai o DataFrame principal com os links dos países.
-      - Para cada país, acessa seu link e extrai os dados históricos (por ano) 
+    Função principal que, usando uma única sessão HTTP:
+      - Extrai o DataFrame principal com os links dos países (uma única vez).
+      - Para cada país, acessa seu link (obtido do mesmo DataFrame principal) e extrai os dados históricos (por ano) 
         mantendo somente as colunas: Population, Growth_Rate, Urban_Percent, Urban_Population;
         calcula Rural_Population (Population - Urban_Population) e inclui o Country.
+      - Limita a `max_concorrencia` o número de páginas de países baixadas simultaneamente
+        (com ajuste adaptativo e novas tentativas via controle_taxa) e interpreta cada página com `parser` ("lxml" por padrão; "bs4" mantém o caminho original).
+      - Só reprocessa os países cujas páginas mudaram desde a última execução (`full=True` reprocessa todos).
       - Retorna um dicionário com os DataFrames:
             'Fato_Populacao': dados principais com resumo (incluindo Country_URL)
             'Historico_Pais': dados históricos consolidados (uma linha por país/ano)
     """
-    session = AsyncHTMLSession()
+    session = criar_sessao(max_concorrencia)
+    controle_taxa.inicia_execucao(max_concorrencia)
     try:
         logger.info("Iniciando coleta dos dados do Worldometers")
-        df_population = await process_population_data()
+        with metricas.etapa("scraping.pagina_principal") as etapa:
+            df_population = await process_population_data(session)
+            etapa.linhas_saida = metricas.conta_linhas(df_population)
         logger.info("Dados principais extraídos.")
         
-        historical_df = await fetch_all_historical_data()
+        with metricas.etapa("scraping.historico", metricas.conta_linhas(df_population)) as etapa:
+            historical_df = await fetch_all_historical_data(max_concorrencia, session=session, main_df=df_population, parser=parser, full=full)
+            etapa.linhas_saida = metricas.conta_linhas(historical_df)
         
         return {
             'Fato_Populacao': df_population,
@@ -344,4 +563,29 @@ async def scrape():
             'Historico_Pais': pd.DataFrame()
         }
     finally:
+        http_cache.log_estatisticas()
+        controle_taxa.log_estatisticas()
         await session.close()
+
+if __name__ == "__main__":
+    import argparse
+
+    arg_parser = argparse.ArgumentParser(description="Scraping dos dados populacionais do Worldometers.")
+    arg_parser.add_argument("--full", action="store_true",
+                            help="Ignora o snapshot e reprocessa todos os países.")
+    arg_parser.add_argument("--concorrencia", type=int, default=MAX_CONCORRENCIA,
+                            help="Número máximo de páginas baixadas simultaneamente.")
+    arg_parser.add_argument("--parser", choices=sorted(PARSERS_HISTORICO), default="lxml")
+    arg_parser.add_argument("--metricas", metavar="PREFIXO",
+                            help="Instrumenta a execução e grava PREFIXO.json e PREFIXO.prom (ver metricas).")
+    args = arg_parser.parse_args()
+
+    if args.metricas:
+        metricas.configurar(habilitado=True)
+    resultado = asyncio.run(scrape(args.concorrencia, args.parser, args.full))
+    for nome, df in resultado.items():
+        logger.info(f"{nome}: {0 if df is None else len(df)} linhas.")
+    if args.metricas:
+        metricas.log_resumo()
+        metricas.grava_relatorio(args.metricas + ".json")
+        metricas.grava_prometheus(args.metricas + ".prom")